@@ -0,0 +1,33 @@
+import sys, random, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+from adi_agi_found.consensus import vote
+
+def make_candidates(n: int, size: int, variants: int, rng: random.Random):
+    words = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 9))) for _ in range(2000)]
+    bases = [" ".join(rng.choice(words) for _ in range(size // 6)) for _ in range(variants)]
+    out = []
+    for i in range(n):
+        toks = bases[i % variants].split()
+        for _ in range(len(toks) // 50):
+            toks[rng.randrange(len(toks))] = rng.choice(words)
+        out.append((" ".join(toks), 1.5 if i % 2 else 1.0))
+    return out
+
+def main():
+    rng = random.Random(0)
+    for n, size in [(3, 2000), (8, 4000), (16, 4000), (16, 8000)]:
+        cands = make_candidates(n, size, 3, rng)
+        vote(cands)
+        times = []
+        for _ in range(200):
+            t0 = time.perf_counter()
+            _, clusters = vote(cands)
+            times.append((time.perf_counter() - t0) * 1000.0)
+        times.sort()
+        print(f"n={n:2d} size={size:5d}B clusters={len(clusters)} "
+              f"p50={times[len(times)//2]:.3f}ms p99={times[int(len(times)*0.99)]:.3f}ms")
+
+if __name__ == "__main__":
+    main()
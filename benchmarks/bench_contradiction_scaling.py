@@ -0,0 +1,36 @@
+import sys, os, random, tempfile, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+from adi_agi_found.memory import Memory
+
+# one hot subject/predicate grown in bulk; single-insert latency is sampled at each checkpoint
+def main():
+    max_facts = int(os.getenv("BENCH_MAX_FACTS", "1000000"))
+    objects = int(os.getenv("BENCH_OBJECTS", "50"))
+    probes = int(os.getenv("BENCH_PROBES", "200"))
+    batch = 10000
+    rnd = random.Random(7)
+    checkpoints = [n for n in (1000, 10000, 100000, 1000000, 10000000) if n <= max_facts]
+    with tempfile.TemporaryDirectory() as td:
+        m = Memory(os.path.join(td, "hot.sqlite3"))
+        m.init()
+        size = 0
+        for target in checkpoints:
+            while size < target:
+                k = min(batch, target - size)
+                # mostly weak evidence spread over a small object pool, as a busy ingest would look
+                m.upsert_facts([("hot", "is", f"O{rnd.randrange(objects)}", "true", 0.5, "bulk") for _ in range(k)])
+                size += k
+            lat = []
+            for i in range(probes):
+                t0 = time.perf_counter()
+                m.upsert_fact("hot", "is", f"O{rnd.randrange(objects)}", rnd.choice(("true", "false")), 0.9, "probe")
+                lat.append((time.perf_counter() - t0) * 1000)
+            size += probes
+            lat.sort()
+            print(f"facts={size:9d} p50={lat[len(lat) // 2]:7.3f}ms p99={lat[int(len(lat) * 0.99) - 1]:7.3f}ms")
+        m.close()
+
+if __name__ == "__main__":
+    main()
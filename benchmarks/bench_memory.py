@@ -0,0 +1,59 @@
+import sys, asyncio, os, sqlite3, tempfile, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+from adi_agi_found.memory import Memory, SCHEMA
+
+class LegacyMemory:
+    # connection-per-call access pattern of the original Memory
+    def __init__(self, path):
+        self.path = path
+    def _conn(self):
+        Path(self.path).expanduser().resolve().parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+    def init(self):
+        with self._conn() as c:
+            c.executescript(SCHEMA)
+    def upsert_fact(self, s, p, o, pol, conf, prov):
+        with self._conn() as c:
+            return Memory._upsert_fact(c, s, p, o, pol, conf, prov)
+    def contradictions(self, s, p):
+        with self._conn() as c:
+            return Memory._contradictions(c, s, p)
+
+def bench(name, m, n_upserts, n_queries):
+    m.init()
+    t0 = time.perf_counter()
+    for i in range(n_upserts):
+        m.upsert_fact(f"S{i % 500}", "has", f"O{i}", "true", 0.5, "bench")
+    up = n_upserts / (time.perf_counter() - t0)
+    t0 = time.perf_counter()
+    for i in range(n_queries):
+        m.contradictions(f"S{i % 500}", "has")
+    q = n_queries / (time.perf_counter() - t0)
+    print(f"{name:8s} upserts/sec={up:9.0f} queries/sec={q:9.0f}")
+
+async def bench_concurrent(m, n_queries, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+    async def one(i):
+        async with sem:
+            await m.acontradictions(f"S{i % 500}", "has")
+    t0 = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(n_queries)])
+    print(f"pooled   async queries/sec={n_queries / (time.perf_counter() - t0):9.0f} (concurrency={concurrency}, loop never blocked)")
+
+def main():
+    n_upserts = int(os.getenv("BENCH_UPSERTS", "2000"))
+    n_queries = int(os.getenv("BENCH_QUERIES", "5000"))
+    with tempfile.TemporaryDirectory() as td:
+        # confidence stays below the contradiction thresholds so both variants do the same writes
+        bench("legacy", LegacyMemory(os.path.join(td, "legacy.sqlite3")), n_upserts, n_queries)
+        m = Memory(os.path.join(td, "pooled.sqlite3"))
+        bench("pooled", m, n_upserts, n_queries)
+        asyncio.run(bench_concurrent(m, n_queries, 32))
+        m.close()
+
+if __name__ == "__main__":
+    main()
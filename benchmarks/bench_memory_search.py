@@ -0,0 +1,60 @@
+import sys, os, random, tempfile, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+from adi_agi_found.memory import Memory
+
+# builds a synthetic corpus once (BENCH_DB keeps it between runs) and times search p50/p99 per query shape
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "to", "vi", "zu", "pe", "qa", "do"]
+
+def word(rnd):
+    return "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4)))
+
+def build(m, n, batch):
+    rnd = random.Random(11)
+    vocab = [word(rnd) for _ in range(50000)]
+    predicates = ["has_condition", "takes", "located_in", "works_at", "knows", "reported"]
+    t0 = time.perf_counter()
+    for start in range(0, n, batch):
+        m.upsert_facts([(f"{rnd.choice(vocab)} {rnd.choice(vocab)}", rnd.choice(predicates), f"{rnd.choice(vocab)} {rnd.choice(vocab)}",
+                         "true" if rnd.random() < 0.9 else "false", round(rnd.random() * 0.6, 2), f"src{rnd.randrange(1000)}")
+                        for _ in range(min(batch, n - start))])
+        if (start // batch) % 20 == 0:
+            print(f"  {start + batch:>10d} facts  {(start + batch) / (time.perf_counter() - t0):8.0f}/s", flush=True)
+    return vocab
+
+def timed(m, queries, **kw):
+    lat = []
+    for q in queries:
+        t0 = time.perf_counter()
+        m.search(q, **kw)
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat.sort()
+    return lat[len(lat) // 2], lat[int(len(lat) * 0.99) - 1]
+
+def main():
+    n = int(os.getenv("BENCH_FACTS", "10000000"))
+    probes = int(os.getenv("BENCH_PROBES", "200"))
+    with tempfile.TemporaryDirectory() as td:
+        path = os.getenv("BENCH_DB") or os.path.join(td, "search.sqlite3")
+        m = Memory(path)
+        m.init()
+        fresh = m._read(lambda c: c.execute("SELECT COUNT(*) FROM facts").fetchone()[0]) == 0
+        rnd = random.Random(11)
+        vocab = build(m, n, 50000) if fresh else [word(rnd) for _ in range(50000)]
+        rnd = random.Random(5)
+        shapes = {
+            "word": ([rnd.choice(vocab) for _ in range(probes)], {}),
+            "prefix": ([rnd.choice(vocab)[:4] for _ in range(probes)], {}),
+            "two words (all)": ([f"{rnd.choice(vocab)} {rnd.choice(vocab)[:4]}" for _ in range(probes)], {}),
+            "two words (any)": ([f"{rnd.choice(vocab)} {rnd.choice(vocab)}" for _ in range(probes)], {"mode": "any"}),
+            "word + filters": ([rnd.choice(vocab) for _ in range(probes)], {"polarity": "false", "min_confidence": 0.3}),
+        }
+        print(f"corpus={m._read(lambda c: c.execute('SELECT COUNT(*) FROM facts').fetchone()[0])} facts")
+        for name, (queries, kw) in shapes.items():
+            p50, p99 = timed(m, queries, limit=20, **kw)
+            print(f"{name:16s} p50={p50:8.2f}ms p99={p99:8.2f}ms")
+        m.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import sys, asyncio, os, tempfile, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+from adi_agi_found.shards import open_memory
+
+# independent agents writing facts about disjoint subjects, one batch per request
+async def bench(path, shards, writers, batches, batch_size):
+    m = open_memory(path, shards, synchronous=os.getenv("BENCH_SYNCHRONOUS", "NORMAL"))
+    m.init()
+    async def agent(w):
+        for b in range(batches):
+            await m.aupsert_facts([(f"agent{w}-s{i % 50}", "has", f"O{b}-{i}", "true", 0.5, "bench") for i in range(batch_size)])
+    t0 = time.perf_counter()
+    await asyncio.gather(*[agent(w) for w in range(writers)])
+    dt = time.perf_counter() - t0
+    m.close()
+    print(f"shards={shards:2d} writers={writers:3d} facts/sec={writers * batches * batch_size / dt:9.0f}")
+
+def main():
+    writers = int(os.getenv("BENCH_WRITERS", "16"))
+    batches = int(os.getenv("BENCH_BATCHES", "40"))
+    batch_size = int(os.getenv("BENCH_BATCH_SIZE", "200"))
+    for shards in (1, 2, 4, 8):
+        with tempfile.TemporaryDirectory() as td:
+            asyncio.run(bench(os.path.join(td, "memory.sqlite3"), shards, writers, batches, batch_size))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import sys, os, asyncio, json, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import httpx
+from fastapi.responses import JSONResponse
+from adi_agi_found import fastjson
+from adi_agi_found.fastjson import set_model
+
+# proxy CPU per 1k completion tokens: parse + re-serialize vs byte passthrough, for JSON bodies and SSE streams
+TOKENS = int(os.getenv("BENCH_TOKENS", "1000"))
+ROUNDS = int(os.getenv("BENCH_ROUNDS", "200"))
+
+def completion(logprobs):
+    toks = [f" tok{i}" for i in range(TOKENS)]
+    choice = {"index": 0, "message": {"role": "assistant", "content": "".join(toks)}, "finish_reason": "stop"}
+    if logprobs:
+        choice["logprobs"] = {"content": [{"token": t, "logprob": -0.25, "top_logprobs": [{"token": t, "logprob": -0.25}] * 5} for t in toks]}
+    return json.dumps({"id": "cmpl-1", "object": "chat.completion", "created": 1, "model": "backend-70b", "choices": [choice],
+                       "usage": {"prompt_tokens": 10, "completion_tokens": TOKENS, "total_tokens": TOKENS + 10}}).encode()
+
+def sse_events():
+    out = []
+    for i in range(TOKENS):
+        ev = {"id": "cmpl-1", "object": "chat.completion.chunk", "created": 1, "model": "backend-70b",
+              "choices": [{"index": 0, "delta": {"content": f" tok{i}"}, "finish_reason": None}]}
+        out.append(b"data: " + json.dumps(ev).encode() + b"\n\n")
+    out.append(b"data: [DONE]\n\n")
+    return out
+
+def client_for(body, events):
+    async def handler(request):
+        if request.url.path.endswith("/stream"):
+            async def gen():
+                for e in events:
+                    yield e
+            return httpx.Response(200, content=gen(), headers={"content-type": "text/event-stream"})
+        return httpx.Response(200, content=body, headers={"content-type": "application/json"})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+async def parsed_json(c):
+    r = await c.post("http://up/v1/chat/completions", json={})
+    out = r.json()
+    out["model"] = "alias"
+    return JSONResponse(out).body
+
+async def passthrough_json(c):
+    r = await c.post("http://up/v1/chat/completions", json={})
+    return set_model(r.content, "alias")
+
+async def lines_stream(c):
+    n = 0
+    async with c.stream("POST", "http://up/stream", json={}) as r:
+        async for line in r.aiter_lines():
+            if line:
+                n += len((line + "\n").encode("utf-8"))
+    return n
+
+async def raw_stream(c):
+    n = 0
+    async with c.stream("POST", "http://up/stream", json={}) as r:
+        async for chunk in r.aiter_bytes():
+            n += len(chunk)
+    return n
+
+async def bench(name, fn, c, rounds):
+    await fn(c)
+    t0 = time.process_time()
+    for _ in range(rounds):
+        await fn(c)
+    ms = (time.process_time() - t0) * 1000 / rounds * 1000 / TOKENS
+    print(f"{name:34s} cpu_ms/1k_tokens={ms:7.3f}")
+
+async def main():
+    print(f"orjson={'yes' if fastjson.orjson is not None else 'no'} tokens={TOKENS}")
+    events = sse_events()
+    for logprobs in (False, True):
+        async with client_for(completion(logprobs), events) as c:
+            tag = " +logprobs" if logprobs else ""
+            await bench("json parse+reserialize" + tag, parsed_json, c, ROUNDS)
+            await bench("json passthrough" + tag, passthrough_json, c, ROUNDS)
+    async with client_for(b"{}", events) as c:
+        await bench("sse aiter_lines+encode", lines_stream, c, ROUNDS // 4)
+        await bench("sse raw relay", raw_stream, c, ROUNDS // 4)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import sys, os, asyncio, hashlib, json, random, time
+from collections import OrderedDict
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import httpx
+from adi_agi_found import balancer as balancer_mod
+from adi_agi_found.backends import openai_chat
+from adi_agi_found.balancer import Balancer
+
+# multi-turn agent conversations against stub replicas that keep an LRU prefix cache:
+# prefill is paid only for messages past the longest cached prefix, so routing decides the latency
+REPLICAS = int(os.getenv("BENCH_REPLICAS", "4"))
+CONVERSATIONS = int(os.getenv("BENCH_CONVERSATIONS", "64"))
+TURNS = int(os.getenv("BENCH_TURNS", "6"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "16"))
+CACHE_PREFIXES = int(os.getenv("BENCH_CACHE_PREFIXES", "256"))
+SYSTEM_PREFILL_MS = 20.0
+MESSAGE_PREFILL_MS = 3.0
+DECODE_MS = 8.0
+
+class StubReplica:
+    def __init__(self):
+        self.cache = OrderedDict()
+        self.hit_msgs = 0
+        self.total_msgs = 0
+
+    def serve(self, messages):
+        keys = [hashlib.blake2b(json.dumps(messages[:i], sort_keys=True).encode(), digest_size=8).digest()
+                for i in range(1, len(messages) + 1)]
+        cached = 0
+        for i, k in enumerate(keys):
+            if k not in self.cache:
+                break
+            self.cache.move_to_end(k)
+            cached = i + 1
+        for k in keys[cached:]:
+            self.cache[k] = True
+        while len(self.cache) > CACHE_PREFIXES:
+            self.cache.popitem(last=False)
+        self.hit_msgs += cached
+        self.total_msgs += len(messages)
+        ms = DECODE_MS + (SYSTEM_PREFILL_MS if cached == 0 else 0) + MESSAGE_PREFILL_MS * (len(messages) - max(cached, 1))
+        return ms / 1000
+
+def stub_client(replicas):
+    async def handler(request):
+        body = json.loads(request.content)
+        await asyncio.sleep(replicas[request.url.host].serve(body["messages"]))
+        return httpx.Response(200, json={"model": body["model"], "choices": [{"message": {"role": "assistant", "content": "ok"}}],
+                                         "usage": {"completion_tokens": 1}})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+async def conversation(c, n, lat, sem):
+    messages = [{"role": "system", "content": "You are a coding agent. " * 50}]
+    for t in range(TURNS):
+        messages.append({"role": "user", "content": f"conversation {n} turn {t}"})
+        async with sem:
+            t0 = time.perf_counter()
+            out = await openai_chat(c, "http://unused:8000", {"model": "m", "messages": list(messages)})
+            lat.append(time.perf_counter() - t0)
+        messages.append(out["choices"][0]["message"])
+        await asyncio.sleep(random.random() * 0.01)
+
+async def run(affinity_messages):
+    random.seed(0)
+    replicas = {f"r{i}": StubReplica() for i in range(REPLICAS)}
+    lb = balancer_mod._balancer = Balancer({"m": [f"http://{h}:8000" for h in replicas]}, affinity_messages=affinity_messages)
+    lat = []
+    sem = asyncio.Semaphore(CONCURRENCY)
+    async with stub_client(replicas) as c:
+        t0 = time.perf_counter()
+        await asyncio.gather(*[conversation(c, n, lat, sem) for n in range(CONVERSATIONS)])
+        wall = time.perf_counter() - t0
+    lat.sort()
+    hit = sum(r.hit_msgs for r in replicas.values()) / max(1, sum(r.total_msgs for r in replicas.values()))
+    hits, n = lb._affinity.get("m", [0, 0])
+    name = f"affinity first {affinity_messages} msgs" if affinity_messages else "power of two choices"
+    print(f"{name:26s} mean_ms={sum(lat) / len(lat) * 1000:6.1f} p95_ms={lat[int(len(lat) * 0.95)] * 1000:6.1f} "
+          f"req/s={len(lat) / wall:6.1f} prefix_cache_hit={hit:.2f} affinity_hit={hits / n if n else 0:.2f} "
+          f"per_replica={[r.total_msgs for r in replicas.values()]}")
+
+async def main():
+    print(f"replicas={REPLICAS} conversations={CONVERSATIONS} turns={TURNS} concurrency={CONCURRENCY} cache_prefixes/replica={CACHE_PREFIXES}")
+    for affinity_messages in (0, 2):
+        await run(affinity_messages)
+
+if __name__ == "__main__":
+    asyncio.run(main())
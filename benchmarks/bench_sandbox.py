@@ -0,0 +1,46 @@
+import sys, os, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import fastapi, httpx, numpy  # noqa: F401  the per-call fork copies whatever the host process has imported
+from adi_agi_found.sandbox import CodeCache, SandboxPool, run_python_sandbox
+
+CODE = "import math\nxs = [math.sqrt(i) for i in range(200)]\nprint(len(xs))\nsum(xs)"
+# an agent-style block of checks resubmitted every step; parsing and validation dominate its run time
+HELPER = "\n".join(f"c{i} = abs(round({i} * 1.5 - {i} / 3, 4)) <= {i} * 2 and len(str({i})) < 8" for i in range(150)) + "\nc0"
+
+def bench(name, run, n, concurrency):
+    lat = []
+    def one(_):
+        t0 = time.perf_counter()
+        out = run()
+        lat.append((time.perf_counter() - t0) * 1000)
+        assert out["ok"], out
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(one, range(n)))
+    rate = n / (time.perf_counter() - t0)
+    lat.sort()
+    print(f"{name:14s} c={concurrency:2d} p50={lat[len(lat) // 2]:8.2f}ms p99={lat[int(len(lat) * 0.99) - 1]:8.2f}ms execs/sec={rate:8.0f}")
+
+def main():
+    n = int(os.getenv("BENCH_EXECS", "300"))
+    size = int(os.getenv("BENCH_POOL_SIZE", "4"))
+    with tempfile.TemporaryDirectory() as td:
+        pool = SandboxPool(size=size, workdir=td)
+        cached = SandboxPool(size=size, workdir=td, cache=CodeCache())
+        pool.run("1", timeout_sec=30.0)
+        cached.run("1", timeout_sec=30.0)
+        for c in (1, size):
+            bench("per-call fork", lambda: run_python_sandbox(CODE, workdir=td, timeout_sec=5.0), n, c)
+            bench("warm pool", lambda: pool.run(CODE, timeout_sec=5.0), n, c)
+        for c in (1, size):
+            bench("helper pool", lambda: pool.run(HELPER, timeout_sec=5.0), n, c)
+            bench("helper cached", lambda: cached.run(HELPER, timeout_sec=5.0), n, c)
+        print(cached.cache.stats())
+        pool.close()
+        cached.close()
+
+if __name__ == "__main__":
+    main()
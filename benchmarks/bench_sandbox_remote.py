@@ -0,0 +1,72 @@
+import sys, os, asyncio, socket, subprocess, tempfile, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import httpx
+from adi_agi_found.sandbox import SandboxLimiter, run_python_sandbox
+from adi_agi_found.sandbox_remote import RemoteSandbox
+
+# starts sandbox service instances with uvicorn on local ports; compares throughput with 1 and N instances and the
+# CPU the proxy process itself spends per exec against running snippets in-process
+CODE = "import math\nxs = [math.sqrt(i) for i in range(20000)]\nround(sum(xs), 3)"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start(n, workdir):
+    procs, urls = [], []
+    env = dict(os.environ, FOUND_SANDBOX_WORKDIR=workdir, FOUND_SANDBOX_POOL_SIZE=os.getenv("BENCH_POOL_SIZE", "2"))
+    for _ in range(n):
+        port = free_port()
+        procs.append(subprocess.Popen([sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+                                      cwd=ROOT / "tools" / "sandbox_service", env=env))
+        urls.append(f"http://127.0.0.1:{port}")
+    deadline = time.time() + 30
+    for u in urls:
+        while True:
+            try:
+                if httpx.get(u + "/health").status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError(f"{u} did not come up")
+            time.sleep(0.2)
+    return procs, urls
+
+def cpu_seconds():
+    # reaped fork children count toward the proxy; service instances are only reaped at the end
+    t = os.times()
+    return t.user + t.system + t.children_user + t.children_system
+
+async def drive(name, run, n, concurrency):
+    limiter = SandboxLimiter(run, concurrency=concurrency, max_queue=n)
+    cpu0, t0 = cpu_seconds(), time.perf_counter()
+    outs = await asyncio.gather(*[limiter.run(CODE, timeout_sec=10.0) for _ in range(n)])
+    wall, cpu = time.perf_counter() - t0, cpu_seconds() - cpu0
+    limiter.close()
+    assert all(o["ok"] for o, _, _ in outs), outs[0]
+    print(f"{name:22s} c={concurrency:2d} execs/sec={n / wall:8.0f} proxy_cpu_ms/exec={cpu * 1000 / n:6.2f}")
+
+async def main():
+    n = int(os.getenv("BENCH_EXECS", "400"))
+    instances = int(os.getenv("BENCH_INSTANCES", "4"))
+    concurrency = int(os.getenv("BENCH_CONCURRENCY", "16"))
+    with tempfile.TemporaryDirectory() as td:
+        await drive("local per-call fork", lambda code, **kw: run_python_sandbox(code, workdir=td, **kw), n // 4, 4)
+        procs, urls = start(instances, td)
+        try:
+            async with httpx.AsyncClient(limits=httpx.Limits(max_connections=concurrency * 2)) as c:
+                for k in sorted({1, instances}):
+                    remote = RemoteSandbox(urls[:k], lambda: c)
+                    await drive(f"remote x{k}", remote.run, n, concurrency)
+        finally:
+            for p in procs:
+                p.terminate()
+            for p in procs:
+                p.wait()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,30 +1,107 @@
 from __future__ import annotations
-from typing import Any, Dict, List
-import time
-import httpx
+from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+import asyncio, dataclasses, json, time
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse, PlainTextResponse
 
 from .config import Settings
 from .retry import with_retries
 from .dlq import push as dlq_push
-from .audit import write as audit_write, new_trace_id
-from .metrics import inc as metric_inc, render as metrics_render
+from .audit import write as audit_write
+from .logwriter import configure as configure_logs, close_all as close_logs
+from .metrics import define_buckets, inc as metric_inc, observe as metric_observe, register_collector, render as metrics_render
 from .circuit import CircuitState
 from .router import alias_map, resolve_backend_model
-from .backends import openai_chat
-from .memory import Memory
-from .verifier import verify_response
-from .swarm import run_swarm, evaluate
-from .sandbox import run_python_sandbox
+from .backends import openai_chat, openai_chat_raw
+from .fastjson import completion_tokens, dumps, loads, set_model
+from .upstream import get_client, close_client
+from .cache import ResponseCache, request_key, cacheable
+from .singleflight import SingleFlight
+from .shards import open_memory
+from .swarm import run_swarm, run_gate
+from .sandbox import CodeCache, SandboxBusy, SandboxLimiter, SandboxPool, run_python_sandbox
+from .sandbox_remote import RemoteSandbox
+from . import balancer, tracing
+from .tracing import TracingMiddleware, add_span, span
 
 settings = Settings()
-app = FastAPI(title="adi-agi-found", version="3.1.1")
+configure_logs(settings)
+tracing.configure(settings)
+upstream_lb = balancer.configure(settings)
+define_buckets("upstream_tokens_per_second", (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000))
 
-memory = Memory(settings.memory_db_path)
+async def _compaction_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.memory_compact_interval_sec)
+        try:
+            await memory.acompact(ttl_sec=settings.memory_fact_ttl_sec, max_facts=settings.memory_max_facts,
+                                  chunk=settings.memory_compact_chunk, vacuum_pages=settings.memory_vacuum_pages)
+        except Exception:
+            metric_inc("memory_compaction_errors_total")
+
+sandbox_pool: Optional[SandboxPool] = None
+register_collector(lambda: sandbox_pool.stats() if sandbox_pool is not None else {})
+code_cache = CodeCache(settings.sandbox_code_cache_size) if settings.sandbox_code_cache_size > 0 else None
+if code_cache is not None:
+    register_collector(code_cache.stats)
+
+def _sandbox_run(code: str, **kw: Any) -> Dict[str, Any]:
+    if sandbox_pool is not None:
+        return sandbox_pool.run(code, **kw)
+    return run_python_sandbox(code, workdir=settings.sandbox_workdir, cache=code_cache, **kw)
+
+sandbox_remote: Optional[RemoteSandbox] = None
+if settings.sandbox_backend == "remote":
+    sandbox_remote = RemoteSandbox((settings.sandbox_remote_urls or settings.sandbox_base_url).split(","), lambda: get_client(settings),
+                                   local=_sandbox_run if settings.sandbox_remote_fallback else None,
+                                   eject_failures=settings.sandbox_remote_eject_failures,
+                                   health_interval_sec=settings.sandbox_health_interval_sec)
+    register_collector(sandbox_remote.stats)
+
+sandbox_limiter = SandboxLimiter(sandbox_remote.run if sandbox_remote is not None else _sandbox_run,
+                                 concurrency=settings.sandbox_concurrency, max_queue=settings.sandbox_max_queue)
+register_collector(sandbox_limiter.stats)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global sandbox_pool
+    get_client(settings)
+    if settings.sandbox_pool_size > 0 and sandbox_remote is None:
+        sandbox_pool = SandboxPool(size=settings.sandbox_pool_size, workdir=settings.sandbox_workdir,
+                                   max_tasks=settings.sandbox_pool_max_tasks, queue_timeout_sec=settings.sandbox_queue_timeout_sec,
+                                   cpu_sec=settings.sandbox_cpu_sec, memory_bytes=settings.sandbox_memory_mb << 20, cache=code_cache)
+    compaction = asyncio.create_task(_compaction_loop()) if settings.memory_compact_interval_sec > 0 else None
+    health = asyncio.create_task(sandbox_remote.health_loop()) if sandbox_remote is not None else None
+    upstream_health = asyncio.create_task(upstream_lb.health_loop(lambda: get_client(settings))) if settings.upstream_health_interval_sec > 0 else None
+    yield
+    for task in (compaction, health, upstream_health):
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    await close_client()
+    if sandbox_pool is not None:
+        sandbox_pool.close()
+        sandbox_pool = None
+    close_logs()
+    memory.close()
+
+app = FastAPI(title="adi-agi-found", version="3.1.1", lifespan=lifespan)
+app.add_middleware(TracingMiddleware)
+
+memory = open_memory(settings.memory_db_path, settings.memory_shards, readers=settings.memory_readers, synchronous=settings.memory_synchronous,
+                     cache_size_kb=settings.memory_cache_size_kb, mmap_size=settings.memory_mmap_size,
+                     busy_timeout_ms=settings.memory_busy_timeout_ms, convert_auto_vacuum=settings.memory_convert_auto_vacuum)
 memory.init()
 
 circuit = CircuitState()
+chat_flight = SingleFlight("chat")
+swarm_flight = SingleFlight("swarm")
+
+response_cache = ResponseCache(
+    max_entries=settings.cache_max_entries, max_bytes=settings.cache_max_bytes, ttl_sec=settings.cache_ttl_sec,
+    disk_path=settings.cache_disk_path, disk_max_entries=settings.cache_disk_max_entries,
+) if settings.cache_enabled else None
 
 def require_auth(req: Request):
     if not settings.api_key:
@@ -36,6 +113,12 @@ def require_auth(req: Request):
 async def health():
     return {"status":"ok","backend": settings.backend, "ts": int(time.time())}
 
+@app.get("/debug/traces")
+async def debug_traces(req: Request, limit: int = 50, trace_id: Optional[str] = None):
+    require_auth(req)
+    # OTLP/JSON, ready to POST to any collector's /v1/traces
+    return tracing.buffer.export(limit=max(1, min(limit, 1000)), trace_id=trace_id)
+
 @app.get("/metrics")
 async def metrics():
     return PlainTextResponse(metrics_render(), media_type="text/plain; version=0.0.4")
@@ -51,36 +134,138 @@ async def models(req: Request):
             {"id": settings.alias_swarm, "object":"model", "owned_by":"adi"}]
     return {"object":"list","data": data}
 
-@app.post("/v1/tools/execute")
-async def tools_execute(req: Request):
-    require_auth(req)
-    body = await req.json()
+def _tool_request(body: Any):
+    if not isinstance(body, dict):
+        raise ValueError("JSON object required")
     tool = str(body.get("tool","python")).strip().lower()
     if tool != "python":
-        raise HTTPException(status_code=400, detail="tool not allowlisted")
+        raise ValueError("tool not allowlisted")
     code = body.get("code")
     if not isinstance(code, str) or not code.strip():
-        raise HTTPException(status_code=400, detail="code required")
-    timeout = float(body.get("timeout_sec") or settings.sandbox_timeout_sec)
+        raise ValueError("code required")
+    return code, float(body.get("timeout_sec") or settings.sandbox_timeout_sec)
+
+async def _sandbox_exec(code: str, timeout: float) -> Dict[str, Any]:
+    try:
+        out, waited, ran = await sandbox_limiter.run(code, timeout_sec=timeout, cpu_sec=settings.sandbox_cpu_sec,
+                                                     memory_bytes=settings.sandbox_memory_mb << 20)
+    except SandboxBusy:
+        metric_inc("sandbox_rejected_total")
+        raise
+    end = time.time_ns()
+    add_span("sandbox.queue", end - int((waited + ran) * 1e9), end - int(ran * 1e9))
+    add_span("sandbox.exec", end - int(ran * 1e9), end, ok=bool(out.get("ok")))
     metric_inc("sandbox_exec_total")
-    return JSONResponse(run_python_sandbox(code, workdir=settings.sandbox_workdir, timeout_sec=timeout))
+    labels = {"backend": settings.sandbox_backend}
+    metric_observe("sandbox_queue_wait_seconds", waited, labels)
+    metric_observe("sandbox_exec_seconds", ran, labels)
+    return out
+
+@app.post("/v1/tools/execute")
+async def tools_execute(req: Request):
+    require_auth(req)
+    try:
+        code, timeout = _tool_request(await req.json())
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return JSONResponse(await _sandbox_exec(code, timeout))
+    except SandboxBusy as e:
+        raise HTTPException(status_code=429, detail="sandbox busy", headers={"Retry-After": str(e.retry_after)})
+
+@app.post("/v1/tools/execute_batch")
+async def tools_execute_batch(req: Request):
+    require_auth(req)
+    try:
+        body = await req.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid JSON")
+    if not isinstance(body, dict):
+        raise HTTPException(status_code=400, detail="JSON object required")
+    items = body.get("items")
+    if not isinstance(items, list) or not items:
+        raise HTTPException(status_code=400, detail="items required")
+    if len(items) > settings.sandbox_batch_max_items:
+        raise HTTPException(status_code=400, detail=f"at most {settings.sandbox_batch_max_items} items")
+    metric_inc("sandbox_batch_total")
+    # a batch waits on its own slots instead of flooding the shared sandbox queue
+    sem = asyncio.Semaphore(max(1, min(settings.sandbox_batch_concurrency, sandbox_limiter.concurrency)))
+
+    async def one(i: int, item: Any) -> Dict[str, Any]:
+        try:
+            code, timeout = _tool_request(item)
+        except (TypeError, ValueError) as e:
+            return {"index": i, "status": "invalid", "ok": False, "error": str(e)}
+        async with sem:
+            try:
+                out = await _sandbox_exec(code, timeout)
+            except SandboxBusy as e:
+                return {"index": i, "status": "busy", "ok": False, "error": "sandbox busy", "retry_after": e.retry_after}
+        return {"index": i, "status": "ok" if out.get("ok") else "error", **out}
+
+    tasks = [asyncio.ensure_future(one(i, item)) for i, item in enumerate(items)]
+    if body.get("stream"):
+        async def gen():
+            try:
+                for fut in asyncio.as_completed(tasks):
+                    yield (json.dumps(await fut, default=repr) + "\n").encode("utf-8")
+            finally:
+                for t in tasks:
+                    t.cancel()
+        return StreamingResponse(gen(), media_type="application/x-ndjson")
+    return JSONResponse({"results": await asyncio.gather(*tasks)})
+
+def _parse_fact(f: Any):
+    if not isinstance(f, dict):
+        raise ValueError("fact must be a JSON object")
+    subject = str(f.get("subject","")).strip()
+    predicate = str(f.get("predicate","")).strip()
+    object_ = str(f.get("object","")).strip()
+    polarity = str(f.get("polarity","true")).strip().lower()
+    confidence = float(f.get("confidence", 0.8))
+    provenance = str(f.get("provenance","unknown"))
+    if not (subject and predicate and object_):
+        raise ValueError("subject, predicate and object required")
+    return (subject, predicate, object_, polarity, confidence, provenance)
+
+async def _ndjson_facts(req: Request):
+    buf = b""
+    async for chunk in req.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)
+    if buf.strip():
+        yield json.loads(buf)
 
 @app.post("/v1/memory/facts/upsert")
 async def memory_facts_upsert(req: Request):
     require_auth(req)
-    body = await req.json()
-    facts = body.get("facts") or []
-    ids = []
-    for f in facts:
-        subject = str(f.get("subject","")).strip()
-        predicate = str(f.get("predicate","")).strip()
-        object_ = str(f.get("object","")).strip()
-        polarity = str(f.get("polarity","true")).strip().lower()
-        confidence = float(f.get("confidence", 0.8))
-        provenance = str(f.get("provenance","unknown"))
-        if subject and predicate and object_:
-            ids.append(memory.upsert_fact(subject, predicate, object_, polarity, confidence, provenance))
+    # the whole body is parsed and checked before the first write, so a bad fact stores nothing
+    facts: List[Any] = []
+    ctype = req.headers.get("content-type","").split(";")[0].strip().lower()
+    try:
+        if ctype in ("application/x-ndjson", "application/jsonl", "application/ndjson"):
+            async for f in _ndjson_facts(req):
+                facts.append(_parse_fact(f))
+        else:
+            body = await req.json()
+            if not isinstance(body, dict):
+                raise ValueError("JSON object required")
+            raw = body.get("facts") or []
+            if not isinstance(raw, list):
+                raise ValueError("facts must be a list")
+            for f in raw:
+                facts.append(_parse_fact(f))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"invalid fact at index {len(facts)}: {e}; nothing was stored")
+    ids: List[int] = []
+    n = max(1, settings.memory_bulk_batch_size)
+    for i in range(0, len(facts), n):
+        ids.extend(await memory.aupsert_facts(facts[i:i + n]))
     metric_inc("memory_facts_upsert_total")
+    metric_inc("memory_facts_upserted_total", len(ids))
     return {"ok": True, "ids": ids}
 
 @app.post("/v1/memory/contradictions/query")
@@ -91,13 +276,101 @@ async def memory_contradictions_query(req: Request):
     predicate = str(body.get("predicate","")).strip()
     if not subject or not predicate:
         raise HTTPException(status_code=400, detail="subject and predicate required")
+    try:
+        filters = {
+            "limit": max(1, min(int(body.get("limit") or 200), 1000)),
+            "cursor": str(body["cursor"]) if body.get("cursor") else None,
+            "reason": str(body["reason"]) if body.get("reason") else None,
+            "provenance": str(body["provenance"]) if body.get("provenance") else None,
+            "min_confidence": float(body["min_confidence"]) if body.get("min_confidence") is not None else None,
+            "since": int(body["since"]) if body.get("since") is not None else None,
+            "until": int(body["until"]) if body.get("until") is not None else None,
+        }
+        page = await memory.acontradictions_page(subject, predicate, **filters)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     metric_inc("memory_contradictions_query_total")
-    return {"contradictions": memory.contradictions(subject, predicate)}
+    return page
+
+@app.post("/v1/memory/facts/search")
+async def memory_facts_search(req: Request):
+    require_auth(req)
+    body = await req.json()
+    q = str(body.get("q","")).strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q required")
+    try:
+        filters = {
+            "mode": str(body.get("mode") or "all").strip().lower(),
+            "limit": max(1, min(int(body.get("limit") or 50), 500)),
+            "cursor": str(body["cursor"]) if body.get("cursor") else None,
+            "polarity": str(body["polarity"]).strip().lower() if body.get("polarity") else None,
+            "min_confidence": float(body["min_confidence"]) if body.get("min_confidence") is not None else None,
+        }
+        page = await memory.asearch(q, **filters)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metric_inc("memory_facts_search_total")
+    return page
+
+def sse_data_lines(tail: bytes, chunk: bytes):
+    # network chunks can split a line anywhere; only complete lines are counted, the rest carries over
+    *lines, tail = (tail + chunk).split(b"\n")
+    return sum(l.startswith(b"data:") for l in lines), tail
+
+# every swarm_* setting plus the models, so a config change never serves a stale answer; the upstream url is left
+# out because it moves where candidates are drawn, not which ones
+SWARM_KEY_SETTINGS = ("model_id_7b", "model_id_70b", *(f.name for f in dataclasses.fields(Settings) if f.name.startswith("swarm_")))
+
+def swarm_flight_key(messages: List[Dict[str, Any]]) -> str:
+    return request_key(settings.alias_swarm, {"messages": messages, "swarm": [getattr(settings, k) for k in SWARM_KEY_SETTINGS]})
+
+async def swarm_pipeline(client, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    q_text = ""
+    for m in messages:
+        c = m.get("content")
+        if isinstance(c, str):
+            q_text += c + "\n"
+    swarm = await run_swarm(
+        client=client, base_url=settings.vllm_text_base_url,
+        fast_model=settings.model_id_7b, deep_model=settings.model_id_70b,
+        n=settings.swarm_n, mode=settings.swarm_mode,
+        question_messages=messages,
+        weight_fast=settings.swarm_weight_fast, weight_deep=settings.swarm_weight_deep,
+        fanout=settings.swarm_fanout, candidate_timeout=settings.swarm_candidate_timeout_sec,
+        sequential=(settings.swarm_sampling == "sequential"), min_samples=settings.swarm_min_samples,
+        wave_size=settings.swarm_wave_size, budget_tokens=settings.swarm_budget_tokens,
+        budget_sec=settings.swarm_budget_sec, similarity_threshold=settings.swarm_similarity_threshold,
+    )
+    consensus = swarm.get("consensus","")
+
+    gate = await run_gate(
+        client=client, base_url=settings.vllm_text_base_url,
+        fast_model=settings.model_id_7b, deep_model=settings.model_id_70b,
+        question=q_text, answer=consensus, require_verifier=settings.swarm_require_verifier,
+        skip_deep=settings.swarm_skip_deep_eval_on_unanimous and bool(swarm.get("unanimous")),
+    )
+    if not gate["ok"]:
+        metric_inc("swarm_gate_fail_total")
+        repair_prompt = (f"Improve and fix issues. FAST_EVAL={gate['eval_fast']} DEEP_EVAL={gate['eval_deep']} "
+                         f"VERIFIER={gate['verifier']}. Return improved answer only.")
+        t0 = time.perf_counter()
+        with span("repair"):
+            repaired = await openai_chat(client, settings.vllm_text_base_url, {
+                "model": settings.model_id_70b,
+                "messages": messages + [{"role":"user","content":repair_prompt}],
+                "temperature": 0.2,
+                "max_tokens": 1200
+            })
+        metric_observe("swarm_stage_seconds", time.perf_counter() - t0, {"stage": "repair"})
+        consensus = (((repaired.get("choices") or [{}])[0].get("message") or {}).get("content")) or consensus
+    return {"consensus": consensus, "swarm": swarm, "gate": gate}
 
 @app.post("/v1/chat/completions")
 async def chat(req: Request):
     require_auth(req)
-    trace_id = req.headers.get("x-trace-id") or new_trace_id()
+    t_start = time.perf_counter()
+    trace_id = tracing.current_trace_id()
     body = await req.json()
     alias = str(body.get("model",""))
     mapping = alias_map(settings)
@@ -109,89 +382,142 @@ async def chat(req: Request):
         raise HTTPException(status_code=503, detail="backend_circuit_open")
 
     route_hint = req.headers.get("x-adi-route") or (body.get("metadata") or {}).get("route")
-    backend_model = resolve_backend_model(settings, alias, mapping, body, route_hint)
+    with span("route", alias=alias):
+        backend_model = resolve_backend_model(settings, alias, mapping, body, route_hint)
     stream = bool(body.get("stream", False))
     messages = body.get("messages") or []
 
+    def record(route: str, outcome: str) -> None:
+        metric_observe("chat_request_seconds", time.perf_counter() - t_start,
+                       {"alias": alias, "backend_model": backend_model, "route": route, "outcome": outcome})
+
     audit_write(settings.audit_path, {"trace_id": trace_id, "event":"request", "alias": alias})
 
-    async with httpx.AsyncClient(timeout=None) as client:
-        # Swarm alias is implemented by sampling multiple times using upstream models
-        if alias == settings.alias_swarm:
-            metric_inc("swarm_requests_total")
-            q_text = ""
-            for m in messages:
-                c = m.get("content")
-                if isinstance(c, str):
-                    q_text += c + "\n"
-            swarm = await run_swarm(
-                client=client, base_url=settings.vllm_text_base_url,
-                fast_model=settings.model_id_7b, deep_model=settings.model_id_70b,
-                n=settings.swarm_n, mode=settings.swarm_mode,
-                question_messages=messages,
-                weight_fast=settings.swarm_weight_fast, weight_deep=settings.swarm_weight_deep,
-            )
-            consensus = swarm.get("consensus","")
-
-            ev_fast = await evaluate(client, settings.vllm_text_base_url, settings.model_id_7b, q_text, consensus)
-            ev_deep = await evaluate(client, settings.vllm_text_base_url, settings.model_id_70b, q_text, consensus)
-            ver = verify_response(consensus) if settings.swarm_require_verifier else {"ok": True}
-
-            ok = (ev_fast.get("score",0) >= 7) and (ev_deep.get("score",0) >= 7) and bool(ver.get("ok", True))
-            if not ok:
-                metric_inc("swarm_gate_fail_total")
-                repair_prompt = f"Improve and fix issues. FAST_EVAL={ev_fast} DEEP_EVAL={ev_deep} VERIFIER={ver}. Return improved answer only."
-                repaired = await openai_chat(client, settings.vllm_text_base_url, {
-                    "model": settings.model_id_70b,
-                    "messages": messages + [{"role":"user","content":repair_prompt}],
-                    "temperature": 0.2,
-                    "max_tokens": 1200
-                })
-                consensus = (((repaired.get("choices") or [{}])[0].get("message") or {}).get("content")) or consensus
-
-            out = {
-                "id": f"swarm-{trace_id}",
-                "object": "chat.completion",
-                "model": alias,
-                "choices": [{"index":0, "message":{"role":"assistant","content": consensus}, "finish_reason":"stop"}],
-                "meta": {"trace_id": trace_id, "swarm": swarm, "eval_fast": ev_fast, "eval_deep": ev_deep, "verifier": ver},
-            }
-            audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": True})
-            circuit.record_success()
-            return JSONResponse(out)
-
-        payload = dict(body)
-        payload["model"] = backend_model
-        payload["messages"] = messages
-
-        if stream:
-            metric_inc("stream_requests_total")
-            async def gen():
-                try:
-                    async with client.stream("POST", f"{settings.vllm_text_base_url}/v1/chat/completions", json=payload) as r:
-                        r.raise_for_status()
-                        async for line in r.aiter_lines():
-                            if line:
-                                yield (line + "\n").encode("utf-8")
-                    circuit.record_success()
-                except Exception as e:
-                    circuit.record_failure(settings.circuit_fail_threshold)
-                    dlq_push(settings.dlq_path, {"trace_id": trace_id, "event":"stream_fail","error":str(e)})
-                    metric_inc("stream_fail_total")
-                    raise
-            return StreamingResponse(gen(), media_type="text/event-stream")
-
-        metric_inc("chat_requests_total")
+    client = get_client(settings)
+
+    payload = dict(body)
+    payload["model"] = backend_model
+    payload["messages"] = messages
+    if alias == settings.alias_swarm:
+        flight_key = swarm_flight_key(messages)
+    else:
+        flight_key = request_key(backend_model, payload)
+
+    cache_key = None
+    cache_state = "off"
+    if response_cache is not None and cacheable(body):
+        if req.headers.get("x-adi-cache","").strip().lower() == "bypass":
+            cache_state = "bypass"
+        else:
+            cache_key = flight_key
+            hit = await response_cache.get(cache_key)
+            if hit is not None:
+                # entries are shared by every alias that resolves to the same backend model
+                audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": True, "cache": "hit"})
+                record("cache", "hit")
+                if alias == settings.alias_swarm:
+                    # swarm bodies are ours; the replay gets this request's ids, not the original's
+                    out = loads(hit)
+                    out["id"] = f"swarm-{trace_id}"
+                    out.setdefault("meta", {})["trace_id"] = trace_id
+                    hit = dumps(out)
+                return Response(set_model(hit, alias), media_type="application/json", headers={"x-adi-cache": "hit"})
+            cache_state = "miss"
+
+    # Swarm alias is implemented by sampling multiple times using upstream models
+    if alias == settings.alias_swarm:
+        metric_inc("swarm_requests_total")
         try:
-            out = await with_retries(lambda: openai_chat(client, settings.vllm_text_base_url, payload),
-                                     settings.retries, settings.retry_base_delay, settings.retry_max_delay)
-            out["model"] = alias
-            audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": True})
-            circuit.record_success()
-            return JSONResponse(out)
+            if settings.singleflight_enabled:
+                res = await swarm_flight.do(flight_key, lambda: swarm_pipeline(client, messages))
+            else:
+                res = await swarm_pipeline(client, messages)
         except Exception as e:
             circuit.record_failure(settings.circuit_fail_threshold)
-            dlq_push(settings.dlq_path, {"trace_id": trace_id, "event":"chat_fail","alias":alias,"error":str(e),"body":body})
-            metric_inc("chat_fail_total")
+            dlq_push(settings.dlq_path, {"trace_id": trace_id, "event":"swarm_fail","alias":alias,"error":str(e),"body":body})
+            metric_inc("swarm_fail_total")
             audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": False, "error": str(e)})
+            record("swarm", "error")
             raise HTTPException(status_code=502, detail="backend_error")
+        gate = res["gate"]
+        out = {
+            "id": f"swarm-{trace_id}",
+            "object": "chat.completion",
+            "model": alias,
+            "choices": [{"index":0, "message":{"role":"assistant","content": res["consensus"]}, "finish_reason":"stop"}],
+            "meta": {"trace_id": trace_id, "swarm": res["swarm"], "eval_fast": gate["eval_fast"], "eval_deep": gate["eval_deep"],
+                     "verifier": gate["verifier"], "gate_failed_by": gate["failed_by"],
+                     "timings_ms": tracing.current().timings() if tracing.current() is not None else {}},
+        }
+        audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": True})
+        circuit.record_success()
+        record("swarm", "ok")
+        resp = JSONResponse(out, headers={"x-adi-cache": cache_state})
+        if cache_key:
+            await response_cache.put(cache_key, resp.body)
+        return resp
+
+    if stream:
+        metric_inc("stream_requests_total")
+        async def gen():
+            labels = {"backend_model": backend_model}
+            first = None
+            events, tail = 0, b""
+            replica = upstream_lb.pick(backend_model, settings.vllm_text_base_url, upstream_lb.affinity_key(payload))
+            lb_outcome = "cancelled"
+            t_up = upstream_lb.start(replica)
+            try:
+                async with client.stream("POST", f"{replica.url}/v1/chat/completions", json=payload) as r:
+                    r.raise_for_status()
+                    # relayed as received; SSE framing is the upstream's
+                    async for chunk in r.aiter_bytes():
+                        if first is None:
+                            first = time.perf_counter()
+                            metric_observe("upstream_ttft_seconds", first - t_up, labels)
+                        n, tail = sse_data_lines(tail, chunk)
+                        events += n
+                        yield chunk
+                    events += tail.startswith(b"data:")
+                lb_outcome = "ok"
+                circuit.record_success()
+            except Exception as e:
+                lb_outcome = balancer.failure_outcome(e)
+                circuit.record_failure(settings.circuit_fail_threshold)
+                dlq_push(settings.dlq_path, {"trace_id": trace_id, "event":"stream_fail","error":str(e)})
+                metric_inc("stream_fail_total")
+                record("stream", "error")
+                raise
+            finally:
+                # a stream's length is the caller's choice, so the replica is scored on time to first byte
+                upstream_lb.finish(replica, t_up, lb_outcome, None if first is None else first - t_up)
+            record("stream", "ok")
+            if first is not None and events > 1:
+                # one event per generated token plus the [DONE] sentinel
+                metric_observe("upstream_tokens_per_second", (events - 1) / max(time.perf_counter() - first, 1e-6), labels)
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    metric_inc("chat_requests_total")
+    try:
+        call = lambda: with_retries(lambda: openai_chat_raw(client, settings.vllm_text_base_url, payload),
+                                    settings.retries, settings.retry_base_delay, settings.retry_max_delay)
+        t_up = time.perf_counter()
+        raw = await (chat_flight.do(flight_key, call) if settings.singleflight_enabled else call())
+        tokens = completion_tokens(raw)
+        if tokens:
+            metric_observe("upstream_tokens_per_second", tokens / max(time.perf_counter() - t_up, 1e-6), {"backend_model": backend_model})
+        # upstream bytes go out as they came, with only the model name swapped for the alias
+        out = set_model(raw, alias)
+        audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": True})
+        circuit.record_success()
+        record("json", "ok")
+        resp = Response(out, media_type="application/json", headers={"x-adi-cache": cache_state})
+        if cache_key:
+            await response_cache.put(cache_key, resp.body)
+        return resp
+    except Exception as e:
+        circuit.record_failure(settings.circuit_fail_threshold)
+        dlq_push(settings.dlq_path, {"trace_id": trace_id, "event":"chat_fail","alias":alias,"error":str(e),"body":body})
+        metric_inc("chat_fail_total")
+        audit_write(settings.audit_path, {"trace_id": trace_id, "event":"response", "alias": alias, "ok": False, "error": str(e)})
+        record("json", "error")
+        raise HTTPException(status_code=502, detail="backend_error")
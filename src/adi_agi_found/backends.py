@@ -1,8 +1,35 @@
 from __future__ import annotations
+import time
 from typing import Any, Dict
 import httpx
 
+from . import balancer
+from .fastjson import loads
+from .metrics import observe as metric_observe
+from .tracing import span
+
+async def _post(client: httpx.AsyncClient, base_url: str, payload: Dict[str, Any]) -> bytes:
+    t0 = time.perf_counter()
+    outcome = "error"
+    try:
+        with span("upstream", backend_model=str(payload.get("model", "")), replica=base_url) as s:
+            r = await client.post(f"{base_url}/v1/chat/completions", json=payload)
+            outcome = str(r.status_code)
+            if s is not None:
+                s.attrs["http.status_code"] = r.status_code
+            r.raise_for_status()
+            return r.content
+    finally:
+        metric_observe("upstream_request_seconds", time.perf_counter() - t0,
+                       {"backend_model": str(payload.get("model", "")), "outcome": outcome})
+
+async def openai_chat_raw(client: httpx.AsyncClient, base_url: str, payload: Dict[str, Any]) -> bytes:
+    # base_url is where models without configured replicas go
+    lb = balancer.get()
+    if lb is None:
+        return await _post(client, base_url, payload)
+    return await lb.call(str(payload.get("model", "")), base_url, lambda url: _post(client, url, payload),
+                         key=lb.affinity_key(payload))
+
 async def openai_chat(client: httpx.AsyncClient, base_url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    r = await client.post(f"{base_url}/v1/chat/completions", json=payload)
-    r.raise_for_status()
-    return r.json()
+    return loads(await openai_chat_raw(client, base_url, payload))
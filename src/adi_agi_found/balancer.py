@@ -0,0 +1,229 @@
+from __future__ import annotations
+import asyncio, bisect, hashlib, json, math, random, time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+import httpx
+
+from .config import Settings
+from .metrics import inc as metric_inc, observe as metric_observe, register_collector
+
+T = TypeVar("T")
+
+@dataclass
+class Replica:
+    model: str
+    url: str
+    in_flight: int = 0
+    ewma_sec: float = 0.0
+    failures: int = 0
+    healthy: bool = True
+    ejected_until: float = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    def score(self) -> float:
+        # roughly the wait behind what the replica already has; unmeasured replicas look fast so they get sampled
+        return (self.in_flight + 1) * (self.ewma_sec + 0.001)
+
+def parse_replicas(raw: str) -> Dict[str, List[str]]:
+    if not raw.strip():
+        return {}
+    data = json.loads(raw)
+    if not isinstance(data, dict) or not all(isinstance(v, list) for v in data.values()):
+        raise ValueError('FOUND_UPSTREAM_REPLICAS must be a JSON object of {"model": ["http://replica:8000", ...]}')
+    return {str(m): [str(u).rstrip("/") for u in urls if str(u).strip()] for m, urls in data.items()}
+
+def _hash(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+
+def failure_outcome(e: BaseException) -> str:
+    # a 4xx is the request's fault and a cancel or disconnect is ours; neither counts against the replica
+    if isinstance(e, httpx.HTTPStatusError):
+        return "error" if e.response.status_code >= 500 else "ok"
+    if isinstance(e, Exception):
+        return "error"
+    return "cancelled"
+
+class Balancer:
+    # power of two choices over in-flight requests x EWMA latency; a replica is ejected for eject_sec after
+    # eject_failures consecutive errors or until a /health probe passes again. An error feeds the EWMA at least
+    # error_penalty_sec, so a replica that fails fast never looks like the fastest one.
+    # Requests that carry an affinity key go to the key's owner on a consistent hash ring instead, unless
+    # that replica already has more than load_factor x its fair share of in-flight requests.
+    def __init__(self, replicas: Dict[str, List[str]], *, alpha: float = 0.3, eject_failures: int = 3,
+                 eject_sec: float = 30.0, error_penalty_sec: float = 10.0, health_interval_sec: float = 10.0, health_path: str = "/health",
+                 affinity_messages: int = 2, load_factor: float = 1.25, vnodes: int = 64):
+        self._pools: Dict[str, List[Replica]] = {m: [Replica(m, u) for u in urls] for m, urls in replicas.items() if urls}
+        # models without configured replicas use whatever base url the caller had
+        self._defaults: Dict[Tuple[str, str], List[Replica]] = {}
+        self.alpha = alpha
+        self.eject_failures = max(1, eject_failures)
+        self.eject_sec = eject_sec
+        self.error_penalty_sec = max(0.0, error_penalty_sec)
+        self.health_interval_sec = health_interval_sec
+        self.health_path = health_path
+        self.affinity_messages = affinity_messages
+        self.load_factor = max(1.0, load_factor)
+        self.vnodes = max(1, vnodes)
+        self._rings: Dict[str, Tuple[List[int], List[Replica]]] = {}
+        # model -> [affinity hits, affinity-keyed requests]
+        self._affinity: Dict[str, List[int]] = {}
+
+    def pool(self, model: str, default_url: str) -> List[Replica]:
+        p = self._pools.get(model)
+        if p is None:
+            key = (model, default_url.rstrip("/"))
+            p = self._defaults.get(key)
+            if p is None:
+                p = self._defaults[key] = [Replica(model, key[1])]
+        return p
+
+    def affinity_key(self, payload: Dict[str, Any]) -> Optional[int]:
+        # the system prompt plus the first turns: later turns of a conversation resend them unchanged,
+        # which is exactly the prefix the replica's KV cache still holds
+        msgs = payload.get("messages")
+        if self.affinity_messages <= 0 or not isinstance(msgs, list) or not msgs:
+            return None
+        head = json.dumps(msgs[:self.affinity_messages], sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return _hash(f"{payload.get('model', '')}\n{head}")
+
+    def _owner(self, model: str, pool: List[Replica], key: int, cands: List[Replica]) -> Replica:
+        ring = self._rings.get(model)
+        if ring is None:
+            points = sorted(((_hash(f"{r.url}#{i}"), n) for n, r in enumerate(pool) for i in range(self.vnodes)))
+            ring = self._rings[model] = ([h for h, _ in points], [pool[n] for _, n in points])
+        hashes, owners = ring
+        usable = {id(r) for r in cands}
+        # walk clockwise past replicas that are out, so only their keys move
+        start = bisect.bisect_left(hashes, key)
+        for i in range(len(owners)):
+            r = owners[(start + i) % len(owners)]
+            if id(r) in usable:
+                return r
+        return cands[0]
+
+    def pick(self, model: str, default_url: str, key: Optional[int] = None) -> Replica:
+        pool = self.pool(model, default_url)
+        if len(pool) == 1:
+            return pool[0]
+        now = time.monotonic()
+        # with every replica out, spreading over all of them beats failing outright
+        cands = [r for r in pool if r.available(now)] or pool
+        if key is not None:
+            owner = self._owner(model, pool, key, cands)
+            # bounded load: no replica takes more than load_factor x the mean in-flight, counting this request
+            bound = math.ceil(self.load_factor * (sum(r.in_flight for r in cands) + 1) / len(cands))
+            hit = owner.in_flight + 1 <= bound
+            a = self._affinity.setdefault(model, [0, 0])
+            a[0] += hit
+            a[1] += 1
+            metric_inc("upstream_affinity_requests_total", labels={"model": model, "outcome": "hit" if hit else "overloaded"})
+            if hit:
+                return owner
+            cands = [r for r in cands if r is not owner] or cands
+        if len(cands) == 1:
+            return cands[0]
+        a, b = random.sample(cands, 2)
+        return a if a.score() <= b.score() else b
+
+    def start(self, r: Replica) -> float:
+        r.in_flight += 1
+        return time.perf_counter()
+
+    def finish(self, r: Replica, t0: float, outcome: str, latency: Optional[float] = None) -> None:
+        # outcome is ok, error (the replica's fault) or cancelled (ours); latency defaults to the time since start
+        r.in_flight -= 1
+        labels = {"model": r.model, "replica": r.url}
+        metric_inc("upstream_replica_requests_total", labels={**labels, "outcome": outcome})
+        if outcome == "cancelled":
+            return
+        latency = time.perf_counter() - t0 if latency is None else latency
+        if outcome == "error":
+            latency = max(latency, self.error_penalty_sec)
+        r.ewma_sec = latency if r.ewma_sec == 0.0 else r.ewma_sec + self.alpha * (latency - r.ewma_sec)
+        if outcome == "ok":
+            r.failures = 0
+            metric_observe("upstream_replica_seconds", latency, labels)
+        else:
+            r.failures += 1
+            now = time.monotonic()
+            if r.failures >= self.eject_failures and r.ejected_until <= now:
+                r.ejected_until = now + self.eject_sec
+                metric_inc("upstream_replica_ejections_total", labels=labels)
+
+    async def call(self, model: str, default_url: str, fn: Callable[[str], Awaitable[T]], key: Optional[int] = None) -> T:
+        r = self.pick(model, default_url, key)
+        t0 = self.start(r)
+        outcome = "error"
+        try:
+            out = await fn(r.url)
+            outcome = "ok"
+            return out
+        except BaseException as e:
+            outcome = failure_outcome(e)
+            raise
+        finally:
+            self.finish(r, t0, outcome)
+
+    def replicas(self) -> List[Replica]:
+        seen: Dict[int, Replica] = {}
+        for p in list(self._pools.values()) + list(self._defaults.values()):
+            for r in p:
+                seen[id(r)] = r
+        return list(seen.values())
+
+    async def _probe(self, client: httpx.AsyncClient, r: Replica) -> None:
+        try:
+            ok = (await client.get(f"{r.url}{self.health_path}", timeout=2.0)).status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        labels = {"model": r.model, "replica": r.url}
+        if ok and (not r.healthy or r.ejected_until > time.monotonic()):
+            r.ejected_until = 0.0
+            r.failures = 0
+            # forget the error penalties so the replica gets sampled again rather than starved
+            r.ewma_sec = 0.0
+            metric_inc("upstream_replica_reinstated_total", labels=labels)
+        elif not ok and r.healthy:
+            metric_inc("upstream_replica_ejections_total", labels=labels)
+        r.healthy = ok
+
+    async def check(self, client: httpx.AsyncClient) -> None:
+        await asyncio.gather(*(self._probe(client, r) for r in self.replicas()))
+
+    async def health_loop(self, client: Callable[[], httpx.AsyncClient]) -> None:
+        while True:
+            await asyncio.sleep(self.health_interval_sec)
+            try:
+                await self.check(client())
+            except Exception:
+                metric_inc("upstream_health_check_errors_total")
+
+    def stats(self) -> Dict[Any, float]:
+        now = time.monotonic()
+        out: Dict[Any, float] = {}
+        for r in self.replicas():
+            labels = (("model", r.model), ("replica", r.url))
+            out[("upstream_replica_in_flight", labels)] = r.in_flight
+            out[("upstream_replica_healthy", labels)] = 1 if r.available(now) else 0
+            out[("upstream_replica_ewma_seconds", labels)] = round(r.ewma_sec, 6)
+        for model, (hits, n) in list(self._affinity.items()):
+            out[("upstream_affinity_hit_ratio", (("model", model),))] = round(hits / n, 4) if n else 0.0
+        return out
+
+_balancer: Optional[Balancer] = None
+
+def configure(s: Settings) -> Balancer:
+    global _balancer
+    _balancer = Balancer(parse_replicas(s.upstream_replicas), alpha=s.upstream_ewma_alpha,
+                         eject_failures=s.upstream_eject_failures, eject_sec=s.upstream_eject_sec,
+                         error_penalty_sec=s.upstream_error_penalty_sec,
+                         health_interval_sec=s.upstream_health_interval_sec, health_path=s.upstream_health_path,
+                         affinity_messages=s.upstream_affinity_messages, load_factor=s.upstream_affinity_load_factor)
+    return _balancer
+
+def get() -> Optional[Balancer]:
+    return _balancer
+
+register_collector(lambda: _balancer.stats() if _balancer is not None else {})
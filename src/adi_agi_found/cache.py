@@ -0,0 +1,152 @@
+from __future__ import annotations
+import asyncio, hashlib, json, sqlite3, threading, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from .metrics import inc as metric_inc, register_collector, unregister_collector
+
+# request fields that never change what the backend generates
+_IGNORED_FIELDS = {"stream", "stream_options", "user", "metadata"}
+
+DISK_SCHEMA = r'''
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+CREATE TABLE IF NOT EXISTS response_cache (
+  key TEXT PRIMARY KEY,
+  value BLOB NOT NULL,
+  expires_ts REAL NOT NULL,
+  accessed_ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_cache_accessed ON response_cache(accessed_ts);
+'''
+
+def request_key(model: str, payload: Dict[str, Any]) -> str:
+    body = {k: v for k, v in payload.items() if k not in _IGNORED_FIELDS}
+    body["model"] = model
+    raw = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def cacheable(body: Dict[str, Any]) -> bool:
+    try:
+        temperature = float(body.get("temperature", 1.0))
+    except (TypeError, ValueError):
+        return False
+    try:
+        n = int(body.get("n") or 1)
+    except (TypeError, ValueError):
+        return False
+    return temperature == 0.0 and not body.get("stream") and n == 1
+
+class ResponseCache:
+    def __init__(self, *, max_entries: int, max_bytes: int, ttl_sec: float,
+                 disk_path: str = "", disk_max_entries: int = 100000):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.ttl_sec = ttl_sec
+        self.disk_max_entries = disk_max_entries
+        self._mem: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._disk: Optional[sqlite3.Connection] = None
+        self._disk_lock = threading.Lock()
+        self._disk_puts = 0
+        if disk_path:
+            Path(disk_path).expanduser().resolve().parent.mkdir(parents=True, exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False)
+            self._disk.executescript(DISK_SCHEMA)
+            self._disk.execute("PRAGMA mmap_size=268435456")
+        register_collector(self.stats, "response_cache")
+
+    def _evict(self) -> None:
+        while self._mem and (len(self._mem) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, value) = self._mem.popitem(last=False)
+            self._bytes -= len(value)
+            metric_inc("cache_evictions_total")
+
+    def _mem_get(self, key: str, now: float) -> Optional[bytes]:
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= now:
+                del self._mem[key]
+                self._bytes -= len(value)
+                return None
+            self._mem.move_to_end(key)
+            return value
+
+    def _mem_put(self, key: str, value: bytes, expires: float) -> None:
+        with self._lock:
+            old = self._mem.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._mem[key] = (expires, value)
+            self._bytes += len(value)
+            self._evict()
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, bytes]]:
+        with self._disk_lock:
+            row = self._disk.execute("SELECT value, expires_ts FROM response_cache WHERE key=?", (key,)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            self._disk.execute("UPDATE response_cache SET accessed_ts=? WHERE key=?", (now, key))
+            self._disk.commit()
+            return float(row[1]), bytes(row[0])
+
+    def _disk_put(self, key: str, value: bytes, expires: float, now: float) -> None:
+        with self._disk_lock:
+            self._disk.execute(
+                "INSERT OR REPLACE INTO response_cache(key,value,expires_ts,accessed_ts) VALUES (?,?,?,?)",
+                (key, value, expires, now),
+            )
+            self._disk_puts += 1
+            if self._disk_puts % 256 == 0:
+                self._disk.execute("DELETE FROM response_cache WHERE expires_ts<=?", (now,))
+                self._disk.execute(
+                    "DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache ORDER BY accessed_ts DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+            self._disk.commit()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        value = self._mem_get(key, now)
+        if value is None and self._disk is not None:
+            found = await asyncio.to_thread(self._disk_get, key, now)
+            if found is not None:
+                expires, value = found
+                self._mem_put(key, value, expires)
+        with self._lock:
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        metric_inc("cache_misses_total" if value is None else "cache_hits_total")
+        return value
+
+    async def put(self, key: str, value: bytes) -> None:
+        now = time.time()
+        expires = now + self.ttl_sec
+        self._mem_put(key, value, expires)
+        if self._disk is not None:
+            await asyncio.to_thread(self._disk_put, key, value, expires, now)
+
+    def close(self) -> None:
+        unregister_collector("response_cache", self.stats)
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "cache_entries": len(self._mem),
+                "cache_bytes": self._bytes,
+                "cache_hit_ratio": round(self._hits / total, 4) if total else 0.0,
+            }
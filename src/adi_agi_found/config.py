@@ -16,6 +16,25 @@ class Settings:
     tts_base_url: str = os.getenv("FOUND_TTS_BASE_URL","http://tts:7002").rstrip("/")
     sandbox_base_url: str = os.getenv("FOUND_SANDBOX_BASE_URL","http://sandbox:7010").rstrip("/")
 
+    upstream_max_connections: int = int(os.getenv("FOUND_UPSTREAM_MAX_CONNECTIONS","100"))
+    upstream_max_keepalive: int = int(os.getenv("FOUND_UPSTREAM_MAX_KEEPALIVE","20"))
+    upstream_keepalive_expiry: float = float(os.getenv("FOUND_UPSTREAM_KEEPALIVE_EXPIRY","30.0"))
+    upstream_per_host_limit: int = int(os.getenv("FOUND_UPSTREAM_PER_HOST_LIMIT","50"))
+    upstream_http2: bool = _b("FOUND_UPSTREAM_HTTP2","false")
+    upstream_connect_timeout: float = float(os.getenv("FOUND_UPSTREAM_CONNECT_TIMEOUT","5.0"))
+    upstream_read_timeout: float = float(os.getenv("FOUND_UPSTREAM_READ_TIMEOUT","300.0"))
+    upstream_write_timeout: float = float(os.getenv("FOUND_UPSTREAM_WRITE_TIMEOUT","30.0"))
+    upstream_pool_timeout: float = float(os.getenv("FOUND_UPSTREAM_POOL_TIMEOUT","10.0"))
+    upstream_replicas: str = os.getenv("FOUND_UPSTREAM_REPLICAS","")
+    upstream_ewma_alpha: float = float(os.getenv("FOUND_UPSTREAM_EWMA_ALPHA","0.3"))
+    upstream_eject_failures: int = int(os.getenv("FOUND_UPSTREAM_EJECT_FAILURES","3"))
+    upstream_eject_sec: float = float(os.getenv("FOUND_UPSTREAM_EJECT_SEC","30"))
+    upstream_error_penalty_sec: float = float(os.getenv("FOUND_UPSTREAM_ERROR_PENALTY_SEC","10"))
+    upstream_health_interval_sec: float = float(os.getenv("FOUND_UPSTREAM_HEALTH_INTERVAL_SEC","10"))
+    upstream_health_path: str = os.getenv("FOUND_UPSTREAM_HEALTH_PATH","/health")
+    upstream_affinity_messages: int = int(os.getenv("FOUND_UPSTREAM_AFFINITY_MESSAGES","2"))
+    upstream_affinity_load_factor: float = float(os.getenv("FOUND_UPSTREAM_AFFINITY_LOAD_FACTOR","1.25"))
+
     model_id_7b: str = os.getenv("FOUND_MODEL_ID_7B","deepseek-ai/DeepSeek-R1-Distill-Qwen-7B")
     model_id_30b: str = os.getenv("FOUND_MODEL_ID_30B","deepseek-ai/DeepSeek-R1-Distill-Qwen-32B")
     model_id_70b: str = os.getenv("FOUND_MODEL_ID_70B","deepseek-ai/DeepSeek-R1-Distill-Llama-70B")
@@ -37,19 +56,78 @@ class Settings:
 
     dlq_path: str = os.getenv("FOUND_DLQ_PATH","data/dlq.jsonl")
     audit_path: str = os.getenv("FOUND_AUDIT_LOG_PATH","data/audit.jsonl")
+    log_async: bool = _b("FOUND_LOG_ASYNC","true")
+    log_queue_size: int = int(os.getenv("FOUND_LOG_QUEUE_SIZE","10000"))
+    log_queue_full_policy: str = os.getenv("FOUND_LOG_QUEUE_FULL_POLICY","block").strip().lower()
+    log_sample_every: int = int(os.getenv("FOUND_LOG_SAMPLE_EVERY","10"))
+    log_block_timeout_sec: float = float(os.getenv("FOUND_LOG_BLOCK_TIMEOUT_SEC","0.05"))
+    log_flush_interval_sec: float = float(os.getenv("FOUND_LOG_FLUSH_INTERVAL_SEC","0.2"))
+    log_flush_bytes: int = int(os.getenv("FOUND_LOG_FLUSH_BYTES","262144"))
+    log_rotate_bytes: int = int(os.getenv("FOUND_LOG_ROTATE_BYTES","0"))
+    log_rotate_seconds: float = float(os.getenv("FOUND_LOG_ROTATE_SECONDS","0"))
+    log_compress: bool = _b("FOUND_LOG_COMPRESS","false")
+    trace_buffer_size: int = int(os.getenv("FOUND_TRACE_BUFFER_SIZE","256"))
+    trace_sample_rate: float = float(os.getenv("FOUND_TRACE_SAMPLE_RATE","0.1"))
+    trace_slow_ms: float = float(os.getenv("FOUND_TRACE_SLOW_MS","1000"))
 
     circuit_fail_threshold: int = int(os.getenv("FOUND_CIRCUIT_FAIL_THRESHOLD","5"))
     circuit_reset_seconds: int = int(os.getenv("FOUND_CIRCUIT_RESET_SECONDS","30"))
 
+    singleflight_enabled: bool = _b("FOUND_SINGLEFLIGHT_ENABLED","true")
+
+    cache_enabled: bool = _b("FOUND_CACHE_ENABLED","false")
+    cache_max_entries: int = int(os.getenv("FOUND_CACHE_MAX_ENTRIES","10000"))
+    cache_max_bytes: int = int(os.getenv("FOUND_CACHE_MAX_BYTES","268435456"))
+    cache_ttl_sec: float = float(os.getenv("FOUND_CACHE_TTL_SEC","3600"))
+    cache_disk_path: str = os.getenv("FOUND_CACHE_DISK_PATH","").strip()
+    cache_disk_max_entries: int = int(os.getenv("FOUND_CACHE_DISK_MAX_ENTRIES","100000"))
+
     memory_db_path: str = os.getenv("FOUND_MEMORY_DB_PATH","data/memory.sqlite3")
+    memory_shards: int = int(os.getenv("FOUND_MEMORY_SHARDS","1"))
+    memory_readers: int = int(os.getenv("FOUND_MEMORY_READERS","4"))
+    memory_synchronous: str = os.getenv("FOUND_MEMORY_SYNCHRONOUS","NORMAL").strip().upper()
+    memory_cache_size_kb: int = int(os.getenv("FOUND_MEMORY_CACHE_SIZE_KB","20000"))
+    memory_mmap_size: int = int(os.getenv("FOUND_MEMORY_MMAP_SIZE","268435456"))
+    memory_bulk_batch_size: int = int(os.getenv("FOUND_MEMORY_BULK_BATCH_SIZE","5000"))
+    memory_busy_timeout_ms: int = int(os.getenv("FOUND_MEMORY_BUSY_TIMEOUT_MS","5000"))
+    memory_compact_interval_sec: float = float(os.getenv("FOUND_MEMORY_COMPACT_INTERVAL_SEC","300"))
+    memory_compact_chunk: int = int(os.getenv("FOUND_MEMORY_COMPACT_CHUNK","500"))
+    memory_fact_ttl_sec: float = float(os.getenv("FOUND_MEMORY_FACT_TTL_SEC","0"))
+    memory_max_facts: int = int(os.getenv("FOUND_MEMORY_MAX_FACTS","0"))
+    memory_vacuum_pages: int = int(os.getenv("FOUND_MEMORY_VACUUM_PAGES","256"))
+    memory_convert_auto_vacuum: bool = _b("FOUND_MEMORY_CONVERT_AUTO_VACUUM","true")
 
     sandbox_workdir: str = os.getenv("FOUND_SANDBOX_WORKDIR","data/sandbox_work")
     sandbox_timeout_sec: float = float(os.getenv("FOUND_SANDBOX_TIMEOUT_SEC","2.0"))
+    sandbox_pool_size: int = int(os.getenv("FOUND_SANDBOX_POOL_SIZE","4"))
+    sandbox_pool_max_tasks: int = int(os.getenv("FOUND_SANDBOX_POOL_MAX_TASKS","200"))
+    sandbox_queue_timeout_sec: float = float(os.getenv("FOUND_SANDBOX_QUEUE_TIMEOUT_SEC","10.0"))
+    sandbox_concurrency: int = int(os.getenv("FOUND_SANDBOX_CONCURRENCY","4"))
+    sandbox_max_queue: int = int(os.getenv("FOUND_SANDBOX_MAX_QUEUE","32"))
+    sandbox_cpu_sec: float = float(os.getenv("FOUND_SANDBOX_CPU_SEC","2.0"))
+    sandbox_memory_mb: int = int(os.getenv("FOUND_SANDBOX_MEMORY_MB","256"))
+    sandbox_code_cache_size: int = int(os.getenv("FOUND_SANDBOX_CODE_CACHE_SIZE","1024"))
+    sandbox_batch_max_items: int = int(os.getenv("FOUND_SANDBOX_BATCH_MAX_ITEMS","64"))
+    sandbox_batch_concurrency: int = int(os.getenv("FOUND_SANDBOX_BATCH_CONCURRENCY","4"))
+    sandbox_backend: str = os.getenv("FOUND_SANDBOX_BACKEND","local").strip().lower()
+    sandbox_remote_urls: str = os.getenv("FOUND_SANDBOX_REMOTE_URLS","")
+    sandbox_remote_fallback: bool = _b("FOUND_SANDBOX_REMOTE_FALLBACK","true")
+    sandbox_remote_eject_failures: int = int(os.getenv("FOUND_SANDBOX_REMOTE_EJECT_FAILURES","3"))
+    sandbox_health_interval_sec: float = float(os.getenv("FOUND_SANDBOX_HEALTH_INTERVAL_SEC","5.0"))
 
     swarm_n: int = int(os.getenv("FOUND_SWARM_N","3"))
     swarm_mode: str = os.getenv("FOUND_SWARM_MODE","weighted").strip().lower()
     swarm_weight_fast: float = float(os.getenv("FOUND_SWARM_WEIGHT_FAST","1.0"))
     swarm_weight_deep: float = float(os.getenv("FOUND_SWARM_WEIGHT_DEEP","1.5"))
     swarm_require_verifier: bool = _b("FOUND_SWARM_REQUIRE_VERIFIER","true")
+    swarm_similarity_threshold: float = float(os.getenv("FOUND_SWARM_SIMILARITY_THRESHOLD","0.85"))
+    swarm_skip_deep_eval_on_unanimous: bool = _b("FOUND_SWARM_SKIP_DEEP_EVAL_ON_UNANIMOUS","false")
+    swarm_fanout: int = int(os.getenv("FOUND_SWARM_FANOUT","4"))
+    swarm_candidate_timeout_sec: float = float(os.getenv("FOUND_SWARM_CANDIDATE_TIMEOUT_SEC","120.0"))
+    swarm_sampling: str = os.getenv("FOUND_SWARM_SAMPLING","fixed").strip().lower()
+    swarm_min_samples: int = int(os.getenv("FOUND_SWARM_MIN_SAMPLES","2"))
+    swarm_wave_size: int = int(os.getenv("FOUND_SWARM_WAVE_SIZE","2"))
+    swarm_budget_tokens: int = int(os.getenv("FOUND_SWARM_BUDGET_TOKENS","0"))
+    swarm_budget_sec: float = float(os.getenv("FOUND_SWARM_BUDGET_SEC","0"))
 
     api_key: str = os.getenv("FOUND_API_KEY","").strip()
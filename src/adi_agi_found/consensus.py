@@ -0,0 +1,84 @@
+from __future__ import annotations
+import string
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+import numpy as np
+
+_BITS = 12
+_DIM = 1 << _BITS
+_K = 4
+_PUNCT = str.maketrans({c: " " for c in string.punctuation})
+_DIGITS = bytes(c if 48 <= c <= 57 else 32 for c in range(256))
+
+@dataclass
+class Cluster:
+    members: List[int] = field(default_factory=list)
+    weight: float = 0.0
+    representative: int = -1
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().translate(_PUNCT).split())
+
+def _vectorize(norm: Sequence[str]) -> np.ndarray:
+    # hashed character k-gram counts, one row per candidate
+    m = np.zeros((len(norm), _DIM), dtype=np.float32)
+    for i, t in enumerate(norm):
+        b = np.frombuffer(t.encode("utf-8").ljust(_K), dtype=np.uint8).astype(np.uint32)
+        grams = (b[:-3] << 24) | (b[1:-2] << 16) | (b[2:-1] << 8) | b[3:]
+        buckets = ((grams * np.uint32(2654435761)) >> np.uint32(32 - _BITS)).astype(np.intp)
+        m[i] = np.bincount(buckets, minlength=_DIM)
+    return m
+
+def similarity(texts: Sequence[str]) -> np.ndarray:
+    norm = [normalize(t) for t in texts]
+    n = len(norm)
+    if n == 0:
+        return np.zeros((0, 0), dtype=np.float32)
+    tf = np.log1p(_vectorize(norm))
+    df = np.count_nonzero(tf, axis=0)
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    v = tf * idf.astype(np.float32)
+    norms = np.linalg.norm(v, axis=1)
+    norms[norms == 0] = 1.0
+    v /= norms[:, None]
+    sim = v @ v.T
+    # different numbers mean different answers, however close the wording; applied to every overlapping
+    # pair so the result does not depend on where a caller puts its clustering threshold
+    nums: Dict[int, Tuple[str, ...]] = {}
+    for i, j in zip(*np.nonzero(np.triu(sim, 1) > 0)):
+        if norm[i] == norm[j]:
+            sim[i, j] = sim[j, i] = 1.0
+            continue
+        for k in (i, j):
+            if k not in nums:
+                nums[k] = tuple(sorted(norm[k].encode("utf-8").translate(_DIGITS).split()))
+        if nums[i] != nums[j]:
+            sim[i, j] = sim[j, i] = 0.0
+    np.fill_diagonal(sim, 1.0)
+    return sim
+
+def cluster(texts: Sequence[str], weights: Sequence[float], threshold: float = 0.85) -> List[Cluster]:
+    sim = similarity(texts)
+    clusters: List[Cluster] = []
+    # leader clustering, heaviest candidates seed clusters first
+    for i in sorted(range(len(texts)), key=lambda k: (-weights[k], k)):
+        for c in clusters:
+            if sim[c.members[0], i] >= threshold:
+                c.members.append(i)
+                c.weight += weights[i]
+                break
+        else:
+            clusters.append(Cluster(members=[i], weight=float(weights[i])))
+    w = np.asarray(weights, dtype=np.float32)
+    for c in clusters:
+        idx = np.asarray(c.members)
+        centrality = sim[np.ix_(idx, idx)] @ w[idx]
+        c.representative = int(idx[int(np.argmax(centrality))])
+    clusters.sort(key=lambda c: (-c.weight, min(c.members)))
+    return clusters
+
+def vote(cands: Sequence[Tuple[str, float]], threshold: float = 0.85, by_count: bool = False) -> Tuple[str, List[Cluster]]:
+    texts = [t.strip() for t, _ in cands]
+    weights = [1.0 if by_count else float(w) for _, w in cands]
+    clusters = cluster(texts, weights, threshold)
+    return (texts[clusters[0].representative] if clusters else ""), clusters
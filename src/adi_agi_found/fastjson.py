@@ -0,0 +1,53 @@
+from __future__ import annotations
+import json, re
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # optional speedup, see the "speedups" extra
+    orjson = None
+
+def loads(raw: bytes | str) -> Any:
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# whole strings and structural characters only; the regex engine skips string contents, so braces inside them never count
+_TOKENS = re.compile(rb'"(?:[^"\\]|\\.)*"|[{}\[\]]', re.S)
+_COLON = re.compile(rb'\s*:\s*')
+
+def set_model(raw: bytes, model: str) -> bytes:
+    # rewrites the top-level "model" string in place; OpenAI-style bodies put it before "choices", so the scan stops early
+    depth = 0
+    tokens = _TOKENS.finditer(raw)
+    for tok in tokens:
+        t = tok.group()
+        if t in (b"{", b"["):
+            depth += 1
+        elif t in (b"}", b"]"):
+            depth -= 1
+            if depth == 0:
+                break
+        elif depth == 1 and t == b'"model"':
+            colon = _COLON.match(raw, tok.end())
+            if colon is None:
+                continue
+            value = next(tokens, None)
+            if value is None or value.start() != colon.end() or value.group()[:1] != b'"':
+                break
+            return raw[:value.start()] + dumps(model) + raw[value.end():]
+    # no top-level string "model" to swap: parse and re-serialize
+    out = loads(raw)
+    out["model"] = model
+    return dumps(out)
+
+_COMPLETION_TOKENS = re.compile(rb'"completion_tokens"\s*:\s*(\d+)')
+
+def completion_tokens(raw: bytes) -> int:
+    # usage trails the body, so search from its last mention rather than parsing
+    i = raw.rfind(b'"completion_tokens"')
+    m = _COMPLETION_TOKENS.match(raw, i) if i >= 0 else None
+    return int(m.group(1)) if m else 0
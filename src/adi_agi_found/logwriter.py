@@ -0,0 +1,200 @@
+from __future__ import annotations
+import atexit, gzip, os, queue, shutil, threading, time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .config import Settings
+from .metrics import inc as metric_inc, observe as metric_observe, register_collector
+
+class GroupCommitWriter:
+    # appends lines to one file from a background thread, one write() per flush window
+    def __init__(self, path: str, *, name: str, queue_size: int, flush_interval: float, flush_bytes: int,
+                 rotate_bytes: int = 0, rotate_seconds: float = 0, compress: bool = False,
+                 full_policy: str = "block", sample_every: int = 10, block_timeout: float = 0.05):
+        self.path = Path(path).expanduser().resolve()
+        self.name = name
+        self.flush_interval = max(0.001, flush_interval)
+        self.flush_bytes = max(1, flush_bytes)
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.full_policy = full_policy
+        self.sample_every = max(1, sample_every)
+        self.block_timeout = max(0.0, block_timeout)
+        self._q: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=max(1, queue_size))
+        self._high_water = max(1, int(self._q.maxsize * 0.75))
+        self._sampled = 0
+        self._f = None
+        self._opened_at = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"{name}-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, line: str) -> bool:
+        if self._closed:
+            return False
+        if self.full_policy == "sample" and self._q.qsize() >= self._high_water:
+            self._sampled += 1
+            if self._sampled % self.sample_every:
+                metric_inc(f"{self.name}_writer_dropped_total")
+                return False
+        try:
+            # submit runs on the event loop, so "block" waits a bounded time, and not at all for a dead writer
+            if self.full_policy == "block" and self._thread.is_alive():
+                self._q.put(line, timeout=self.block_timeout)
+            else:
+                self._q.put_nowait(line)
+            return True
+        except queue.Full:
+            metric_inc(f"{self.name}_writer_dropped_total")
+            return False
+
+    def depth(self) -> int:
+        return self._q.qsize()
+
+    def flush(self) -> None:
+        self._q.join()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(None)
+        self._thread.join()
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.path.open("a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _close_file(self) -> None:
+        f, self._f = self._f, None
+        if f is not None:
+            try:
+                f.close()
+            except OSError:
+                pass
+
+    def _rotate(self) -> None:
+        self._close_file()
+        target = self.path.with_name(f"{self.path.name}.{time.strftime('%Y%m%d-%H%M%S')}")
+        n = 1
+        while target.exists() or target.with_name(target.name + ".gz").exists():
+            target = self.path.with_name(f"{self.path.name}.{time.strftime('%Y%m%d-%H%M%S')}.{n}")
+            n += 1
+        os.replace(self.path, target)
+        if self.compress:
+            with target.open("rb") as src, gzip.open(str(target) + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            target.unlink()
+        metric_inc(f"{self.name}_writer_rotations_total")
+
+    def _should_rotate(self) -> bool:
+        if self._f is None:
+            return False
+        if self.rotate_bytes and self._f.tell() >= self.rotate_bytes:
+            return True
+        return bool(self.rotate_seconds) and (time.time() - self._opened_at) >= self.rotate_seconds
+
+    def _drain(self) -> Tuple[List[str], bool]:
+        try:
+            first = self._q.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return [], False
+        items = [first]
+        size = len(first or "")
+        deadline = time.monotonic() + self.flush_interval
+        while first is not None and size < self.flush_bytes:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            if item is None:
+                break
+            size += len(item)
+        return items, items[-1] is None
+
+    def _run(self) -> None:
+        while True:
+            items, stop = self._drain()
+            lines = [x for x in items if x is not None]
+            t0 = time.perf_counter()
+            written = False
+            # nothing here may kill the thread: submitters would fill the queue and stall behind it
+            try:
+                if lines:
+                    if self._f is None:
+                        self._open()
+                    self._f.write("".join(lines))
+                    self._f.flush()
+                    written = True
+                if self._should_rotate():
+                    self._rotate()
+            except Exception:
+                metric_inc(f"{self.name}_writer_errors_total")
+                if not written:
+                    metric_inc(f"{self.name}_writer_dropped_total", len(lines))
+                self._close_file()
+            if lines:
+                metric_observe(f"{self.name}_writer_flush_seconds", time.perf_counter() - t0)
+                metric_inc(f"{self.name}_writer_flush_total")
+            for _ in items:
+                self._q.task_done()
+            if stop:
+                self._close_file()
+                return
+
+_settings: Optional[Settings] = None
+_writers: Dict[str, GroupCommitWriter] = {}
+_writers_lock = threading.Lock()
+
+def configure(s: Settings) -> None:
+    global _settings
+    _settings = s
+
+def get_writer(path: str, name: str) -> GroupCommitWriter:
+    key = str(Path(path).expanduser().resolve())
+    w = _writers.get(key)
+    if w is not None:
+        return w
+    with _writers_lock:
+        w = _writers.get(key)
+        if w is None:
+            s = _settings or Settings()
+            w = _writers[key] = GroupCommitWriter(
+                key, name=name, queue_size=s.log_queue_size, flush_interval=s.log_flush_interval_sec,
+                flush_bytes=s.log_flush_bytes, rotate_bytes=s.log_rotate_bytes, rotate_seconds=s.log_rotate_seconds,
+                compress=s.log_compress, full_policy=s.log_queue_full_policy, sample_every=s.log_sample_every,
+                block_timeout=s.log_block_timeout_sec,
+            )
+        return w
+
+def append(path: str, line: str, name: str) -> None:
+    s = _settings or Settings()
+    if not s.log_async:
+        p = Path(path).resolve()
+        p.parent.mkdir(parents=True, exist_ok=True)
+        with p.open("a", encoding="utf-8") as f:
+            f.write(line)
+        return
+    get_writer(path, name).submit(line)
+
+def close_all() -> None:
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for w in writers:
+        w.close()
+
+def _collect() -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for w in list(_writers.values()):
+        out[f"{w.name}_writer_queue_depth"] = out.get(f"{w.name}_writer_queue_depth", 0) + w.depth()
+    return out
+
+register_collector(_collect)
+atexit.register(close_all)
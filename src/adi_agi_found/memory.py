@@ -1,10 +1,19 @@
 from __future__ import annotations
-import sqlite3, time
-from dataclasses import dataclass
+import asyncio, base64, logging, re, sqlite3, threading, time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Coroutine, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+from .metrics import inc as metric_inc, observe as metric_observe, set_gauge
+from .tracing import span
+
+T = TypeVar("T")
+_log = logging.getLogger(__name__)
+Fact = Tuple[str, str, str, str, float, str]
 
 SCHEMA = r'''
+PRAGMA auto_vacuum=INCREMENTAL;
 PRAGMA journal_mode=WAL;
 CREATE TABLE IF NOT EXISTS facts (
   id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -14,7 +23,9 @@ CREATE TABLE IF NOT EXISTS facts (
   polarity TEXT NOT NULL,
   confidence REAL NOT NULL,
   provenance TEXT,
-  created_ts INTEGER
+  created_ts INTEGER,
+  occurrences INTEGER NOT NULL DEFAULT 1,
+  last_seen_ts INTEGER
 );
 CREATE INDEX IF NOT EXISTS idx_facts_sp ON facts(subject, predicate);
 
@@ -24,73 +35,585 @@ CREATE TABLE IF NOT EXISTS contradictions (
   fact_b_id INTEGER NOT NULL,
   reason TEXT NOT NULL,
   created_ts INTEGER,
+  subject TEXT,
+  predicate TEXT,
   FOREIGN KEY(fact_a_id) REFERENCES facts(id),
   FOREIGN KEY(fact_b_id) REFERENCES facts(id)
 );
 CREATE INDEX IF NOT EXISTS idx_contra_facta ON contradictions(fact_a_id);
+CREATE INDEX IF NOT EXISTS idx_contra_factb ON contradictions(fact_b_id);
+
+-- one row per distinct (subject, predicate, object, polarity): the fact that represents it and how many rows share it
+CREATE TABLE IF NOT EXISTS fact_objects (
+  subject TEXT NOT NULL,
+  predicate TEXT NOT NULL,
+  object TEXT NOT NULL,
+  polarity TEXT NOT NULL,
+  max_conf REAL NOT NULL,
+  rep_fact_id INTEGER NOT NULL,
+  n INTEGER NOT NULL,
+  PRIMARY KEY(subject, predicate, object, polarity)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_fact_objects_conf ON fact_objects(subject, predicate, polarity, max_conf);
 '''
 
+BACKFILL_FACT_OBJECTS = (
+    "INSERT INTO fact_objects(subject,predicate,object,polarity,max_conf,rep_fact_id,n) "
+    "SELECT subject, predicate, object, polarity, MAX(confidence), id, COUNT(*) FROM facts "
+    "GROUP BY subject, predicate, object, polarity"
+)
+
+UPSERT_FACT_OBJECT = (
+    "INSERT INTO fact_objects(subject,predicate,object,polarity,max_conf,rep_fact_id,n) VALUES (?,?,?,?,?,?,?) "
+    "ON CONFLICT(subject,predicate,object,polarity) DO UPDATE SET n=n+excluded.n, "
+    "rep_fact_id=CASE WHEN excluded.max_conf>max_conf THEN excluded.rep_fact_id ELSE rep_fact_id END, "
+    "max_conf=MAX(max_conf, excluded.max_conf)"
+)
+
+# columns added after the first release, with the statement that fills them for existing rows
+MIGRATIONS = [
+    ("facts", "occurrences", "ALTER TABLE facts ADD COLUMN occurrences INTEGER NOT NULL DEFAULT 1", None),
+    ("facts", "last_seen_ts", "ALTER TABLE facts ADD COLUMN last_seen_ts INTEGER",
+     "UPDATE facts SET last_seen_ts=created_ts WHERE last_seen_ts IS NULL"),
+    ("contradictions", "subject", "ALTER TABLE contradictions ADD COLUMN subject TEXT", None),
+    ("contradictions", "predicate", "ALTER TABLE contradictions ADD COLUMN predicate TEXT",
+     "UPDATE contradictions SET (subject, predicate, created_ts) = "
+     "(SELECT f.subject, f.predicate, COALESCE(contradictions.created_ts, 0) FROM facts f WHERE f.id=contradictions.fact_a_id)"),
+]
+
+def _migrate(c: sqlite3.Connection) -> None:
+    with c:
+        for table, col, ddl, fill in MIGRATIONS:
+            if col not in {str(r[1]) for r in c.execute(f"PRAGMA table_info({table})")}:
+                c.execute(ddl)
+                if fill:
+                    c.execute(fill)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_facts_seen ON facts(last_seen_ts)")
+        # a page of contradictions for one subject/predicate is a single range scan in cursor order
+        c.execute("CREATE INDEX IF NOT EXISTS idx_contra_sp_ts ON contradictions(subject, predicate, created_ts DESC, id DESC)")
+        if c.execute("SELECT 1 FROM sqlite_master WHERE name='facts_fts'").fetchone() is None:
+            try:
+                for ddl in FTS_SCHEMA:
+                    c.execute(ddl)
+            except sqlite3.OperationalError:
+                raise RuntimeError("sqlite3 was built without FTS5")
+
+# full-text index over facts, kept in step by triggers inside the same write transaction
+FTS_SCHEMA = [
+    "CREATE VIRTUAL TABLE facts_fts USING fts5(subject, predicate, object, provenance, "
+    "content='facts', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')",
+    "CREATE TRIGGER facts_fts_ai AFTER INSERT ON facts BEGIN "
+    "INSERT INTO facts_fts(rowid, subject, predicate, object, provenance) VALUES (new.id, new.subject, new.predicate, new.object, new.provenance); END",
+    "CREATE TRIGGER facts_fts_ad AFTER DELETE ON facts BEGIN "
+    "INSERT INTO facts_fts(facts_fts, rowid, subject, predicate, object, provenance) "
+    "VALUES ('delete', old.id, old.subject, old.predicate, old.object, old.provenance); END",
+    "CREATE TRIGGER facts_fts_au AFTER UPDATE OF subject, predicate, object, provenance ON facts BEGIN "
+    "INSERT INTO facts_fts(facts_fts, rowid, subject, predicate, object, provenance) "
+    "VALUES ('delete', old.id, old.subject, old.predicate, old.object, old.provenance); "
+    "INSERT INTO facts_fts(rowid, subject, predicate, object, provenance) VALUES (new.id, new.subject, new.predicate, new.object, new.provenance); END",
+    "INSERT INTO facts_fts(facts_fts) VALUES ('rebuild')",
+]
+
+# column weights for bm25: subject, predicate, object, provenance
+FTS_RANK = "bm25(facts_fts, 4.0, 2.0, 3.0, 1.0)"
+
+def fts_query(q: str, mode: str = "all") -> str:
+    # every word is a prefix term; "any" ORs them so partial matches still rank, just lower
+    words = re.findall(r"\w+", q.lower())
+    if not words:
+        raise ValueError("empty query")
+    if mode not in ("all", "any"):
+        raise ValueError("mode must be all or any")
+    return (" OR " if mode == "any" else " AND ").join(f'"{w}"*' for w in words)
+
+def encode_cursor(key: Any, rowid: int) -> str:
+    return base64.urlsafe_b64encode(f"{key!r}:{rowid}".encode("ascii")).decode("ascii")
+
+def decode_cursor(cursor: str, kind: Callable[[str], Any] = int) -> Tuple[Any, int]:
+    try:
+        key, rowid = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split(":")
+        return kind(key), int(rowid)
+    except (ValueError, UnicodeError):
+        raise ValueError("invalid cursor")
+
+def run_sync(coro: Coroutine[Any, Any, T]) -> T:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    coro.close()
+    raise RuntimeError("called from a running event loop; await the async variant instead")
+
+def export_compaction(stats: Dict[str, float]) -> None:
+    metric_inc("memory_compaction_runs_total")
+    for k, v in stats.items():
+        if k.startswith("memory_"):
+            set_gauge(k, v)
+        else:
+            metric_inc(f"memory_compaction_{k}_total", int(v))
+
+def _normalize(polarity: str, confidence: float) -> Tuple[str, float]:
+    polarity = (polarity or "true").strip().lower()
+    if polarity not in ("true","false"):
+        polarity = "true"
+    return polarity, float(confidence)
+
+OPPOSITE_POLARITY_MIN_CONF = 0.7
+OTHER_OBJECT_MIN_CONF = 0.8
+
+def _reason(object_: str, polarity: str, confidence: float, other_obj: str, other_pol: str, other_conf: float) -> str | None:
+    if other_obj == object_ and other_pol != polarity and (other_conf >= OPPOSITE_POLARITY_MIN_CONF and confidence >= OPPOSITE_POLARITY_MIN_CONF):
+        return "opposite_polarity_same_object"
+    if other_obj != object_ and other_pol == "true" and polarity == "true" and (other_conf >= OTHER_OBJECT_MIN_CONF and confidence >= OTHER_OBJECT_MIN_CONF):
+        return "different_object_same_subject_predicate"
+    return None
+
 @dataclass
 class Memory:
     path: str
+    readers: int = 4
+    synchronous: str = "NORMAL"
+    cache_size_kb: int = 20000
+    mmap_size: int = 268435456
+    busy_timeout_ms: int = 5000
+    id_base: int = 0
+    convert_auto_vacuum: bool = True
+    _writer: ThreadPoolExecutor = field(init=False, repr=False)
+    _reader: ThreadPoolExecutor = field(init=False, repr=False)
+    _local: threading.local = field(init=False, repr=False)
+    _conns: List[sqlite3.Connection] = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        # one writer thread owns all writes; readers each keep their own WAL connection
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory-writer")
+        self._reader = ThreadPoolExecutor(max_workers=max(1, self.readers), thread_name_prefix="memory-reader")
+        self._local = threading.local()
+        self._conns = []
 
     def _conn(self) -> sqlite3.Connection:
-        Path(self.path).expanduser().resolve().parent.mkdir(parents=True, exist_ok=True)
-        conn = sqlite3.connect(self.path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            Path(self.path).expanduser().resolve().parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.busy_timeout_ms / 1000.0)
+            conn.row_factory = sqlite3.Row
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            self._local.conn = conn
+            self._conns.append(conn)
         return conn
 
+    def _submit(self, pool: ThreadPoolExecutor, fn: Callable[..., T], *args: Any, **kw: Any) -> "Future[T]":
+        labels = {"op": fn.__name__.lstrip("_"), "pool": "write" if pool is self._writer else "read"}
+        def call() -> T:
+            t0 = time.perf_counter()
+            try:
+                return fn(self._conn(), *args, **kw)
+            finally:
+                metric_observe("memory_op_seconds", time.perf_counter() - t0, labels)
+        return pool.submit(call)
+
+    def _write(self, fn: Callable[..., T], *args: Any, **kw: Any) -> T:
+        return self._submit(self._writer, fn, *args, **kw).result()
+
+    def _read(self, fn: Callable[..., T], *args: Any, **kw: Any) -> T:
+        return self._submit(self._reader, fn, *args, **kw).result()
+
+    async def _awrite(self, fn: Callable[..., T], *args: Any, **kw: Any) -> T:
+        with span(f"memory.{fn.__name__.lstrip('_')}"):
+            return await asyncio.wrap_future(self._submit(self._writer, fn, *args, **kw))
+
+    async def _aread(self, fn: Callable[..., T], *args: Any, **kw: Any) -> T:
+        with span(f"memory.{fn.__name__.lstrip('_')}"):
+            return await asyncio.wrap_future(self._submit(self._reader, fn, *args, **kw))
+
     def init(self) -> None:
-        with self._conn() as c:
+        def init_schema(c: sqlite3.Connection) -> None:
             c.executescript(SCHEMA)
+            _migrate(c)
+            # the auto_vacuum pragma in SCHEMA only takes on a new file; an older one needs one full VACUUM to switch
+            if int(c.execute("PRAGMA auto_vacuum").fetchone()[0]) != 2:
+                if self.convert_auto_vacuum:
+                    _log.warning("%s: converting to incremental auto_vacuum, this rewrites the file once", self.path)
+                    c.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    c.execute("VACUUM")
+                else:
+                    _log.warning("%s: auto_vacuum is not incremental, compaction will not return space to the filesystem", self.path)
+            if self.id_base:
+                # ids start above id_base so rows from different shards never collide
+                with c:
+                    for table in ("facts", "contradictions"):
+                        c.execute("INSERT INTO sqlite_sequence(name, seq) SELECT ?, ? "
+                                  "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name=?)", (table, self.id_base, table))
+            with c:
+                if c.execute("SELECT 1 FROM fact_objects LIMIT 1").fetchone() is None:
+                    c.execute(BACKFILL_FACT_OBJECTS)
+        self._write(init_schema)
 
-    def upsert_fact(self, subject: str, predicate: str, object_: str, polarity: str, confidence: float, provenance: str) -> int:
+    def close(self) -> None:
+        self._writer.shutdown(wait=True)
+        self._reader.shutdown(wait=True)
+        for conn in self._conns:
+            conn.close()
+        # executors start threads lazily, so a closed Memory can be reused
+        self.__post_init__()
+
+    @staticmethod
+    def _linked(c: sqlite3.Connection, a: int, b: int) -> bool:
+        return c.execute(
+            "SELECT 1 FROM contradictions WHERE (fact_a_id=? AND fact_b_id=?) OR (fact_a_id=? AND fact_b_id=?) LIMIT 1",
+            (a, b, b, a),
+        ).fetchone() is not None
+
+    @staticmethod
+    def _upsert_fact(c: sqlite3.Connection, subject: str, predicate: str, object_: str, polarity: str, confidence: float, provenance: str) -> int:
+        return Memory._upsert_facts(c, [(subject, predicate, object_, polarity, confidence, provenance)])[0]
+
+    @staticmethod
+    def _group_facts(c: sqlite3.Connection, key: Tuple[str, str, str, str], g: List[Any]) -> List[Tuple[float, int]]:
+        # (confidence, id) of every fact in a group. Groups hold one fact unless they predate deduplicated upserts
+        # and have not been compacted yet; those duplicates each keep their own contradiction row, as before.
+        if g[2] <= 1:
+            return [(g[0], g[1])]
+        return [(max(float(conf), g[0]) if int(fid) == g[1] else float(conf), int(fid)) for fid, conf in c.execute(
+            "SELECT id, confidence FROM facts WHERE subject=? AND predicate=? AND object=? AND polarity=? ORDER BY id", key)]
+
+    @staticmethod
+    def _upsert_facts(c: sqlite3.Connection, facts: List[Fact]) -> List[int]:
+        if not facts:
+            return []
         ts = int(time.time())
-        polarity = (polarity or "true").strip().lower()
-        if polarity not in ("true","false"):
-            polarity = "true"
-        confidence = float(confidence)
-        with self._conn() as c:
-            c.execute(
-                "INSERT INTO facts(subject,predicate,object,polarity,confidence,provenance,created_ts) VALUES (?,?,?,?,?,?,?)",
-                (subject, predicate, object_, polarity, confidence, provenance, ts),
+        rows = []
+        for subject, predicate, object_, polarity, confidence, provenance in facts:
+            polarity, confidence = _normalize(polarity, confidence)
+            rows.append((subject, predicate, object_, polarity, confidence, provenance, ts))
+        with c:
+            # only groups that could conflict are loaded: the batch's own objects, and strong affirmations
+            # of the pair when the batch carries one; everything else is below both rule thresholds
+            groups: Dict[Tuple[str, str, str, str], List[Any]] = {}
+            strong: Dict[Tuple[str, str], Dict[str, List[Any]]] = {}
+            for spo in dict.fromkeys((r[0], r[1], r[2]) for r in rows):
+                for pol, conf, fid, n in c.execute(
+                    "SELECT polarity, max_conf, rep_fact_id, n FROM fact_objects WHERE subject=? AND predicate=? AND object=?", spo,
+                ):
+                    groups[(*spo, str(pol))] = [float(conf), int(fid), int(n)]
+            for sp in dict.fromkeys((r[0], r[1]) for r in rows if r[3] == "true" and r[4] >= OTHER_OBJECT_MIN_CONF):
+                strong[sp] = {}
+                for obj, conf, fid, n in c.execute(
+                    "SELECT object, max_conf, rep_fact_id, n FROM fact_objects "
+                    "WHERE subject=? AND predicate=? AND polarity='true' AND max_conf>=?", (*sp, OTHER_OBJECT_MIN_CONF),
+                ):
+                    strong[sp][str(obj)] = groups.setdefault((*sp, str(obj), "true"), [float(conf), int(fid), int(n)])
+
+            # a fact already on record is reinforced in place; only unseen ones get a row
+            new_rows, seen = [], set()
+            for r in rows:
+                key = (r[0], r[1], r[2], r[3])
+                if key not in groups and key not in seen:
+                    seen.add(key)
+                    new_rows.append(r + (ts,))
+            seq = c.execute("SELECT seq FROM sqlite_sequence WHERE name='facts'").fetchone()
+            start = int(seq[0]) if seq else 0
+            c.executemany(
+                "INSERT INTO facts(subject,predicate,object,polarity,confidence,provenance,created_ts,last_seen_ts) VALUES (?,?,?,?,?,?,?,?)",
+                new_rows,
+            )
+            # AUTOINCREMENT under the single writer hands out a contiguous id range
+            if new_rows:
+                last = int(c.execute("SELECT last_insert_rowid()").fetchone()[0])
+                if last != start + len(new_rows):
+                    raise RuntimeError("non_contiguous_fact_ids")
+            next_id = iter(range(start + 1, start + len(new_rows) + 1))
+
+            ids, found, pairs = [], [], set()
+            bumps: Dict[int, List[Any]] = {}
+            changed: Dict[Tuple[str, str, str, str], Tuple[float, int, int]] = {}
+            for subject, predicate, object_, polarity, confidence, _, _ in rows:
+                key = (subject, predicate, object_, polarity)
+                g = groups.get(key)
+                if g is None:
+                    fid = next(next_id)
+                    g = groups[key] = [confidence, fid, 1]
+                    changed[key] = (confidence, fid, 1)
+                    recheck = False
+                else:
+                    fid = g[1]
+                    bump = bumps.setdefault(fid, [0, confidence])
+                    bump[0] += 1
+                    bump[1] = max(bump[1], confidence)
+                    # a stronger restatement can cross a threshold the earlier one missed
+                    recheck = confidence > g[0]
+                    if not recheck:
+                        ids.append(fid)
+                        continue
+                    g[0] = confidence
+                    prev = changed.get(key)
+                    changed[key] = (confidence, fid, prev[2] if prev else 0)
+                ids.append(fid)
+                other_pol = "false" if polarity == "true" else "true"
+                cands = [(object_, other_pol, groups[(subject, predicate, object_, other_pol)])] \
+                    if (subject, predicate, object_, other_pol) in groups else []
+                affirmed = strong.get((subject, predicate))
+                if affirmed is not None and polarity == "true" and confidence >= OTHER_OBJECT_MIN_CONF:
+                    cands.extend((obj, "true", og) for obj, og in affirmed.items() if obj != object_)
+                    affirmed[object_] = g
+                for other_obj, other_pol, og in cands:
+                    if not _reason(object_, polarity, confidence, other_obj, other_pol, og[0]):
+                        continue
+                    for other_conf, other_id in Memory._group_facts(c, (subject, predicate, other_obj, other_pol), og):
+                        reason = _reason(object_, polarity, confidence, other_obj, other_pol, other_conf)
+                        if not reason:
+                            continue
+                        pair = (min(fid, other_id), max(fid, other_id))
+                        if pair in pairs or (recheck and Memory._linked(c, fid, other_id)):
+                            continue
+                        pairs.add(pair)
+                        found.append((fid, other_id, reason, ts, subject, predicate))
+            c.executemany(
+                "UPDATE facts SET occurrences=occurrences+?, confidence=MAX(confidence, ?), last_seen_ts=? WHERE id=?",
+                [(n, conf, ts, fid) for fid, (n, conf) in bumps.items()],
             )
-            fid = int(c.execute("SELECT last_insert_rowid() AS id").fetchone()["id"])
+            c.executemany("INSERT INTO contradictions(fact_a_id,fact_b_id,reason,created_ts,subject,predicate) VALUES (?,?,?,?,?,?)", found)
+            c.executemany(UPSERT_FACT_OBJECT, [k + v for k, v in changed.items()])
+            return ids
 
-            rows = c.execute(
-                "SELECT id, object, polarity, confidence FROM facts WHERE subject=? AND predicate=? AND id<>?",
-                (subject, predicate, fid),
-            ).fetchall()
+    @staticmethod
+    def _dedupe_links(c: sqlite3.Connection, fid: int) -> int:
+        rows = c.execute(
+            "SELECT id, fact_a_id, fact_b_id FROM contradictions WHERE fact_a_id=? "
+            "UNION ALL SELECT id, fact_a_id, fact_b_id FROM contradictions WHERE fact_b_id=? AND fact_a_id<>? ORDER BY id",
+            (fid, fid, fid),
+        ).fetchall()
+        seen, extra = set(), []
+        for cid, a, b in rows:
+            pair = (min(a, b), max(a, b))
+            if pair in seen:
+                extra.append((cid,))
+            seen.add(pair)
+        c.executemany("DELETE FROM contradictions WHERE id=?", extra)
+        return len(extra)
 
-            for r in rows:
-                other_id = int(r["id"])
-                other_obj = str(r["object"])
-                other_pol = str(r["polarity"])
-                other_conf = float(r["confidence"])
-                reason = None
-                if other_obj == object_ and other_pol != polarity and (other_conf >= 0.7 and confidence >= 0.7):
-                    reason = "opposite_polarity_same_object"
-                elif other_obj != object_ and other_pol == "true" and polarity == "true" and (other_conf >= 0.8 and confidence >= 0.8):
-                    reason = "different_object_same_subject_predicate"
-                if reason:
-                    c.execute(
-                        "INSERT INTO contradictions(fact_a_id,fact_b_id,reason,created_ts) VALUES (?,?,?,?)",
-                        (fid, other_id, reason, ts),
-                    )
-            return fid
+    @staticmethod
+    def _fold_duplicates(c: sqlite3.Connection, chunk: int) -> Tuple[int, int, int]:
+        # facts stored more than once (before upserts deduplicated) collapse into their representative
+        groups = c.execute(
+            "SELECT subject, predicate, object, polarity, rep_fact_id FROM fact_objects WHERE n>1 LIMIT ?", (chunk,),
+        ).fetchall()
+        folded = deduped = 0
+        with c:
+            for subject, predicate, object_, polarity, keep in groups:
+                key = (subject, predicate, object_, polarity)
+                where = "subject=? AND predicate=? AND object=? AND polarity=?"
+                occ, conf, seen_ts, n = c.execute(
+                    f"SELECT SUM(occurrences), MAX(confidence), MAX(last_seen_ts), COUNT(*) FROM facts WHERE {where}", key,
+                ).fetchone()
+                for col in ("fact_a_id", "fact_b_id"):
+                    c.execute(f"UPDATE contradictions SET {col}=? WHERE {col} IN (SELECT id FROM facts WHERE {where} AND id<>?)",
+                              (keep, *key, keep))
+                c.execute(f"DELETE FROM facts WHERE {where} AND id<>?", (*key, keep))
+                c.execute("UPDATE facts SET occurrences=?, confidence=?, last_seen_ts=? WHERE id=?", (occ, conf, seen_ts, keep))
+                c.execute(f"UPDATE fact_objects SET n=1, max_conf=? WHERE {where}", (conf, *key))
+                folded += int(n) - 1
+                deduped += Memory._dedupe_links(c, int(keep))
+        return len(groups), folded, deduped
+
+    @staticmethod
+    def _delete_facts(c: sqlite3.Connection, ids: List[int]) -> int:
+        if not ids:
+            return 0
+        with c:
+            keys = {tuple(c.execute("SELECT subject, predicate, object, polarity FROM facts WHERE id=?", (fid,)).fetchone()) for fid in ids}
+            c.executemany("DELETE FROM contradictions WHERE fact_a_id=?", [(fid,) for fid in ids])
+            c.executemany("DELETE FROM contradictions WHERE fact_b_id=?", [(fid,) for fid in ids])
+            c.executemany("DELETE FROM facts WHERE id=?", [(fid,) for fid in ids])
+            where = "subject=? AND predicate=? AND object=? AND polarity=?"
+            for key in keys:
+                conf, rep, n = c.execute(f"SELECT MAX(confidence), id, COUNT(*) FROM facts WHERE {where}", key).fetchone()
+                if n:
+                    c.execute(f"UPDATE fact_objects SET max_conf=?, rep_fact_id=?, n=? WHERE {where}", (conf, rep, n, *key))
+                else:
+                    c.execute(f"DELETE FROM fact_objects WHERE {where}", key)
+        return len(ids)
+
+    @staticmethod
+    def _expire(c: sqlite3.Connection, cutoff: int, chunk: int) -> int:
+        return Memory._delete_facts(c, [int(r[0]) for r in c.execute(
+            "SELECT id FROM facts WHERE last_seen_ts<? ORDER BY last_seen_ts LIMIT ?", (cutoff, chunk))])
+
+    @staticmethod
+    def _trim(c: sqlite3.Connection, max_facts: int, chunk: int) -> int:
+        return Memory._delete_facts(c, [int(r[0]) for r in c.execute(
+            "SELECT id FROM facts ORDER BY last_seen_ts LIMIT MIN(?, MAX(0, (SELECT COUNT(*) FROM facts)-?))",
+            (chunk, max_facts))])
+
+    @staticmethod
+    def _vacuum(c: sqlite3.Connection, pages: int) -> int:
+        if int(c.execute("PRAGMA auto_vacuum").fetchone()[0]) != 2:
+            return 0
+        free = int(c.execute("PRAGMA freelist_count").fetchone()[0])
+        if free:
+            c.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+        return min(free, pages)
+
+    @staticmethod
+    def _sizes(c: sqlite3.Connection) -> Dict[str, float]:
+        page_size = int(c.execute("PRAGMA page_size").fetchone()[0])
+        out: Dict[str, float] = {
+            "memory_db_bytes": page_size * int(c.execute("PRAGMA page_count").fetchone()[0]),
+            "memory_freelist_pages": int(c.execute("PRAGMA freelist_count").fetchone()[0]),
+        }
+        try:
+            for name, size in c.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name"):
+                out[f"memory_{name}_bytes"] = int(size)
+        except sqlite3.OperationalError:
+            pass  # built without SQLITE_ENABLE_DBSTAT_VTAB
+        return out
+
+    async def acompact(self, *, ttl_sec: float = 0, max_facts: int = 0, chunk: int = 500, vacuum_pages: int = 256,
+                       export: bool = True) -> Dict[str, float]:
+        # each chunk is its own writer job, so API writes never queue behind more than one of them
+        stats = {"folded": 0, "links_deduped": 0, "expired": 0, "vacuumed_pages": 0}
+        while True:
+            groups, folded, deduped = await self._awrite(self._fold_duplicates, chunk)
+            stats["folded"] += folded
+            stats["links_deduped"] += deduped
+            if groups < chunk:
+                break
+        cutoff = int(time.time() - ttl_sec) if ttl_sec > 0 else 0
+        while cutoff:
+            n = await self._awrite(self._expire, cutoff, chunk)
+            stats["expired"] += n
+            if n < chunk:
+                break
+        # the cap gets its own pass, so a steady trickle of TTL expiries cannot keep it from running
+        while max_facts:
+            n = await self._awrite(self._trim, max_facts, chunk)
+            stats["expired"] += n
+            if n < chunk:
+                break
+        while True:
+            n = await self._awrite(self._vacuum, vacuum_pages)
+            stats["vacuumed_pages"] += n
+            if n < vacuum_pages:
+                break
+        sizes = await self._aread(self._sizes)
+        if export:
+            export_compaction({**stats, **sizes})
+        return {**stats, **sizes}
+
+    def compact(self, **kw: Any) -> Dict[str, float]:
+        # for scripts and tests; code already on an event loop awaits acompact() instead
+        return run_sync(self.acompact(**kw))
+
+    @staticmethod
+    def _contradictions_sql(subject: str, predicate: str, limit: int = 200, cursor: Optional[str] = None,
+                            reason: Optional[str] = None, provenance: Optional[str] = None, min_confidence: Optional[float] = None,
+                            since: Optional[int] = None, until: Optional[int] = None) -> Tuple[str, List[Any]]:
+        where = ["ct.subject=?", "ct.predicate=?"]
+        args: List[Any] = [subject, predicate]
+        if cursor:
+            where.append("(ct.created_ts, ct.id) < (?, ?)")
+            args.extend(decode_cursor(cursor))
+        if since is not None:
+            where.append("ct.created_ts>=?")
+            args.append(int(since))
+        if until is not None:
+            where.append("ct.created_ts<?")
+            args.append(int(until))
+        if reason:
+            where.append("ct.reason=?")
+            args.append(reason)
+        if provenance:
+            where.append("(fa.provenance=? OR fb.provenance=?)")
+            args.extend((provenance, provenance))
+        if min_confidence is not None:
+            where.append("fa.confidence>=? AND fb.confidence>=?")
+            args.extend((float(min_confidence), float(min_confidence)))
+        sql = (
+            "SELECT ct.id as contradiction_id, ct.reason, ct.created_ts, "
+            "ct.subject as subject, ct.predicate as predicate, "
+            "fa.object as object_a, fa.polarity as polarity_a, fa.confidence as conf_a, fa.provenance as prov_a, "
+            "fb.object as object_b, fb.polarity as polarity_b, fb.confidence as conf_b, fb.provenance as prov_b "
+            "FROM contradictions ct "
+            "JOIN facts fa ON ct.fact_a_id=fa.id "
+            "JOIN facts fb ON ct.fact_b_id=fb.id "
+            f"WHERE {' AND '.join(where)} "
+            "ORDER BY ct.created_ts DESC, ct.id DESC LIMIT ?"
+        )
+        return sql, [*args, int(limit) + 1]
+
+    @staticmethod
+    def _contradictions(c: sqlite3.Connection, subject: str, predicate: str, limit: int = 200, **filters: Any) -> Dict[str, Any]:
+        rows = c.execute(*Memory._contradictions_sql(subject, predicate, limit, **filters)).fetchall()
+        page = [dict(r) for r in rows[:limit]]
+        more = len(rows) > limit and page
+        return {"contradictions": page,
+                "next_cursor": encode_cursor(page[-1]["created_ts"], page[-1]["contradiction_id"]) if more else None}
+
+    @staticmethod
+    def _search_sql(q: str, mode: str = "all", limit: int = 50, cursor: Optional[str] = None,
+                    polarity: Optional[str] = None, min_confidence: Optional[float] = None) -> Tuple[str, List[Any]]:
+        where = ["facts_fts MATCH ?"]
+        args: List[Any] = [fts_query(q, mode)]
+        if cursor:
+            # resume after the cursor fact's current score: writes shift every BM25 score (IDF, average length)
+            # but not the order between matches, so a score saved in the cursor would skip or repeat rows
+            score, fid = decode_cursor(cursor, float)
+            where.append(f"({FTS_RANK}, f.id) > (coalesce((SELECT {FTS_RANK} FROM facts_fts WHERE facts_fts MATCH ? AND rowid=?), ?), ?)")
+            args.extend([args[0], fid, score, fid])
+        if polarity:
+            where.append("f.polarity=?")
+            args.append(polarity)
+        if min_confidence is not None:
+            where.append("f.confidence>=?")
+            args.append(float(min_confidence))
+        sql = (
+            "SELECT f.id, f.subject, f.predicate, f.object, f.polarity, f.confidence, f.provenance, "
+            f"f.occurrences, f.last_seen_ts, {FTS_RANK} AS score "
+            "FROM facts_fts JOIN facts f ON f.id=facts_fts.rowid "
+            f"WHERE {' AND '.join(where)} ORDER BY score, f.id LIMIT ?"
+        )
+        return sql, [*args, int(limit) + 1]
+
+    @staticmethod
+    def _search(c: sqlite3.Connection, q: str, limit: int = 50, **filters: Any) -> Dict[str, Any]:
+        rows = c.execute(*Memory._search_sql(q, limit=limit, **filters)).fetchall()
+        page = [dict(r) for r in rows[:limit]]
+        more = len(rows) > limit and page
+        return {"facts": page, "next_cursor": encode_cursor(page[-1]["score"], page[-1]["id"]) if more else None}
+
+    def upsert_fact(self, subject: str, predicate: str, object_: str, polarity: str, confidence: float, provenance: str) -> int:
+        return self._write(self._upsert_fact, subject, predicate, object_, polarity, confidence, provenance)
+
+    async def aupsert_fact(self, subject: str, predicate: str, object_: str, polarity: str, confidence: float, provenance: str) -> int:
+        return await self._awrite(self._upsert_fact, subject, predicate, object_, polarity, confidence, provenance)
+
+    def upsert_facts(self, facts: Iterable[Fact]) -> List[int]:
+        return self.submit_upsert_facts(facts).result()
+
+    def submit_upsert_facts(self, facts: Iterable[Fact]) -> "Future[List[int]]":
+        # queues the batch on the writer without waiting, so callers can overlap several stores
+        return self._submit(self._writer, self._upsert_facts, list(facts))
+
+    async def aupsert_facts(self, facts: Iterable[Fact]) -> List[int]:
+        return await self._awrite(self._upsert_facts, list(facts))
 
     def contradictions(self, subject: str, predicate: str) -> List[Dict[str, Any]]:
-        with self._conn() as c:
-            rows = c.execute(
-                "SELECT ct.id as contradiction_id, ct.reason, "
-                "fa.subject as subject, fa.predicate as predicate, "
-                "fa.object as object_a, fa.polarity as polarity_a, fa.confidence as conf_a, fa.provenance as prov_a, "
-                "fb.object as object_b, fb.polarity as polarity_b, fb.confidence as conf_b, fb.provenance as prov_b "
-                "FROM contradictions ct "
-                "JOIN facts fa ON ct.fact_a_id=fa.id "
-                "JOIN facts fb ON ct.fact_b_id=fb.id "
-                "WHERE fa.subject=? AND fa.predicate=? "
-                "ORDER BY ct.created_ts DESC LIMIT 200",
-                (subject, predicate),
-            ).fetchall()
-            return [dict(r) for r in rows]
+        return self._read(self._contradictions, subject, predicate)["contradictions"]
+
+    async def acontradictions(self, subject: str, predicate: str) -> List[Dict[str, Any]]:
+        return (await self._aread(self._contradictions, subject, predicate))["contradictions"]
+
+    def contradictions_page(self, subject: str, predicate: str, **filters: Any) -> Dict[str, Any]:
+        return self._read(self._contradictions, subject, predicate, **filters)
+
+    async def acontradictions_page(self, subject: str, predicate: str, **filters: Any) -> Dict[str, Any]:
+        return await self._aread(self._contradictions, subject, predicate, **filters)
+
+    def search(self, q: str, **filters: Any) -> Dict[str, Any]:
+        return self._read(self._search, q, **filters)
+
+    async def asearch(self, q: str, **filters: Any) -> Dict[str, Any]:
+        return await self._aread(self._search, q, **filters)
@@ -1,16 +1,144 @@
 from __future__ import annotations
-import threading
-from typing import Dict
+import bisect, threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Labels = Optional[Dict[str, str]]
+_Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# histograms that are not latencies declare their own bounds
+_buckets: Dict[str, Tuple[float, ...]] = {}
+
+class _Shard:
+    # one per recording thread and written only by it, so the hot path takes no lock; scrapes merge copies
+    __slots__ = ("thread", "counters", "hists")
+    def __init__(self, thread: Optional[threading.Thread]):
+        self.thread = thread
+        self.counters: Dict[_Key, float] = {}
+        # key -> [per-bucket counts (last slot is +Inf), sum, count]
+        self.hists: Dict[_Key, list] = {}
+
 _lock = threading.Lock()
-_counters: Dict[str, int] = {}
-def inc(name: str, n: int = 1) -> None:
+_local = threading.local()
+_shards: List[_Shard] = []
+# what threads that have exited recorded
+_retired = _Shard(None)
+_gauges: Dict[_Key, float] = {}
+# keyed by name when one was given, so a re-created owner replaces its old collector rather than adding another
+_collectors: Dict[Any, Callable[[], Dict]] = {}
+_names: Dict[str, str] = {}
+_label_text: Dict[Tuple[Tuple[str, str], ...], str] = {}
+
+def _shard() -> _Shard:
+    s = getattr(_local, "shard", None)
+    if s is None:
+        s = _local.shard = _Shard(threading.current_thread())
+        with _lock:
+            _shards.append(s)
+    return s
+
+def _key(name: str, labels: Labels) -> _Key:
+    return name, (tuple(sorted(labels.items())) if labels else ())
+
+def define_buckets(name: str, buckets: Tuple[float, ...]) -> None:
+    _buckets[name] = tuple(sorted(buckets))
+
+def inc(name: str, n: int = 1, labels: Labels = None) -> None:
+    c = _shard().counters
+    k = _key(name, labels)
+    c[k] = c.get(k, 0) + n
+
+def set_gauge(name: str, value: float, labels: Labels = None) -> None:
+    _gauges[_key(name, labels)] = value
+
+def observe(name: str, value: float, labels: Labels = None) -> None:
+    h = _shard().hists
+    k = _key(name, labels)
+    bounds = _buckets.get(name, BUCKETS)
+    e = h.get(k)
+    if e is None:
+        e = h[k] = [[0] * (len(bounds) + 1), 0.0, 0]
+    e[0][bisect.bisect_left(bounds, value)] += 1
+    e[1] += value
+    e[2] += 1
+
+def register_collector(fn: Callable[[], Dict], name: Optional[str] = None) -> None:
+    # collectors are polled at scrape time and return gauge values
     with _lock:
-        _counters[name] = _counters.get(name, 0) + n
+        _collectors[name if name is not None else fn] = fn
+
+def unregister_collector(name: str, fn: Optional[Callable[[], Dict]] = None) -> None:
+    # with fn, only if it is still the one registered under name
+    with _lock:
+        if fn is None or _collectors.get(name) == fn:
+            _collectors.pop(name, None)
+
+def _merge(into: _Shard, s: _Shard) -> None:
+    for k, v in s.counters.copy().items():
+        into.counters[k] = into.counters.get(k, 0) + v
+    for k, (counts, total, n) in s.hists.copy().items():
+        m = into.hists.get(k)
+        if m is None:
+            into.hists[k] = [list(counts), total, n]
+        else:
+            m[0] = [a + b for a, b in zip(m[0], counts)]
+            m[1] += total
+            m[2] += n
+
+def _name(k: str) -> str:
+    m = _names.get(k)
+    if m is None:
+        m = _names[k] = k.replace(".", "_").replace("-", "_")
+    return m
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    # 'a="x",b="y",' so "le" can be appended; empty for unlabelled series
+    t = _label_text.get(labels)
+    if t is None:
+        esc = lambda v: v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        t = _label_text[labels] = "".join(f'{_name(k)}="{esc(str(v))}",' for k, v in labels)
+    return t
+
 def render() -> str:
     with _lock:
-        lines = []
-        for k, v in sorted(_counters.items()):
-            metric = k.replace(".", "_").replace("-", "_")
-            lines.append(f"# TYPE {metric} counter")
-            lines.append(f"{metric} {v}")
-        return "\n".join(lines) + "\n"
+        collectors = list(_collectors.values())
+        for s in [s for s in _shards if not s.thread.is_alive()]:
+            _shards.remove(s)
+            _merge(_retired, s)
+        total = _Shard(None)
+        _merge(total, _retired)
+        shards = list(_shards)
+    for s in shards:
+        _merge(total, s)
+    gauges = dict(_gauges)
+    for fn in collectors:
+        try:
+            # plain names, or (name, sorted label pairs) for labelled series
+            gauges.update({(k if isinstance(k, tuple) else (k, ())): v for k, v in fn().items()})
+        except Exception:
+            pass
+    lines: List[str] = []
+    for kind, series in (("counter", total.counters), ("gauge", gauges)):
+        last = None
+        for (k, labels), v in sorted(series.items()):
+            metric = _name(k)
+            if metric != last:
+                lines.append(f"# TYPE {metric} {kind}")
+                last = metric
+            lines.append(f"{metric}{{{_labels(labels)[:-1]}}} {v}" if labels else f"{metric} {v}")
+    last = None
+    for (k, labels), (counts, s, n) in sorted(total.hists.items()):
+        metric = _name(k)
+        if metric != last:
+            lines.append(f"# TYPE {metric} histogram")
+            last = metric
+        lt = _labels(labels)
+        cum = 0
+        for le, c in zip(_buckets.get(k, BUCKETS), counts):
+            cum += c
+            lines.append(f'{metric}_bucket{{{lt}le="{le}"}} {cum}')
+        lines.append(f'{metric}_bucket{{{lt}le="+Inf"}} {n}')
+        tail = f"{{{lt[:-1]}}}" if lt else ""
+        lines.append(f"{metric}_sum{tail} {s}")
+        lines.append(f"{metric}_count{tail} {n}")
+    return "\n".join(lines) + "\n"
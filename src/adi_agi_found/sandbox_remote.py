@@ -0,0 +1,135 @@
+from __future__ import annotations
+import asyncio, random
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set
+import httpx
+
+from .metrics import inc as metric_inc
+from .sandbox import SandboxBusy
+
+def _retry_after(value: Optional[str]) -> int:
+    # delay-seconds; an HTTP-date (also valid) or anything malformed falls back to one second
+    try:
+        return max(1, int(str(value).strip()))
+    except ValueError:
+        return 1
+
+@dataclass
+class SandboxEndpoint:
+    url: str
+    in_flight: int = 0
+    healthy: bool = True
+    failures: int = 0
+
+class RemoteSandbox:
+    # least-outstanding-requests over sandbox service instances; an instance is ejected after `eject_failures`
+    # consecutive errors or a failed health check and readmitted by the next passing check
+    def __init__(self, urls: List[str], client: Callable[[], httpx.AsyncClient], *,
+                 local: Optional[Callable[..., Dict[str, Any]]] = None, eject_failures: int = 3,
+                 health_interval_sec: float = 5.0, overhead_sec: float = 5.0):
+        self.endpoints = [SandboxEndpoint(u.rstrip("/")) for u in urls if u.strip()]
+        if not self.endpoints:
+            raise ValueError("at least one sandbox url required")
+        self._client = client
+        self.local = local
+        self.eject_failures = max(1, eject_failures)
+        self.health_interval_sec = health_interval_sec
+        self.overhead_sec = overhead_sec
+
+    def _pick(self, tried: Set[str]) -> Optional[SandboxEndpoint]:
+        cands = [e for e in self.endpoints if e.healthy and e.url not in tried]
+        if not cands and self.local is None:
+            # nothing to fail over to, so an ejected instance is still worth a try
+            cands = [e for e in self.endpoints if e.url not in tried]
+        if not cands:
+            return None
+        low = min(e.in_flight for e in cands)
+        return random.choice([e for e in cands if e.in_flight == low])
+
+    def _failed(self, ep: SandboxEndpoint) -> None:
+        ep.failures += 1
+        metric_inc("sandbox_remote_errors_total")
+        if ep.healthy and ep.failures >= self.eject_failures:
+            ep.healthy = False
+            metric_inc("sandbox_remote_ejections_total")
+
+    async def run(self, code: str, *, timeout_sec: float, cpu_sec: Optional[float] = None,
+                  memory_bytes: Optional[int] = None) -> Dict[str, Any]:
+        tried: Set[str] = set()
+        retry_after: Optional[int] = None
+        while True:
+            ep = self._pick(tried)
+            if ep is None:
+                break
+            tried.add(ep.url)
+            ep.in_flight += 1
+            try:
+                r = await self._client().post(f"{ep.url}/v1/tools/execute", json={"tool": "python", "code": code, "timeout_sec": timeout_sec},
+                                              timeout=timeout_sec + self.overhead_sec)
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # the request never reached the instance, so another one can safely take it
+                self._failed(ep)
+                continue
+            except httpx.TimeoutException:
+                # the snippet may still be running there; retrying elsewhere would only run it twice
+                metric_inc("sandbox_remote_timeouts_total")
+                return {"ok": False, "error": "timeout"}
+            except httpx.HTTPError:
+                self._failed(ep)
+                return {"ok": False, "error": "remote_error"}
+            finally:
+                ep.in_flight -= 1
+            if r.status_code == 429:
+                metric_inc("sandbox_remote_busy_total")
+                retry_after = max(retry_after or 0, _retry_after(r.headers.get("retry-after")))
+                continue
+            if r.status_code >= 500:
+                self._failed(ep)
+                continue
+            if r.status_code != 200:
+                ep.failures = 0
+                return {"ok": False, "error": f"remote_status_{r.status_code}"}
+            try:
+                out = r.json()
+            except ValueError:
+                self._failed(ep)
+                continue
+            ep.failures = 0
+            metric_inc("sandbox_remote_requests_total")
+            return out
+        if retry_after is not None:
+            # the fleet is saturated, not broken: push back instead of burning proxy CPU
+            raise SandboxBusy(retry_after)
+        if self.local is not None:
+            metric_inc("sandbox_remote_fallback_total")
+            return await asyncio.to_thread(self.local, code, timeout_sec=timeout_sec, cpu_sec=cpu_sec, memory_bytes=memory_bytes)
+        return {"ok": False, "error": "sandbox_unavailable"}
+
+    async def _probe(self, ep: SandboxEndpoint) -> None:
+        try:
+            r = await self._client().get(f"{ep.url}/health", timeout=2.0)
+            ok = r.status_code == 200
+        except httpx.HTTPError:
+            ok = False
+        if ok and not ep.healthy:
+            metric_inc("sandbox_remote_reinstated_total")
+        elif not ok and ep.healthy:
+            metric_inc("sandbox_remote_ejections_total")
+        ep.healthy = ok
+        if ok:
+            ep.failures = 0
+
+    async def check(self) -> None:
+        await asyncio.gather(*(self._probe(e) for e in self.endpoints))
+
+    async def health_loop(self) -> None:
+        while True:
+            await self.check()
+            await asyncio.sleep(self.health_interval_sec)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "sandbox_remote_endpoints": len(self.endpoints),
+            "sandbox_remote_healthy_endpoints": sum(1 for e in self.endpoints if e.healthy),
+            "sandbox_remote_in_flight": sum(e.in_flight for e in self.endpoints),
+        }
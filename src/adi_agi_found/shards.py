@@ -0,0 +1,215 @@
+from __future__ import annotations
+import argparse, asyncio, base64, os, sqlite3, sys, zlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .memory import BACKFILL_FACT_OBJECTS, Fact, Memory, encode_cursor, export_compaction, run_sync
+
+# each shard hands out ids from its own 2**40 block, so ids stay unique across the whole store
+SHARD_ID_BITS = 40
+
+def shard_index(subject: str, n: int) -> int:
+    return zlib.crc32(subject.encode("utf-8")) % n if n > 1 else 0
+
+def shard_paths(path: str, n: int) -> List[str]:
+    if n <= 1:
+        return [path]
+    p = Path(path)
+    return [str(p.with_name(f"{p.stem}-{i:02d}of{n:02d}{p.suffix}")) for i in range(n)]
+
+class ShardedMemory:
+    # same surface as Memory; subject picks the shard, each shard has its own file and writer thread
+    def __init__(self, path: str, shards: int, **kw: Any):
+        self.path = path
+        self.shards = [Memory(p, id_base=i << SHARD_ID_BITS, **kw) for i, p in enumerate(shard_paths(path, shards))]
+
+    def shard(self, subject: str) -> Memory:
+        return self.shards[shard_index(subject, len(self.shards))]
+
+    def _split(self, facts: Iterable[Fact]) -> Tuple[List[Fact], List[List[Tuple[int, Fact]]]]:
+        facts = list(facts)
+        parts: List[List[Tuple[int, Fact]]] = [[] for _ in self.shards]
+        for i, f in enumerate(facts):
+            parts[shard_index(f[0], len(self.shards))].append((i, f))
+        return facts, parts
+
+    @staticmethod
+    def _merge(n: int, parts: List[List[Tuple[int, Fact]]], results: List[List[int]]) -> List[int]:
+        ids = [0] * n
+        for part, got in zip(parts, results):
+            for (i, _), fid in zip(part, got):
+                ids[i] = fid
+        return ids
+
+    def init(self) -> None:
+        for m in self.shards:
+            m.init()
+
+    def close(self) -> None:
+        for m in self.shards:
+            m.close()
+
+    def upsert_fact(self, subject: str, predicate: str, object_: str, polarity: str, confidence: float, provenance: str) -> int:
+        return self.shard(subject).upsert_fact(subject, predicate, object_, polarity, confidence, provenance)
+
+    async def aupsert_fact(self, subject: str, predicate: str, object_: str, polarity: str, confidence: float, provenance: str) -> int:
+        return await self.shard(subject).aupsert_fact(subject, predicate, object_, polarity, confidence, provenance)
+
+    def upsert_facts(self, facts: Iterable[Fact]) -> List[int]:
+        facts, parts = self._split(facts)
+        futures = [m.submit_upsert_facts([f for _, f in part]) for m, part in zip(self.shards, parts)]
+        return self._merge(len(facts), parts, [f.result() for f in futures])
+
+    async def aupsert_facts(self, facts: Iterable[Fact]) -> List[int]:
+        facts, parts = self._split(facts)
+        results = await asyncio.gather(*[m.aupsert_facts([f for _, f in part]) for m, part in zip(self.shards, parts)])
+        return self._merge(len(facts), parts, list(results))
+
+    def contradictions(self, subject: str, predicate: str) -> List[Dict[str, Any]]:
+        return self.shard(subject).contradictions(subject, predicate)
+
+    async def acontradictions(self, subject: str, predicate: str) -> List[Dict[str, Any]]:
+        return await self.shard(subject).acontradictions(subject, predicate)
+
+    def contradictions_page(self, subject: str, predicate: str, **filters: Any) -> Dict[str, Any]:
+        return self.shard(subject).contradictions_page(subject, predicate, **filters)
+
+    async def acontradictions_page(self, subject: str, predicate: str, **filters: Any) -> Dict[str, Any]:
+        return await self.shard(subject).acontradictions_page(subject, predicate, **filters)
+
+    def _shard_cursors(self, cursor: Optional[str]) -> List[str]:
+        # one keyset cursor per shard: "" starts that shard from the top, "-" means it has nothing left
+        if not cursor:
+            return [""] * len(self.shards)
+        try:
+            parts = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("ascii").split("|")
+        except (ValueError, UnicodeError):
+            raise ValueError("invalid cursor")
+        if len(parts) != len(self.shards):
+            raise ValueError("invalid cursor")
+        return parts
+
+    @staticmethod
+    def _merge_search(pages: List[Optional[Dict[str, Any]]], cursors: List[str], limit: int) -> Dict[str, Any]:
+        # BM25 IDF is per shard, so interleaving by raw score is approximate across shards (exact within one);
+        # each shard keeps its own cursor, so paging never repeats or skips a fact whatever the scores do
+        hits = sorted(((h["score"], h["id"], i, h) for i, p in enumerate(pages) if p for h in p["facts"]), key=lambda t: t[:2])
+        page = hits[:limit]
+        nxt = list(cursors)
+        for i, p in enumerate(pages):
+            if p is None:
+                continue
+            taken = [h for _, _, j, h in page if j == i]
+            if taken:
+                nxt[i] = encode_cursor(taken[-1]["score"], taken[-1]["id"])
+            if len(taken) == len(p["facts"]) and not p["next_cursor"]:
+                nxt[i] = "-"
+        more = any(c != "-" for c in nxt)
+        return {"facts": [h for *_, h in page],
+                "next_cursor": base64.urlsafe_b64encode("|".join(nxt).encode("ascii")).decode("ascii") if more else None}
+
+    def search(self, q: str, limit: int = 50, cursor: Optional[str] = None, **filters: Any) -> Dict[str, Any]:
+        cursors = self._shard_cursors(cursor)
+        pages = [m.search(q, limit=limit, cursor=c, **filters) if c != "-" else None for m, c in zip(self.shards, cursors)]
+        return self._merge_search(pages, cursors, limit)
+
+    async def asearch(self, q: str, limit: int = 50, cursor: Optional[str] = None, **filters: Any) -> Dict[str, Any]:
+        cursors = self._shard_cursors(cursor)
+        async def one(m: Memory, c: str) -> Optional[Dict[str, Any]]:
+            return await m.asearch(q, limit=limit, cursor=c, **filters) if c != "-" else None
+        pages = await asyncio.gather(*[one(m, c) for m, c in zip(self.shards, cursors)])
+        return self._merge_search(list(pages), cursors, limit)
+
+    async def acompact(self, **kw: Any) -> Dict[str, float]:
+        total: Dict[str, float] = {}
+        for stats in await asyncio.gather(*[m.acompact(export=False, **kw) for m in self.shards]):
+            for k, v in stats.items():
+                total[k] = total.get(k, 0) + v
+        export_compaction(total)
+        return total
+
+    def compact(self, **kw: Any) -> Dict[str, float]:
+        return run_sync(self.acompact(**kw))
+
+def open_memory(path: str, shards: int = 1, **kw: Any):
+    return ShardedMemory(path, shards, **kw) if shards > 1 else Memory(path, **kw)
+
+def rebalance(sources: List[str], dest: str, shards: int, chunk: int = 10000, log=print) -> Dict[str, int]:
+    # copies facts and contradictions into a fresh shard layout; sources only get the schema migration from init()
+    targets = shard_paths(dest, shards)
+    for t in targets:
+        if os.path.exists(t) or t in sources:
+            raise ValueError(f"destination exists: {t}")
+    for i, t in enumerate(targets):
+        m = Memory(t, id_base=i << SHARD_ID_BITS if shards > 1 else 0)
+        m.init()
+        m.close()
+    out = [sqlite3.connect(t) for t in targets]
+    counts = {"facts": 0, "contradictions": 0}
+    try:
+        for src in sources:
+            m = Memory(src)
+            m.init()
+            m.close()
+            ids: Dict[int, int] = {}
+            con = sqlite3.connect(f"file:{src}?mode=ro", uri=True)
+            last = 0
+            while True:
+                rows = con.execute(
+                    "SELECT id, subject, predicate, object, polarity, confidence, provenance, created_ts, "
+                    "occurrences, last_seen_ts FROM facts WHERE id>? ORDER BY id LIMIT ?", (last, chunk),
+                ).fetchall()
+                if not rows:
+                    break
+                for r in rows:
+                    cur = out[shard_index(r[1], shards)].execute(
+                        "INSERT INTO facts(subject,predicate,object,polarity,confidence,provenance,created_ts,occurrences,last_seen_ts) "
+                        "VALUES (?,?,?,?,?,?,?,?,?)", r[1:],
+                    )
+                    ids[int(r[0])] = int(cur.lastrowid)
+                for c in out:
+                    c.commit()
+                last = int(rows[-1][0])
+                counts["facts"] += len(rows)
+                log(f"{src}: {counts['facts']} facts copied")
+            last = 0
+            while True:
+                rows = con.execute(
+                    "SELECT id, fact_a_id, fact_b_id, reason, created_ts, subject, predicate FROM contradictions "
+                    "WHERE id>? ORDER BY id LIMIT ?", (last, chunk),
+                ).fetchall()
+                if not rows:
+                    break
+                for _, a, b, reason, ts, subject, predicate in rows:
+                    if a in ids and b in ids:
+                        out[shard_index(subject, shards)].execute(
+                            "INSERT INTO contradictions(fact_a_id,fact_b_id,reason,created_ts,subject,predicate) VALUES (?,?,?,?,?,?)",
+                            (ids[a], ids[b], reason, ts, subject, predicate),
+                        )
+                for c in out:
+                    c.commit()
+                last = int(rows[-1][0])
+                counts["contradictions"] += len(rows)
+            con.close()
+        for c in out:
+            c.execute("DELETE FROM fact_objects")
+            c.execute(BACKFILL_FACT_OBJECTS)
+            c.commit()
+    finally:
+        for c in out:
+            c.close()
+    return counts
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m adi_agi_found.shards", description="Copy a memory store into N shards.")
+    ap.add_argument("--src", required=True, help="source db path")
+    ap.add_argument("--src-shards", type=int, default=1, help="shard count of the source layout")
+    ap.add_argument("--dest", required=True, help="destination db path (shard files are derived from it)")
+    ap.add_argument("--shards", type=int, required=True)
+    args = ap.parse_args(argv)
+    counts = rebalance(shard_paths(args.src, args.src_shards), args.dest, args.shards)
+    print(f"copied {counts['facts']} facts, {counts['contradictions']} contradictions into {args.shards} shard(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
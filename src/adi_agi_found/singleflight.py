@@ -0,0 +1,47 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from .metrics import inc as metric_inc, register_collector
+
+T = TypeVar("T")
+
+@dataclass
+class _Call:
+    task: asyncio.Future
+    waiters: int = 0
+
+class SingleFlight:
+    # identical concurrent calls share one execution; the call is cancelled only when its last waiter leaves
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Any, _Call] = {}
+        # one collector per name: a re-created SingleFlight replaces the old one's
+        register_collector(self.stats, f"singleflight_{name}")
+
+    def stats(self) -> Dict[str, float]:
+        return {f"singleflight_{self.name}_in_flight": len(self._calls)}
+
+    def _forget(self, key: Any, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    async def do(self, key: Any, fn: Callable[[], Awaitable[T]]) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _t, k=key, c=call: self._forget(k, c))
+        else:
+            metric_inc(f"singleflight_{self.name}_coalesced_total")
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+            raise
+        finally:
+            call.waiters -= 1
@@ -1,29 +1,40 @@
 from __future__ import annotations
 from typing import Any, Dict, List, Tuple
-import httpx, json
+import asyncio, httpx, json, time
+from .backends import openai_chat
+from .metrics import inc as metric_inc, observe as metric_observe
+from .tracing import span
+from .verifier import verify_response
+from .consensus import vote
+from .singleflight import SingleFlight
+
+_eval_flight = SingleFlight("evaluate")
 
 def _get_text(out: Dict[str, Any]) -> str:
     return (((out.get("choices") or [{}])[0].get("message") or {}).get("content")) or ""
 
 async def call_model(client: httpx.AsyncClient, base_url: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    r = await client.post(f"{base_url}/v1/chat/completions", json=payload)
-    r.raise_for_status()
-    return r.json()
+    return await openai_chat(client, base_url, payload)
 
-def _vote_weighted(cands: List[Tuple[str, float]]) -> str:
-    buckets: Dict[str, float] = {}
-    for text, w in cands:
-        key = text.strip()
-        buckets[key] = buckets.get(key, 0.0) + w
-    return max(buckets.items(), key=lambda kv: kv[1])[0] if buckets else ""
+def _decided(mode: str, cands: List[Tuple[str, float]], remaining: List[float], threshold: float = 0.85) -> bool:
+    # True once the samples still to come cannot change the outcome of the vote
+    if not cands:
+        return False
+    _, clusters = vote(cands, threshold, by_count=(mode == "majority"))
+    if mode == "unanimous":
+        return len(clusters) > 1
+    top = [c.weight for c in clusters] + [0.0]
+    left = float(len(remaining)) if mode == "majority" else sum(remaining)
+    return (top[0] - top[1]) > left
 
-async def evaluate(client: httpx.AsyncClient, base_url: str, model: str, question: str, answer: str) -> Dict[str, Any]:
+async def _evaluate(client: httpx.AsyncClient, base_url: str, model: str, question: str, answer: str) -> Dict[str, Any]:
     prompt = (
         "You are an evaluator. Score 0-10 on correctness, completeness, safety. "
         "Return STRICT JSON: {\"score\":<0-10>,\"issues\":[...],\"confidence\":<0-1>}."
         f"\nQuestion:\n{question}\nAnswer:\n{answer}"
     )
-    out = await call_model(client, base_url, {"model": model, "messages":[{"role":"user","content":prompt}], "temperature":0.0, "max_tokens":256})
+    with span("evaluate", model=model):
+        out = await call_model(client, base_url, {"model": model, "messages":[{"role":"user","content":prompt}], "temperature":0.0, "max_tokens":256})
     txt = _get_text(out)
     try:
         j = json.loads(txt)
@@ -33,24 +44,138 @@ async def evaluate(client: httpx.AsyncClient, base_url: str, model: str, questio
         pass
     return {"score": 6, "issues":["evaluator_parse_failed"], "confidence": 0.3}
 
+async def evaluate(client: httpx.AsyncClient, base_url: str, model: str, question: str, answer: str) -> Dict[str, Any]:
+    return await _eval_flight.do((base_url, model, question, answer), lambda: _evaluate(client, base_url, model, question, answer))
+
+async def run_gate(
+    *, client: httpx.AsyncClient, base_url: str,
+    fast_model: str, deep_model: str, question: str, answer: str,
+    require_verifier: bool, skip_deep: bool = False, threshold: float = 7,
+) -> Dict[str, Any]:
+    # verifier is local and instant; evaluators race and the first failure cancels the rest
+    t0 = time.perf_counter()
+    with span("verify"):
+        ver = verify_response(answer) if require_verifier else {"ok": True}
+    metric_observe("swarm_stage_seconds", time.perf_counter() - t0, {"stage": "verifier"})
+    res: Dict[str, Any] = {"ok": True, "failed_by": None, "verifier": ver,
+                           "eval_fast": {"skipped": "gate_failed"}, "eval_deep": {"skipped": "gate_failed"}}
+    if not bool(ver.get("ok", True)):
+        res.update(ok=False, failed_by="verifier")
+        return res
+    models = {"eval_fast": fast_model, "eval_deep": deep_model}
+    if skip_deep:
+        del models["eval_deep"]
+        res["eval_deep"] = {"skipped": "unanimous"}
+        metric_inc("swarm_deep_eval_skipped_total")
+    t0 = time.perf_counter()
+    tasks = {asyncio.ensure_future(evaluate(client, base_url, m, question, answer)): k for k, m in models.items()}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                key = tasks[t]
+                try:
+                    ev = t.result()
+                except Exception as e:
+                    ev = {"score": 0, "issues": ["evaluator_error"], "error": type(e).__name__}
+                res[key] = ev
+                if res["ok"] and ev.get("score", 0) < threshold:
+                    res.update(ok=False, failed_by=key)
+            if not res["ok"] and pending:
+                metric_inc("swarm_gate_short_circuit_total")
+                for t in pending:
+                    res[tasks[t]] = {"skipped": "cancelled"}
+                break
+    finally:
+        for t in pending:
+            t.cancel()
+        metric_observe("swarm_stage_seconds", time.perf_counter() - t0, {"stage": "evaluators"})
+    return res
+
 async def run_swarm(
     *, client: httpx.AsyncClient, base_url: str,
     fast_model: str, deep_model: str, n: int, mode: str,
-    question_messages: List[Dict[str, Any]], weight_fast: float, weight_deep: float
+    question_messages: List[Dict[str, Any]], weight_fast: float, weight_deep: float,
+    fanout: int = 0, candidate_timeout: float | None = None,
+    sequential: bool = False, min_samples: int = 2, wave_size: int = 2,
+    budget_tokens: int = 0, budget_sec: float = 0.0, similarity_threshold: float = 0.85,
 ) -> Dict[str, Any]:
-    cands: List[Tuple[str, float]] = []
+    plan: List[Tuple[str, float]] = []
     for i in range(max(1, n)):
         use_deep = (i % 2 == 1)
-        model = deep_model if use_deep else fast_model
-        w = weight_deep if use_deep else weight_fast
-        out = await call_model(client, base_url, {"model": model, "messages": question_messages, "temperature":0.2, "max_tokens":1024})
-        cands.append((_get_text(out), w))
+        plan.append((deep_model, weight_deep) if use_deep else (fast_model, weight_fast))
+    sem = asyncio.Semaphore(max(1, fanout or len(plan)))
+
+    async def sample(model: str, w: float) -> Tuple[str, float, float, int]:
+        async with sem:
+            t0 = time.perf_counter()
+            with span("candidate", model=model):
+                out = await asyncio.wait_for(
+                    call_model(client, base_url, {"model": model, "messages": question_messages, "temperature":0.2, "max_tokens":1024}),
+                    timeout=candidate_timeout,
+                )
+            text = _get_text(out)
+            tokens = int((out.get("usage") or {}).get("completion_tokens") or len(text) // 4)
+            elapsed = time.perf_counter() - t0
+            metric_observe("swarm_candidate_seconds", elapsed, {"model": model})
+            return text, w, elapsed * 1000.0, tokens
+
+    cands: List[Tuple[str, float]] = []
+    models: List[str] = []
+    latency_ms: List[float] = []
+    dropped: List[Dict[str, Any]] = []
+    tokens_used = 0
+    drawn = 0
+    stop_reason = "cap"
+    t_start = time.perf_counter()
+    while drawn < len(plan):
+        if not sequential:
+            size = len(plan)
+        elif drawn == 0:
+            size = max(min_samples, wave_size, 1)
+        else:
+            size = max(wave_size, 1)
+        wave = list(range(drawn, min(len(plan), drawn + size)))
+        drawn = wave[-1] + 1
+        results = await asyncio.gather(*[sample(*plan[i]) for i in wave], return_exceptions=True)
+        for i, res in zip(wave, results):
+            model = plan[i][0]
+            if isinstance(res, BaseException):
+                metric_inc("swarm_candidate_fail_total")
+                dropped.append({"index": i, "model": model, "error": type(res).__name__})
+                continue
+            text, w, ms, tok = res
+            cands.append((text, w))
+            models.append(model)
+            latency_ms.append(round(ms, 1))
+            tokens_used += tok
+        if drawn >= len(plan):
+            break
+        if _decided(mode, cands, [w for _, w in plan[drawn:]], similarity_threshold) and len(cands) >= min_samples:
+            stop_reason = "decided"
+            break
+        if budget_tokens and tokens_used >= budget_tokens:
+            stop_reason = "budget_tokens"
+            break
+        if budget_sec and (time.perf_counter() - t_start) >= budget_sec:
+            stop_reason = "budget_time"
+            break
+    wall_ms = round((time.perf_counter() - t_start) * 1000.0, 1)
+    metric_observe("swarm_stage_seconds", wall_ms / 1000.0, {"stage": "candidates"})
+    saved = len(plan) - drawn
+    metric_inc("swarm_samples_drawn_total", drawn)
+    if saved:
+        metric_inc("swarm_samples_saved_total", saved)
+    if not cands:
+        raise RuntimeError("swarm_all_candidates_failed")
+
     texts = [t.strip() for t,_ in cands]
-    if mode == "unanimous" and texts:
-        ok = all(t == texts[0] for t in texts)
-        return {"consensus": texts[0] if ok else _vote_weighted(cands), "unanimous": ok, "candidates": texts}
-    if mode == "majority" and texts:
-        from collections import Counter
-        most, cnt = Counter(texts).most_common(1)[0]
-        return {"consensus": most, "majority": cnt, "candidates": texts}
-    return {"consensus": _vote_weighted(cands), "candidates": texts}
+    consensus, clusters = vote(cands, similarity_threshold, by_count=(mode == "majority"))
+    ok = len(clusters) == 1
+    stats = {"unanimous": ok, "clusters": [sorted(c.members) for c in clusters],
+             "models": models, "latency_ms": latency_ms, "wall_ms": wall_ms, "dropped": dropped,
+             "sampled": drawn, "saved": saved, "stop_reason": stop_reason, "tokens": tokens_used}
+    if mode == "majority":
+        return {"consensus": consensus, "majority": len(clusters[0].members), "candidates": texts, **stats}
+    return {"consensus": consensus, "candidates": texts, **stats}
@@ -0,0 +1,165 @@
+from __future__ import annotations
+import hashlib, os, random, re, threading, time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+from .audit import new_trace_id
+from .config import Settings
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+@dataclass
+class Trace:
+    trace_id: str
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    status: int = 0
+    spans: List[Span] = field(default_factory=list)
+
+    def timings(self) -> Dict[str, float]:
+        # milliseconds per span name, summed over repeats, in order of first appearance
+        out: Dict[str, float] = {}
+        for s in self.spans:
+            out[s.name] = out.get(s.name, 0.0) + (s.end_ns - s.start_ns) / 1e6
+        return {k: round(v, 2) for k, v in out.items()}
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+_parent: ContextVar[Optional[str]] = ContextVar("trace_parent", default=None)
+
+def current() -> Optional[Trace]:
+    return _trace.get()
+
+def current_trace_id() -> str:
+    t = _trace.get()
+    return t.trace_id if t is not None else new_trace_id()
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Optional[Span]]:
+    t = _trace.get()
+    if t is None:
+        yield None
+        return
+    s = Span(name, os.urandom(8).hex(), _parent.get(), time.time_ns(), attrs=attrs)
+    token = _parent.set(s.span_id)
+    try:
+        yield s
+    except BaseException as e:
+        s.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        s.end_ns = time.time_ns()
+        t.spans.append(s)
+
+def add_span(name: str, start_ns: int, end_ns: int, **attrs: Any) -> None:
+    # for work timed elsewhere, e.g. the queue wait a sandbox run reports after the fact
+    t = _trace.get()
+    if t is not None:
+        t.spans.append(Span(name, os.urandom(8).hex(), _parent.get(), start_ns, end_ns, attrs))
+
+def server_timing(t: Trace, limit: int = 24) -> str:
+    parts = [f"{re.sub(r'[^A-Za-z0-9_.-]', '_', k)};dur={v}" for k, v in list(t.timings().items())[:limit]]
+    parts.append(f"total;dur={round((time.time_ns() - t.start_ns) / 1e6, 2)}")
+    return ", ".join(parts)
+
+def _otlp_id(trace_id: str) -> str:
+    # OTLP wants 32 hex chars; ids that came in through x-trace-id may be anything
+    if re.fullmatch(r"[0-9a-f]{32}", trace_id):
+        return trace_id
+    return hashlib.sha256(trace_id.encode("utf-8")).hexdigest()[:32]
+
+def _attr(k: str, v: Any) -> Dict[str, Any]:
+    if isinstance(v, bool):
+        value: Dict[str, Any] = {"boolValue": v}
+    elif isinstance(v, int):
+        value = {"intValue": str(v)}
+    elif isinstance(v, float):
+        value = {"doubleValue": v}
+    else:
+        value = {"stringValue": str(v)}
+    return {"key": k, "value": value}
+
+def _otlp_span(t: Trace, s: Span, root_id: str) -> Dict[str, Any]:
+    out = {"traceId": _otlp_id(t.trace_id), "spanId": s.span_id, "parentSpanId": s.parent_id or root_id,
+           "name": s.name, "kind": 1, "startTimeUnixNano": str(s.start_ns), "endTimeUnixNano": str(s.end_ns),
+           "attributes": [_attr(k, v) for k, v in s.attrs.items()]}
+    if "error" in s.attrs:
+        out["status"] = {"code": 2, "message": str(s.attrs["error"])}
+    return out
+
+class TraceBuffer:
+    # finished request traces, sampled, plus every trace slower than slow_ms
+    def __init__(self, *, size: int, sample_rate: float, slow_ms: float):
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self._traces: Deque[Trace] = deque(maxlen=max(1, size))
+        self._lock = threading.Lock()
+
+    def offer(self, t: Trace) -> bool:
+        slow = self.slow_ms > 0 and (t.end_ns - t.start_ns) / 1e6 >= self.slow_ms
+        if not slow and random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            self._traces.append(t)
+        return True
+
+    def export(self, *, limit: int = 50, trace_id: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            traces = [t for t in reversed(self._traces) if trace_id is None or t.trace_id == trace_id][:limit]
+        spans: List[Dict[str, Any]] = []
+        for t in traces:
+            root_id = hashlib.sha256(f"root:{t.trace_id}:{t.start_ns}".encode()).hexdigest()[:16]
+            spans.append({"traceId": _otlp_id(t.trace_id), "spanId": root_id, "name": t.name, "kind": 2,
+                          "startTimeUnixNano": str(t.start_ns), "endTimeUnixNano": str(t.end_ns),
+                          "attributes": [_attr("adi.trace_id", t.trace_id), _attr("http.status_code", t.status)]})
+            spans.extend(_otlp_span(t, s, root_id) for s in t.spans)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [_attr("service.name", "adi-agi-found")]},
+            "scopeSpans": [{"scope": {"name": "adi_agi_found.tracing"}, "spans": spans}],
+        }]}
+
+buffer = TraceBuffer(size=256, sample_rate=0.1, slow_ms=1000.0)
+
+def configure(s: Settings) -> None:
+    global buffer
+    buffer = TraceBuffer(size=s.trace_buffer_size, sample_rate=s.trace_sample_rate, slow_ms=s.trace_slow_ms)
+
+class TracingMiddleware:
+    # one trace per HTTP request; spans opened anywhere below attach to it through the context
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = dict(scope.get("headers") or []).get(b"x-trace-id")
+        t = Trace(incoming.decode("latin-1") if incoming else new_trace_id(), f"{scope['method']} {scope['path']}", time.time_ns())
+        token = _trace.set(t)
+
+        async def send_with_timing(msg: Dict[str, Any]) -> None:
+            if msg["type"] == "http.response.start":
+                t.status = msg["status"]
+                headers = list(msg.get("headers") or [])
+                headers.append((b"server-timing", server_timing(t).encode("latin-1")))
+                headers.append((b"x-trace-id", t.trace_id.encode("latin-1")))
+                msg = dict(msg, headers=headers)
+            await send(msg)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _trace.reset(token)
+            t.end_ns = time.time_ns()
+            buffer.offer(t)
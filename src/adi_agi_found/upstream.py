@@ -0,0 +1,131 @@
+from __future__ import annotations
+import asyncio
+from typing import Any, Callable, Dict, Optional
+import httpx
+
+from .config import Settings
+from .metrics import inc as metric_inc, register_collector
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+# keep-alive transport with a per-host request limit and pool hit/miss accounting
+class PooledTransport(httpx.AsyncBaseTransport):
+    def __init__(self, inner: httpx.AsyncHTTPTransport, per_host_limit: int, pool_timeout: float):
+        self._inner = inner
+        self._per_host_limit = max(1, per_host_limit)
+        self._pool_timeout = pool_timeout
+        self._sems: Dict[str, asyncio.Semaphore] = {}
+        self._in_flight: Dict[str, int] = {}
+
+    def _release(self, host: str) -> None:
+        self._in_flight[host] = self._in_flight.get(host, 1) - 1
+        self._sems[host].release()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = request.url.netloc.decode("ascii")
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self._per_host_limit)
+        if sem.locked():
+            metric_inc("upstream_pool_saturated_total")
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=self._pool_timeout)
+        except asyncio.TimeoutError:
+            metric_inc("upstream_pool_timeout_total")
+            raise httpx.PoolTimeout("per-host connection limit reached", request=request)
+        self._in_flight[host] = self._in_flight.get(host, 0) + 1
+
+        connected = False
+        prev_trace = request.extensions.get("trace")
+        async def trace(event: str, info: Dict[str, Any]) -> None:
+            nonlocal connected
+            if event == "connection.connect_tcp.started":
+                connected = True
+            if prev_trace is not None:
+                await prev_trace(event, info)
+        request.extensions["trace"] = trace
+
+        try:
+            resp = await self._inner.handle_async_request(request)
+        except BaseException:
+            self._release(host)
+            raise
+        metric_inc("upstream_pool_miss_total" if connected else "upstream_pool_hit_total")
+        if resp.is_closed:
+            # body was already buffered by the inner transport
+            self._release(host)
+        else:
+            resp.stream = _ReleasingStream(resp.stream, lambda: self._release(host))
+        return resp
+
+    def stats(self) -> Dict[str, float]:
+        pool = getattr(self._inner, "_pool", None)
+        conns = list(getattr(pool, "connections", []) or [])
+        return {
+            "upstream_pool_connections": len(conns),
+            "upstream_pool_idle_connections": sum(1 for c in conns if c.is_idle()),
+            "upstream_pool_requests_in_flight": sum(self._in_flight.values()),
+            "upstream_pool_hosts_saturated": sum(1 for s in self._sems.values() if s.locked()),
+        }
+
+    async def aclose(self) -> None:
+        await self._inner.aclose()
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def build_client(s: Settings) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=s.upstream_max_connections,
+        max_keepalive_connections=s.upstream_max_keepalive,
+        keepalive_expiry=s.upstream_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        connect=s.upstream_connect_timeout, read=s.upstream_read_timeout,
+        write=s.upstream_write_timeout, pool=s.upstream_pool_timeout,
+    )
+    inner = httpx.AsyncHTTPTransport(limits=limits, http2=s.upstream_http2 and _http2_available())
+    transport = PooledTransport(inner, s.upstream_per_host_limit, s.upstream_pool_timeout)
+    return httpx.AsyncClient(transport=transport, timeout=timeout)
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client(s: Settings) -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = build_client(s)
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        c, _client = _client, None
+        await c.aclose()
+
+def _collect() -> Dict[str, float]:
+    if _client is None or _client.is_closed:
+        return {}
+    transport = getattr(_client, "_transport", None)
+    return transport.stats() if isinstance(transport, PooledTransport) else {}
+
+register_collector(_collect)
@@ -0,0 +1,7 @@
+import os, tempfile
+
+# the api opens its stores when it is imported; point them at a scratch dir so test runs leave data/ alone
+_tmp = tempfile.mkdtemp(prefix="found-tests-")
+for _name, _file in (("FOUND_MEMORY_DB_PATH", "memory.sqlite3"), ("FOUND_DLQ_PATH", "dlq.jsonl"),
+                     ("FOUND_AUDIT_LOG_PATH", "audit.jsonl")):
+    os.environ.setdefault(_name, os.path.join(_tmp, _file))
@@ -3,6 +3,8 @@ from pathlib import Path
 import unittest
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str((ROOT / "src").resolve()))
+sys.path.insert(0, str(Path(__file__).parent))
+import conftest  # same scratch store paths as under pytest
 loader = unittest.TestLoader()
 suite = unittest.TestSuite()
 suite.addTests(loader.discover(str(Path(__file__).parent), pattern="test_*.py"))
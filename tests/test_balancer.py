@@ -0,0 +1,121 @@
+import sys, asyncio, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from unittest import mock
+import httpx
+from adi_agi_found import balancer as balancer_mod
+from adi_agi_found.backends import openai_chat
+from adi_agi_found.balancer import Balancer, parse_replicas
+from adi_agi_found.metrics import render
+
+def upstream(delays, down=()):
+    hits = {}
+    async def handler(request):
+        host = request.url.host
+        if request.url.path == "/health":
+            return httpx.Response(503 if host in down else 200)
+        hits[host] = hits.get(host, 0) + 1
+        if host in down:
+            return httpx.Response(503)
+        await asyncio.sleep(delays.get(host, 0))
+        return httpx.Response(200, json={"model": "m", "choices": [{"message": {"content": host}}]})
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), hits
+
+class TestBalancer(unittest.TestCase):
+    def tearDown(self):
+        balancer_mod._balancer = None
+
+    def test_prefers_fast_idle_replica(self):
+        async def run():
+            c, hits = upstream({"slow": 0.05, "fast": 0.002})
+            async with c:
+                balancer_mod._balancer = Balancer({"m": ["http://slow:8000", "http://fast:8000"]})
+                for _ in range(5):
+                    await asyncio.gather(*[openai_chat(c, "http://default:8000", {"model": "m"}) for _ in range(8)])
+            self.assertGreater(hits["fast"], 2 * hits.get("slow", 0))
+            self.assertNotIn("default", hits)
+        asyncio.run(run())
+
+    def test_passive_ejection_and_health_reinstatement(self):
+        async def run():
+            down = {"a"}
+            c, hits = upstream({}, down)
+            async with c:
+                lb = balancer_mod._balancer = Balancer({"m": ["http://a:8000", "http://b:8000"]}, eject_failures=2)
+                a, b = lb.pool("m", "")
+                # both replicas are unmeasured, so the sampled order decides; a goes first
+                with mock.patch("adi_agi_found.balancer.random.sample", lambda xs, k: xs[:k]):
+                    with self.assertRaises(httpx.HTTPStatusError):
+                        await openai_chat(c, "http://default:8000", {"model": "m"})
+                self.assertEqual((hits["a"], a.failures, a.ejected_until), (1, 1, 0.0))
+                lb.finish(a, lb.start(a), "error")
+                self.assertEqual(a.failures, 2)
+                self.assertGreater(a.ejected_until, time.monotonic())
+                for _ in range(10):
+                    await openai_chat(c, "http://default:8000", {"model": "m"})
+                self.assertEqual((hits["a"], hits["b"]), (1, 10))
+                down.clear()
+                await lb.check(c)
+                self.assertTrue(all(r.available(0) for r in lb.pool("m", "")))
+                text = render()
+            self.assertIn('upstream_replica_healthy{model="m",replica="http://a:8000"} 1', text)
+            self.assertIn('upstream_replica_requests_total{model="m",outcome="error",replica="http://a:8000"}', text)
+        asyncio.run(run())
+
+    def test_fast_errors_score_as_slow(self):
+        async def run():
+            c, hits = upstream({"b": 0.01}, down={"a"})
+            async with c:
+                lb = balancer_mod._balancer = Balancer({"m": ["http://a:8000", "http://b:8000"]}, eject_failures=100)
+                for _ in range(20):
+                    try:
+                        await openai_chat(c, "http://default:8000", {"model": "m"})
+                    except httpx.HTTPStatusError:
+                        pass
+                a, b = lb.pool("m", "")
+            # without the penalty a's near-zero error latency would keep winning the comparison
+            self.assertEqual(hits["a"], 1)
+            self.assertGreater(a.score(), b.score())
+        asyncio.run(run())
+
+    def test_unlisted_models_use_caller_url_and_4xx_is_not_a_failure(self):
+        async def run():
+            async def handler(request):
+                return httpx.Response(400)
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+                lb = balancer_mod._balancer = Balancer({}, eject_failures=1)
+                with self.assertRaises(httpx.HTTPStatusError):
+                    await openai_chat(c, "http://default:8000/", {"model": "other"})
+                (r,) = lb.pool("other", "http://default:8000")
+            self.assertEqual((r.url, r.failures, r.in_flight), ("http://default:8000", 0, 0))
+        asyncio.run(run())
+
+    def test_prefix_affinity_sticks_and_respects_load_bound(self):
+        lb = Balancer({"m": [f"http://r{i}:8000" for i in range(4)]})
+        convo = lambda n, turns: {"model": "m", "messages": [{"role": "system", "content": "agent"}]
+                                  + [{"role": "user", "content": f"c{n} t{t}"} for t in range(turns)]}
+        owners = {lb.pick("m", "", lb.affinity_key(convo(n, 1))).url for n in range(40)}
+        self.assertGreater(len(owners), 1)
+        first = lb.pick("m", "", lb.affinity_key(convo(7, 1)))
+        for turns in range(2, 6):
+            self.assertIs(lb.pick("m", "", lb.affinity_key(convo(7, turns))), first)
+        first.in_flight = 5
+        self.assertIsNot(lb.pick("m", "", lb.affinity_key(convo(7, 2))), first)
+        first.in_flight = 0
+        first.healthy = False
+        moved = lb.pick("m", "", lb.affinity_key(convo(7, 2)))
+        self.assertIsNot(moved, first)
+        self.assertIs(lb.pick("m", "", lb.affinity_key(convo(7, 3))), moved)
+        hits, n = lb._affinity["m"]
+        self.assertEqual((n - hits, lb.stats()[("upstream_affinity_hit_ratio", (("model", "m"),))]), (1, round(hits / n, 4)))
+
+    def test_parse_replicas(self):
+        self.assertEqual(parse_replicas(""), {})
+        self.assertEqual(parse_replicas('{"m": ["http://a:8000/", "http://b:8000"]}'), {"m": ["http://a:8000", "http://b:8000"]})
+        with self.assertRaises(ValueError):
+            parse_replicas('["http://a:8000"]')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys, asyncio, tempfile, os, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found import metrics
+from adi_agi_found.cache import ResponseCache, request_key, cacheable
+
+class TestCache(unittest.TestCase):
+    def test_key_is_canonical(self):
+        a = request_key("m", {"messages": [{"role":"user","content":"hi"}], "temperature": 0, "max_tokens": 5})
+        b = request_key("m", {"max_tokens": 5, "stream": False, "temperature": 0, "messages": [{"content":"hi","role":"user"}]})
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, request_key("other", {"messages": [{"role":"user","content":"hi"}], "temperature": 0, "max_tokens": 5}))
+        self.assertTrue(cacheable({"temperature": 0}))
+        self.assertFalse(cacheable({"temperature": 0.7}))
+        self.assertFalse(cacheable({"temperature": 0, "n": "two"}))
+
+    def test_swarm_key_covers_every_swarm_setting(self):
+        import dataclasses
+        from unittest import mock
+        from adi_agi_found import api
+        msgs = [{"role": "user", "content": "hi"}]
+        base = api.swarm_flight_key(msgs)
+        for name in ("swarm_budget_sec", "swarm_fanout", "swarm_candidate_timeout_sec", "swarm_n", "model_id_70b"):
+            value = getattr(api.settings, name)
+            changed = value + "x" if isinstance(value, str) else value + 1
+            with mock.patch.object(api, "settings", dataclasses.replace(api.settings, **{name: changed})):
+                self.assertNotEqual(api.swarm_flight_key(msgs), base, name)
+        self.assertEqual(api.swarm_flight_key(list(msgs)), base)
+
+    def test_lru_and_ttl(self):
+        async def run():
+            c = ResponseCache(max_entries=2, max_bytes=1 << 20, ttl_sec=60)
+            await c.put("a", b"1"); await c.put("b", b"2")
+            self.assertEqual(await c.get("a"), b"1")
+            await c.put("c", b"3")
+            self.assertIsNone(await c.get("b"))
+            self.assertEqual(await c.get("a"), b"1")
+            c.ttl_sec = -1
+            await c.put("d", b"4")
+            self.assertIsNone(await c.get("d"))
+        asyncio.run(run())
+
+    def test_disk_tier_survives_restart(self):
+        async def run(path):
+            c1 = ResponseCache(max_entries=10, max_bytes=1 << 20, ttl_sec=60, disk_path=path)
+            await c1.put("k", b'{"x":1}')
+            c2 = ResponseCache(max_entries=10, max_bytes=1 << 20, ttl_sec=60, disk_path=path)
+            self.assertEqual(await c2.get("k"), b'{"x":1}')
+        with tempfile.TemporaryDirectory() as td:
+            asyncio.run(run(os.path.join(td, "cache.sqlite3")))
+
+    def test_one_collector_per_cache(self):
+        before = len(metrics._collectors)
+        c1 = ResponseCache(max_entries=2, max_bytes=1 << 20, ttl_sec=60)
+        c2 = ResponseCache(max_entries=2, max_bytes=1 << 20, ttl_sec=60)
+        self.assertLessEqual(len(metrics._collectors), before + 1)
+        c1.close()
+        self.assertEqual(metrics._collectors["response_cache"], c2.stats)
+        c2.close()
+        self.assertNotIn("response_cache", metrics._collectors)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found.consensus import similarity, vote
+
+class TestConsensus(unittest.TestCase):
+    def test_near_duplicates_share_a_cluster(self):
+        cands = [("The capital of France is Paris.", 1.0),
+                 ("the capital of france is Paris", 1.5),
+                 ("The capital of France is Paris!\n", 1.0),
+                 ("Lyon is the capital of France.", 1.0)]
+        text, clusters = vote(cands)
+        self.assertEqual(len(clusters), 2)
+        self.assertEqual(sorted(clusters[0].members), [0, 1, 2])
+        self.assertIn("Paris", text)
+
+    def test_different_numbers_never_merge(self):
+        _, clusters = vote([("The answer is 42.", 1.0), ("The answer is 43.", 1.0)])
+        self.assertEqual(len(clusters), 2)
+
+    def test_number_guard_applies_at_low_similarity(self):
+        sim = similarity(["Total: 42 apples after the second harvest", "The total was 43 apples"])
+        self.assertEqual(sim[0, 1], 0.0)
+        sim = similarity(["Total: 42 apples after the second harvest", "The total was 42 apples"])
+        self.assertGreater(sim[0, 1], 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,9 @@
-import sys, tempfile, os
+import sys, tempfile, os, asyncio, dataclasses, json, random, sqlite3, time
 from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str((ROOT / "src").resolve()))
 import unittest
-from adi_agi_found.memory import Memory
+from adi_agi_found.memory import OTHER_OBJECT_MIN_CONF, Memory, _reason, encode_cursor
 
 class TestContradiction(unittest.TestCase):
     def test_contradiction_diff_object(self):
@@ -15,5 +15,231 @@ class TestContradiction(unittest.TestCase):
             cs = m.contradictions("A","has")
             self.assertTrue(len(cs) >= 1)
 
+    def test_async_access(self):
+        async def run(m):
+            await m.aupsert_fact("B","is","on","true",0.9,"p1")
+            await m.aupsert_fact("B","is","on","false",0.9,"p2")
+            return await m.acontradictions("B","is")
+        with tempfile.TemporaryDirectory() as td:
+            m = Memory(os.path.join(td, "m.sqlite3")); m.init()
+            cs = asyncio.run(run(m))
+            m.close()
+            self.assertEqual([c["reason"] for c in cs], ["opposite_polarity_same_object"])
+
+    def test_bulk_matches_sequential(self):
+        facts = [("A","has","X","true",0.9,"p1"), ("A","has","Y","true",0.9,"p2"),
+                 ("A","has","X","false",0.8,"p3"), ("B","is","Z","true",0.5,"p4"), ("A","has","Y","true",0.95,"p5")]
+        with tempfile.TemporaryDirectory() as td:
+            seq = Memory(os.path.join(td, "seq.sqlite3")); seq.init()
+            seq_ids = [seq.upsert_fact(*f) for f in facts]
+            bulk = Memory(os.path.join(td, "bulk.sqlite3")); bulk.init()
+            bulk.upsert_fact("C","x","y","true",0.1,"seed")
+            ids = bulk.upsert_facts(facts)
+            self.assertEqual(ids, [i + 1 for i in seq_ids])
+            key = lambda cs: sorted((c["reason"], c["object_a"], c["object_b"], c["prov_a"], c["prov_b"]) for c in cs)
+            self.assertEqual(key(bulk.contradictions("A","has")), key(seq.contradictions("A","has")))
+            # the stronger restatement of A has Y reinforces its fact instead of adding a second X/Y pair
+            self.assertEqual(len(seq.contradictions("A","has")), 2)
+            seq.close(); bulk.close()
+
+    def test_duplicates_reinforce_one_fact(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init()
+            ids = m.upsert_facts([("D","is","red","true",0.85,f"p{i}") for i in range(50)])
+            self.assertEqual(set(ids), {ids[0]})
+            self.assertEqual(m.upsert_fact("D","is","red","true",0.99,"best"), ids[0])
+            m.upsert_fact("D","is","blue","true",0.9,"new")
+            m.upsert_fact("D","is","blue","true",0.95,"again")
+            cs = m.contradictions("D","is")
+            self.assertEqual(len(cs), 1)
+            self.assertEqual((cs[0]["prov_a"], cs[0]["conf_b"]), ("new", 0.99))
+            m.close()
+            with sqlite3.connect(db) as c:
+                self.assertEqual(c.execute("SELECT occurrences FROM facts WHERE id=?", (ids[0],)).fetchone()[0], 51)
+
+    def test_legacy_duplicates_keep_one_row_each(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init()
+            m.close()
+            # rows written before upserts deduplicated: the same fact three times
+            with sqlite3.connect(db) as c:
+                c.executemany("INSERT INTO facts(subject,predicate,object,polarity,confidence,provenance,created_ts) VALUES (?,?,?,?,?,?,?)",
+                              [("L","is","red","true",conf,f"old{i}",1) for i, conf in enumerate((0.85, 0.9, 0.5))])
+                c.execute("DELETE FROM fact_objects")
+            m.init()
+            m.upsert_fact("L","is","blue","true",0.9,"new")
+            cs = m.contradictions("L","is")
+            self.assertEqual(sorted(c["prov_b"] for c in cs), ["old0", "old1"])
+            m.upsert_facts([("L","is","red","false",0.95,"neg")])
+            cs = m.contradictions("L","is")
+            self.assertEqual(sorted(c["prov_b"] for c in cs if c["prov_a"] == "neg"), ["old0", "old1"])
+            m.close()
+
+    def test_narrowed_candidates_match_a_full_scan(self):
+        rng = random.Random(7)
+        facts = [("S", "p", f"O{rng.randrange(8)}", rng.choice(["true", "false"]), rng.choice([0.5, 0.75, 0.85, 0.95]), "x")
+                 for _ in range(300)]
+        with tempfile.TemporaryDirectory() as td:
+            m = Memory(os.path.join(td, "m.sqlite3")); m.init()
+            for i in range(0, len(facts), 7):
+                m.upsert_facts(facts[i:i + 7])
+            m.close()
+            with sqlite3.connect(m.path) as c:
+                rows = c.execute("SELECT id, object, polarity, confidence FROM facts").fetchall()
+                got = {(min(a, b), max(a, b), r) for a, b, r in c.execute("SELECT fact_a_id, fact_b_id, reason FROM contradictions")}
+        want = {(a[0], b[0], r) for a in rows for b in rows if a[0] < b[0]
+                for r in [_reason(a[1], a[2], a[3], b[1], b[2], b[3])] if r}
+        self.assertEqual(got, want)
+        self.assertTrue({"opposite_polarity_same_object", "different_object_same_subject_predicate"} <= {r for *_, r in got})
+
+    def test_strong_affirmations_come_from_the_conf_index(self):
+        with tempfile.TemporaryDirectory() as td:
+            m = Memory(os.path.join(td, "m.sqlite3")); m.init()
+            m.upsert_facts([("S", "p", f"O{i}", "true", 0.5 + (i % 5) / 10, "x") for i in range(200)])
+            m.close()
+            with sqlite3.connect(m.path) as c:
+                plan = " | ".join(r[3] for r in c.execute(
+                    "EXPLAIN QUERY PLAN SELECT object, max_conf, rep_fact_id, n FROM fact_objects "
+                    "WHERE subject=? AND predicate=? AND polarity='true' AND max_conf>=?", ("S", "p", OTHER_OBJECT_MIN_CONF)))
+        self.assertIn("idx_fact_objects_conf", plan)
+
+    def test_upsert_endpoint_validates_before_writing(self):
+        from unittest import mock
+        from fastapi.testclient import TestClient
+        from adi_agi_found import api
+        good = '{"subject":"Zeta","predicate":"is","object":"bulkcheck"}'
+        with TestClient(api.app) as c, mock.patch.object(api, "settings", dataclasses.replace(api.settings, memory_bulk_batch_size=1)):
+            for body in (f"{good}\n{good}\n{{oops\n", f'{good}\n{{"subject":"Zeta","predicate":"is"}}\n'):
+                r = c.post("/v1/memory/facts/upsert", content=body, headers={"Content-Type": "application/x-ndjson"})
+                self.assertEqual(r.status_code, 400)
+                self.assertIn("index", r.json()["detail"])
+            self.assertEqual(api.memory.search("bulkcheck")["facts"], [])
+            self.assertEqual(c.post("/v1/memory/facts/upsert", json={"facts": [1]}).status_code, 400)
+            self.assertEqual(c.post("/v1/memory/facts/upsert", json=[]).status_code, 400)
+            r = c.post("/v1/memory/facts/upsert", json={"facts": [json.loads(good), json.loads(good)]})
+            self.assertEqual(len(r.json()["ids"]), 2)
+
+    def test_summary_backfilled_for_existing_db(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init()
+            m.upsert_fact("E","is","on","true",0.9,"p1")
+            m.close()
+            with sqlite3.connect(db) as c:
+                c.execute("DELETE FROM fact_objects")
+            m.init()
+            m.upsert_fact("E","is","on","false",0.9,"p2")
+            self.assertEqual(len(m.contradictions("E","is")), 1)
+            m.close()
+
+    def test_compaction_folds_legacy_duplicates(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init()
+            y = m.upsert_fact("F","has","Y","true",0.9,"p0")
+            m.close()
+            # rows as older versions stored them: one per restatement, each linked to Y
+            with sqlite3.connect(db) as c:
+                for i in range(3):
+                    fid = c.execute("INSERT INTO facts(subject,predicate,object,polarity,confidence,provenance,created_ts,last_seen_ts) "
+                                    "VALUES ('F','has','X','true',?,?,?,?)", (0.8 + i / 100, f"x{i}", 100 + i, 100 + i)).lastrowid
+                    c.execute("INSERT INTO contradictions(fact_a_id,fact_b_id,reason,created_ts,subject,predicate) "
+                              "VALUES (?,?,'different_object_same_subject_predicate',1,'F','has')", (fid, y))
+                c.execute("DELETE FROM fact_objects")
+            m.init()
+            stats = m.compact()
+            self.assertEqual((stats["folded"], stats["links_deduped"]), (2, 2))
+            self.assertGreater(stats["memory_facts_bytes"], 0)
+            cs = m.contradictions("F","has")
+            self.assertEqual(len(cs), 1)
+            self.assertAlmostEqual(cs[0]["conf_a"], 0.82)
+            self.assertEqual(m.upsert_fact("F","has","X","true",0.5,"x3"), 4)
+            self.assertEqual(m.compact(ttl_sec=3600)["expired"], 0)
+            self.assertEqual(len(m.contradictions("F","has")), 1)
+            m.close()
+            with sqlite3.connect(db) as c:
+                self.assertEqual(c.execute("SELECT id, occurrences FROM facts WHERE object='X'").fetchall(), [(4, 4)])
+                c.execute("UPDATE facts SET last_seen_ts=100 WHERE object='X'")
+            self.assertEqual(m.compact(ttl_sec=3600)["expired"], 1)
+            self.assertEqual(m.contradictions("F","has"), [])
+            m.close()
+
+    def test_existing_file_is_converted_to_incremental_vacuum(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init(); m.close()
+            # a file from before the pragma
+            c = sqlite3.connect(db)
+            c.executescript("PRAGMA auto_vacuum=NONE; VACUUM;")
+            c.close()
+            mode = lambda: sqlite3.connect(db).execute("PRAGMA auto_vacuum").fetchone()[0]
+            self.assertEqual(mode(), 0)
+            with self.assertLogs("adi_agi_found.memory", "WARNING") as logs:
+                m = Memory(db, convert_auto_vacuum=False); m.init(); m.close()
+            self.assertIn("will not return space", logs.output[0])
+            self.assertEqual(mode(), 0)
+            m = Memory(db); m.init(); m.close()
+            self.assertEqual(mode(), 2)
+
+    def test_cap_runs_alongside_ttl_expiry(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init()
+            m.upsert_facts([("H","has",f"O{i}","true",0.5,"p") for i in range(6)])
+            m.close()
+            with sqlite3.connect(db) as c:
+                c.execute("UPDATE facts SET last_seen_ts=100 WHERE object='O0'")
+            stats = m.compact(ttl_sec=3600, max_facts=3, chunk=100)
+            self.assertEqual(stats["expired"], 3)
+            with sqlite3.connect(db) as c:
+                self.assertEqual(c.execute("SELECT COUNT(*) FROM facts").fetchone()[0], 3)
+            async def inside_loop():
+                with self.assertRaises(RuntimeError):
+                    m.compact()
+                return await m.acompact()
+            self.assertEqual(asyncio.run(inside_loop())["expired"], 0)
+            m.close()
+
+    def test_keyset_pages_and_filters(self):
+        with tempfile.TemporaryDirectory() as td:
+            m = Memory(os.path.join(td, "m.sqlite3")); m.init()
+            # one batch shares a created_ts, so paging has to break ties on id
+            m.upsert_facts([("G","has",f"O{i}","true",0.8 + (i % 2) / 10,f"p{i % 3}") for i in range(30)])
+            seen, cursor = [], None
+            while True:
+                page = m.contradictions_page("G","has", limit=40, cursor=cursor)
+                seen += [c["contradiction_id"] for c in page["contradictions"]]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+            self.assertEqual(len(seen), 29 * 30 // 2)
+            self.assertEqual(seen, sorted(set(seen), reverse=True))
+            strong = m.contradictions_page("G","has", limit=1000, min_confidence=0.85)["contradictions"]
+            self.assertEqual(len(strong), 15 * 14 // 2)
+            mine = m.contradictions_page("G","has", limit=1000, provenance="p0")["contradictions"]
+            self.assertTrue(mine and all("p0" in (c["prov_a"], c["prov_b"]) for c in mine))
+            self.assertEqual(m.contradictions_page("G","has", reason="opposite_polarity_same_object")["contradictions"], [])
+            self.assertEqual(m.contradictions_page("G","has", since=int(time.time()) + 10)["contradictions"], [])
+            with self.assertRaises(ValueError):
+                m.contradictions_page("G","has", cursor="not-a-cursor")
+            m.close()
+
+    def test_contradiction_page_is_an_index_range_scan(self):
+        with tempfile.TemporaryDirectory() as td:
+            m = Memory(os.path.join(td, "m.sqlite3")); m.init()
+            m.upsert_facts([(f"S{i % 20}","p",f"O{i}","true",0.9,"x") for i in range(400)])
+            filters = [{}, {"cursor": encode_cursor(2**40, 2**40)}, {"reason": "opposite_polarity_same_object"},
+                       {"provenance": "x", "min_confidence": 0.5, "since": 0, "until": 2**40}]
+            with sqlite3.connect(m.path) as c:
+                for f in filters:
+                    sql, args = Memory._contradictions_sql("S1", "p", 50, **f)
+                    plan = " | ".join(r[3] for r in c.execute("EXPLAIN QUERY PLAN " + sql, args))
+                    self.assertIn("SEARCH ct USING INDEX idx_contra_sp_ts", plan)
+                    self.assertNotIn("TEMP B-TREE", plan)
+                    self.assertNotIn("SCAN", plan)
+            m.close()
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,23 @@
+import sys, json
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found.fastjson import set_model
+
+class TestSetModel(unittest.TestCase):
+    def test_rewrites_only_the_top_level_model(self):
+        body = {"id": "x", "object": "model", "choices": [{"message": {"content": '"model": "in {text}', "model": "inner"}}],
+                "model": "backend", "usage": {"model": "nested"}}
+        raw = json.dumps(body).encode()
+        out = set_model(raw, 'alias "q"')
+        self.assertEqual(json.loads(out), dict(body, model='alias "q"'))
+        # untouched bytes are forwarded as they came
+        self.assertEqual(out.replace(b'"alias \\"q\\""', b'"backend"'), raw)
+
+    def test_falls_back_to_parsing(self):
+        self.assertEqual(json.loads(set_model(b'{"model": 7, "a": 1}', "alias")), {"model": "alias", "a": 1})
+        self.assertEqual(json.loads(set_model(b'{"a": {"model": "inner"}}', "alias")), {"a": {"model": "inner"}, "model": "alias"})
+
+if __name__ == "__main__":
+    unittest.main()
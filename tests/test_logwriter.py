@@ -0,0 +1,78 @@
+import sys, tempfile, os, json, gzip, time
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from unittest import mock
+from adi_agi_found.logwriter import GroupCommitWriter
+
+class TestLogWriter(unittest.TestCase):
+    def test_lines_are_written_in_order(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "sub", "audit.jsonl")
+            w = GroupCommitWriter(path, name="t", queue_size=100, flush_interval=0.01, flush_bytes=1 << 16)
+            for i in range(50):
+                w.submit(json.dumps({"i": i}) + "\n")
+            w.close()
+            rows = [json.loads(l) for l in open(path, encoding="utf-8")]
+            self.assertEqual([r["i"] for r in rows], list(range(50)))
+
+    def test_rotation_with_compression(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "dlq.jsonl")
+            w = GroupCommitWriter(path, name="t", queue_size=100, flush_interval=0.01, flush_bytes=1,
+                                  rotate_bytes=10, compress=True)
+            w.submit("x" * 20 + "\n")
+            w.flush()
+            w.submit("y\n")
+            w.close()
+            rotated = [f for f in os.listdir(td) if f.endswith(".gz")]
+            self.assertEqual(len(rotated), 1)
+            self.assertEqual(gzip.open(os.path.join(td, rotated[0])).read(), b"x" * 20 + b"\n")
+            self.assertEqual(open(path).read(), "y\n")
+
+    def test_drop_policy_never_blocks(self):
+        with tempfile.TemporaryDirectory() as td:
+            w = GroupCommitWriter(os.path.join(td, "a.jsonl"), name="t", queue_size=1, flush_interval=5.0,
+                                  flush_bytes=1 << 20, full_policy="drop")
+            accepted = sum(w.submit("z\n") for _ in range(100))
+            self.assertLess(accepted, 100)
+            w.close()
+
+    def test_rotation_error_keeps_writer_alive(self):
+        with tempfile.TemporaryDirectory() as td:
+            path = os.path.join(td, "audit.jsonl")
+            w = GroupCommitWriter(path, name="t", queue_size=100, flush_interval=0.01, flush_bytes=1,
+                                  rotate_bytes=10, compress=True)
+            with mock.patch("adi_agi_found.logwriter.gzip.open", side_effect=OSError("disk full")):
+                w.submit("x" * 20 + "\n")
+                w.flush()
+            self.assertTrue(w._thread.is_alive())
+            w.submit("y\n")
+            w.close()
+            self.assertEqual(open(path).read(), "y\n")
+
+    def test_block_policy_waits_a_bounded_time(self):
+        class SlowFile:
+            def write(self, data):
+                time.sleep(0.5)
+            def flush(self):
+                pass
+            def tell(self):
+                return 0
+            def close(self):
+                pass
+        with tempfile.TemporaryDirectory() as td:
+            w = GroupCommitWriter(os.path.join(td, "a.jsonl"), name="t", queue_size=1, flush_interval=0.001,
+                                  flush_bytes=1, block_timeout=0.05)
+            w._f = SlowFile()
+            w.submit("a\n")
+            time.sleep(0.05)
+            t0 = time.monotonic()
+            results = [w.submit("b\n"), w.submit("c\n")]
+            self.assertLess(time.monotonic() - t0, 0.3)
+            self.assertEqual(results, [True, False])
+            w.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+import sys, threading
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found import metrics
+
+class TestMetrics(unittest.TestCase):
+    def test_labelled_series(self):
+        metrics.inc("tm_requests_total", labels={"route": "json", "alias": "a"})
+        metrics.inc("tm_requests_total", 2, {"alias": "a", "route": "json"})
+        metrics.set_gauge("tm_depth", 3, {"queue": 'say "hi"'})
+        metrics.define_buckets("tm_rate", (10, 1))
+        metrics.observe("tm_rate", 5, {"model": "m"})
+        out = metrics.render()
+        self.assertIn('tm_requests_total{alias="a",route="json"} 3', out)
+        self.assertIn('tm_depth{queue="say \\"hi\\""} 3', out)
+        self.assertIn('tm_rate_bucket{model="m",le="1"} 0', out)
+        self.assertIn('tm_rate_bucket{model="m",le="10"} 1', out)
+        self.assertIn('tm_rate_count{model="m"} 1', out)
+        self.assertEqual(out.count("# TYPE tm_requests_total counter"), 1)
+
+    def test_thread_shards_merge_and_survive_their_threads(self):
+        def work():
+            for _ in range(1000):
+                metrics.inc("tm_threaded_total")
+                metrics.observe("tm_threaded_seconds", 0.002)
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for _ in range(2):
+            out = metrics.render()
+            self.assertIn("tm_threaded_total 4000", out)
+            self.assertIn('tm_threaded_seconds_bucket{le="0.0025"} 4000', out)
+            self.assertIn("tm_threaded_seconds_count 4000", out)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,9 +1,9 @@
-import sys
+import asyncio, json, sys, threading, time
 from pathlib import Path
 ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str((ROOT / "src").resolve()))
 import unittest
-from adi_agi_found.sandbox import run_python_sandbox
+from adi_agi_found.sandbox import CodeCache, SandboxBusy, SandboxLimiter, SandboxPool, run_python_sandbox
 
 class TestSandbox(unittest.TestCase):
     def test_math_ok(self):
@@ -16,5 +16,118 @@ class TestSandbox(unittest.TestCase):
         out = run_python_sandbox("x=1\nx.__class__", workdir=str(ROOT/"data"/"sandbox_work"), timeout_sec=2.0)
         self.assertFalse(out["ok"])
 
+    def test_pool_reuses_and_recycles_workers(self):
+        pool = SandboxPool(size=1, workdir=str(ROOT/"data"/"sandbox_work"), max_tasks=2)
+        try:
+            out = pool.run("import math\nprint(math.sqrt(81))\n2+2", timeout_sec=5.0)
+            self.assertEqual((out["ok"], out["stdout"], out["result"]), (True, "9.0\n", 4))
+            # writes to shared module state would leak into later runs on the same worker
+            self.assertEqual(pool.run("math.pi = 3", timeout_sec=5.0)["error"], "attribute_access_not_allowed")
+            self.assertEqual(pool.run("re._cache", timeout_sec=5.0)["error"], "attribute_access_not_allowed")
+            self.assertEqual(pool.run("while True:\n  pass", timeout_sec=0.3)["error"], "timeout")
+            self.assertEqual(pool.run("sum(range(10))", timeout_sec=5.0)["result"], 45)
+            stats = pool.stats()
+            self.assertEqual(stats["sandbox_pool_timeouts_total"], 1)
+            self.assertGreaterEqual(stats["sandbox_pool_recycled_total"], 2)
+        finally:
+            pool.close()
+
+    def test_pool_keeps_module_state_private_between_snippets(self):
+        pool = SandboxPool(size=1, workdir=str(ROOT/"data"/"sandbox_work"))
+        try:
+            for code in ("from re import _cache\n_cache[('x', 'y', 0)] = 1", "from json import _default_encoder"):
+                self.assertTrue(pool.run(code, timeout_sec=5.0)["error"].startswith("name_not_allowed: _"))
+            self.assertEqual(pool.run("re.sub('a+', 'b', 'aaa')", timeout_sec=5.0)["result"], "b")
+            self.assertEqual(pool.run("from re import sub\nsub('a', 'b', 'aa')", timeout_sec=5.0)["result"], "bb")
+        finally:
+            pool.close()
+
+    def test_pool_rejects_when_queue_wait_expires(self):
+        pool = SandboxPool(size=1, workdir=str(ROOT/"data"/"sandbox_work"), queue_timeout_sec=0.05)
+        try:
+            self.assertTrue(pool.run("1", timeout_sec=5.0)["ok"])
+            t = threading.Thread(target=pool.run, args=("while True:\n  pass",), kwargs={"timeout_sec": 0.5})
+            t.start()
+            time.sleep(0.1)
+            self.assertEqual(pool.run("1", timeout_sec=5.0)["error"], "busy")
+            t.join()
+        finally:
+            pool.close()
+
+    def test_pool_enforces_cpu_and_memory_limits(self):
+        pool = SandboxPool(size=1, workdir=str(ROOT/"data"/"sandbox_work"), cpu_sec=1, memory_bytes=256 << 20)
+        try:
+            self.assertEqual(pool.run("while True:\n  pass", timeout_sec=10.0)["error"], "cpu_limit_exceeded")
+            out = pool.run("x = [0] * 100000000\nlen(x)", timeout_sec=10.0)
+            self.assertEqual(out["error"], "runtime_error")
+            self.assertIn("MemoryError", out["trace"])
+            # limits are per snippet: the next one on the same worker runs normally
+            self.assertEqual(pool.run("len([0] * 1000000)", timeout_sec=10.0)["result"], 1000000)
+            self.assertEqual(pool.stats()["sandbox_pool_cpu_limited_total"], 1)
+        finally:
+            pool.close()
+
+    def test_code_cache_skips_validation_on_repeat(self):
+        cache = CodeCache(max_entries=2)
+        pool = SandboxPool(size=1, workdir=str(ROOT/"data"/"sandbox_work"), cache=cache)
+        try:
+            for _ in range(3):
+                self.assertEqual(pool.run("xs = [1, 2]\nsum(xs)", timeout_sec=5.0)["result"], 3)
+            for _ in range(2):
+                self.assertEqual(pool.run("import os", timeout_sec=5.0)["error"], "import_not_allowed: os")
+            # the cached rejection is answered without a worker round trip
+            self.assertEqual(pool.stats()["sandbox_pool_runs_total"], 4)
+            self.assertEqual(run_python_sandbox("xs = [1, 2]\nsum(xs)", workdir=str(ROOT/"data"/"sandbox_work"),
+                                                timeout_sec=2.0, cache=cache)["result"], 3)
+            pool.run("1", timeout_sec=5.0)
+            stats = cache.stats()
+            self.assertEqual((stats["sandbox_code_cache_hits_total"], stats["sandbox_code_cache_misses_total"]), (4, 3))
+            self.assertEqual(stats["sandbox_code_cache_entries"], 2)
+        finally:
+            pool.close()
+
+    def test_limiter_turns_away_past_the_queue(self):
+        gate = threading.Event()
+        limiter = SandboxLimiter(lambda code, **kw: gate.wait(5) and {"ok": True, "result": code},
+                                 concurrency=1, max_queue=1)
+        async def scenario():
+            first = asyncio.ensure_future(limiter.run("a"))
+            await asyncio.sleep(0.05)
+            second = asyncio.ensure_future(limiter.run("b"))
+            await asyncio.sleep(0.05)
+            self.assertEqual(limiter.stats(), {"sandbox_running": 1, "sandbox_queued": 1})
+            with self.assertRaises(SandboxBusy) as busy:
+                await limiter.run("c")
+            self.assertGreaterEqual(busy.exception.retry_after, 1)
+            gate.set()
+            (a, waited_a, _), (b, waited_b, _) = await asyncio.gather(first, second)
+            self.assertEqual((a["result"], b["result"]), ("a", "b"))
+            self.assertGreater(waited_b, waited_a)
+        try:
+            asyncio.run(scenario())
+        finally:
+            limiter.close()
+
+    def test_execute_batch_keeps_order_and_streams(self):
+        from fastapi.testclient import TestClient
+        from adi_agi_found.api import app
+        items = [{"code": "while True:\n  pass", "timeout_sec": 0.5}, {"code": "2+2"}, {"code": ""}, "x", {"code": "import os"}]
+        with TestClient(app) as c:
+            r = c.post("/v1/tools/execute_batch", json={"items": items})
+            self.assertEqual(r.status_code, 200)
+            results = r.json()["results"]
+            self.assertEqual([x["index"] for x in results], [0, 1, 2, 3, 4])
+            self.assertEqual([x["status"] for x in results], ["error", "ok", "invalid", "invalid", "error"])
+            self.assertEqual((results[0]["error"], results[1]["result"]), ("timeout", 4))
+            with c.stream("POST", "/v1/tools/execute_batch", json={"items": items[:2], "stream": True}) as r:
+                lines = [json.loads(x) for x in r.iter_lines() if x]
+            # the quick item is not held back by the slow one
+            self.assertEqual([x["index"] for x in lines], [1, 0])
+            self.assertEqual(c.post("/v1/tools/execute_batch", json={"items": []}).status_code, 400)
+            for body in ([{"code": "1"}], "x", None):
+                self.assertEqual(c.post("/v1/tools/execute_batch", json=body).status_code, 400)
+                self.assertEqual(c.post("/v1/tools/execute", json=body).status_code, 400)
+            self.assertEqual(c.post("/v1/tools/execute_batch", content=b"{").status_code, 400)
+
 if __name__ == "__main__":
     unittest.main()
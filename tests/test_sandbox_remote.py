@@ -0,0 +1,92 @@
+import sys, asyncio
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from unittest import mock
+import httpx
+from adi_agi_found.sandbox import SandboxBusy
+from adi_agi_found.sandbox_remote import RemoteSandbox
+
+class TestRemoteSandbox(unittest.TestCase):
+    def test_least_outstanding_spreads_load(self):
+        async def run():
+            active, peak, hits = {}, {}, {}
+            async def handler(request):
+                host = request.url.host
+                active[host] = active.get(host, 0) + 1
+                peak[host] = max(peak.get(host, 0), active[host])
+                hits[host] = hits.get(host, 0) + 1
+                await asyncio.sleep(0.01)
+                active[host] -= 1
+                return httpx.Response(200, json={"ok": True, "result": host})
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+                remote = RemoteSandbox(["http://a:7010", "http://b:7010"], lambda: c)
+                outs = await asyncio.gather(*[remote.run("1", timeout_sec=1.0) for _ in range(8)])
+            self.assertTrue(all(o["ok"] for o in outs))
+            self.assertEqual(hits, {"a": 4, "b": 4})
+            self.assertEqual(peak, {"a": 4, "b": 4})
+        asyncio.run(run())
+
+    def test_failover_ejection_and_reinstatement(self):
+        async def run():
+            down = {"a"}
+            async def handler(request):
+                if request.url.host in down:
+                    return httpx.Response(503)
+                return httpx.Response(200, json={"ok": True, "result": request.url.host})
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+                remote = RemoteSandbox(["http://a:7010", "http://b:7010"], lambda: c, eject_failures=2)
+                # idle instances tie; always trying a first makes the ejection deterministic
+                with mock.patch("adi_agi_found.sandbox_remote.random.choice", lambda xs: xs[0]):
+                    for _ in range(6):
+                        self.assertEqual((await remote.run("1", timeout_sec=1.0))["result"], "b")
+                self.assertEqual(remote.stats()["sandbox_remote_healthy_endpoints"], 1)
+                down.clear()
+                await remote.check()
+                self.assertEqual(remote.stats()["sandbox_remote_healthy_endpoints"], 2)
+        asyncio.run(run())
+
+    def test_only_connect_errors_fail_over(self):
+        async def run():
+            hits = []
+            async def handler(request):
+                hits.append(request.url.host)
+                if request.url.host == "a":
+                    raise httpx.ConnectError("refused", request=request)
+                if request.url.host == "b":
+                    raise httpx.ReadTimeout("slow", request=request)
+                return httpx.Response(200, json={"ok": True, "result": request.url.host})
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+                remote = RemoteSandbox(["http://a:7010", "http://b:7010", "http://c:7010"], lambda: c, eject_failures=1)
+                with mock.patch("adi_agi_found.sandbox_remote.random.choice", lambda xs: xs[0]):
+                    self.assertEqual(await remote.run("1", timeout_sec=1.0), {"ok": False, "error": "timeout"})
+            self.assertEqual(hits, ["a", "b"])
+            self.assertEqual([e.healthy for e in remote.endpoints], [False, True, True])
+        asyncio.run(run())
+
+    def test_local_fallback_and_busy(self):
+        async def run():
+            status = {"code": 503}
+            async def handler(request):
+                if request.url.path == "/health" and status["code"] != 503:
+                    return httpx.Response(200, json={"ok": True})
+                return httpx.Response(status["code"], headers={"Retry-After": status.get("retry_after", "3")})
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as c:
+                remote = RemoteSandbox(["http://a:7010"], lambda: c, eject_failures=1,
+                                       local=lambda code, **kw: {"ok": True, "result": "local"})
+                self.assertEqual((await remote.run("1", timeout_sec=1.0))["result"], "local")
+                status["code"] = 429
+                await remote.check()
+                # a saturated fleet pushes back rather than spilling onto the proxy
+                with self.assertRaises(SandboxBusy) as busy:
+                    await remote.run("1", timeout_sec=1.0)
+                self.assertEqual(busy.exception.retry_after, 3)
+                status["retry_after"] = "Wed, 21 Oct 2026 07:28:00 GMT"
+                with self.assertRaises(SandboxBusy) as busy:
+                    await remote.run("1", timeout_sec=1.0)
+                self.assertEqual(busy.exception.retry_after, 1)
+        asyncio.run(run())
+
+if __name__ == "__main__":
+    unittest.main()
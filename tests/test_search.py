@@ -0,0 +1,93 @@
+import sys, tempfile, os, asyncio, sqlite3
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found.memory import Memory
+from adi_agi_found.shards import ShardedMemory
+
+FACTS = [("PatientA","has_condition","Diabetes","true",0.9,"note1"),
+         ("PatientA","has_condition","Hypertension","true",0.6,"note2"),
+         ("PatientA","takes","Metformin","true",0.9,"pharmacy"),
+         ("PatientB","has_condition","Diabetes","false",0.8,"note3"),
+         ("Clinic","located_in","Springfield","true",0.99,"registry")]
+
+def pages(m, q, **kw):
+    out, cursor = [], None
+    while True:
+        page = m.search(q, cursor=cursor, **kw)
+        out += [(h["subject"], h["object"]) for h in page["facts"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return out
+
+class TestSearch(unittest.TestCase):
+    def test_prefix_ranking_and_filters(self):
+        with tempfile.TemporaryDirectory() as td:
+            m = Memory(os.path.join(td, "m.sqlite3")); m.init()
+            m.upsert_facts(FACTS)
+            self.assertEqual({h["object"] for h in m.search("diab")["facts"]}, {"Diabetes"})
+            self.assertEqual([h["object"] for h in m.search("patienta diab")["facts"]], ["Diabetes"])
+            # "any" keeps partial matches, ranked after facts that match every word
+            hits = m.search("patienta diab", mode="any", limit=10)["facts"]
+            self.assertEqual(hits[0]["object"], "Diabetes")
+            self.assertEqual(len(hits), 4)
+            self.assertEqual([h["subject"] for h in m.search("diabetes", polarity="false")["facts"]], ["PatientB"])
+            self.assertEqual({h["object"] for h in m.search("patienta", min_confidence=0.8)["facts"]}, {"Diabetes", "Metformin"})
+            self.assertEqual(pages(m, "patienta", limit=1), [("PatientA", h["object"]) for h in m.search("patienta")["facts"]])
+            with self.assertRaises(ValueError):
+                m.search("  ,, ")
+            with self.assertRaises(ValueError):
+                m.search("x", mode="fuzzy")
+            m.close()
+
+    def test_index_follows_writes_and_compaction(self):
+        with tempfile.TemporaryDirectory() as td:
+            db = os.path.join(td, "m.sqlite3")
+            m = Memory(db); m.init()
+            m.upsert_facts(FACTS)
+            m.upsert_fact("Clinic","located_in","Springfield","true",0.99,"registry")
+            self.assertEqual(len(m.search("springfield")["facts"]), 1)
+            m.close()
+            with sqlite3.connect(db) as c:
+                c.execute("UPDATE facts SET last_seen_ts=1 WHERE subject='Clinic'")
+            m.compact(ttl_sec=3600)
+            self.assertEqual(m.search("springfield")["facts"], [])
+            m.close()
+            # stores created before the index get it built on init
+            with sqlite3.connect(db) as c:
+                c.executescript("DROP TRIGGER facts_fts_ai; DROP TRIGGER facts_fts_ad; DROP TRIGGER facts_fts_au; DROP TABLE facts_fts;")
+            m.init()
+            self.assertEqual(len(m.search("metformin")["facts"]), 1)
+            m.close()
+
+    def test_sharded_search_pages_across_shards(self):
+        with tempfile.TemporaryDirectory() as td:
+            m = ShardedMemory(os.path.join(td, "m.sqlite3"), 3); m.init()
+            m.upsert_facts([(f"agent{i}","knows","topic alpha","true",0.5,"p") for i in range(20)])
+            seen = pages(m, "alpha", limit=3)
+            self.assertEqual(sorted(seen), sorted((f"agent{i}", "topic alpha") for i in range(20)))
+            self.assertEqual(len(asyncio.run(m.asearch("alpha", limit=5))["facts"]), 5)
+            m.close()
+
+    def test_sharded_cursor_survives_writes_between_pages(self):
+        with tempfile.TemporaryDirectory() as td:
+            m = ShardedMemory(os.path.join(td, "m.sqlite3"), 3); m.init()
+            # uneven term frequencies give each shard a different IDF for "alpha"
+            m.upsert_facts([(f"agent{i}","knows","topic alpha" if i % 3 else "alpha beta gamma","true",0.5,"p") for i in range(30)])
+            seen, cursor = [], None
+            while True:
+                page = m.search("alpha", limit=4, cursor=cursor)
+                seen += [h["id"] for h in page["facts"]]
+                cursor = page["next_cursor"]
+                if cursor is None:
+                    break
+                m.upsert_facts([(f"agent{len(seen)}x","knows","beta","true",0.5,"p")])
+            self.assertEqual(len(seen), 30)
+            self.assertEqual(len(set(seen)), 30)
+            with self.assertRaises(ValueError):
+                m.search("alpha", cursor="bm90IGEgY3Vyc29y")
+            m.close()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import sys, asyncio
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found import metrics
+from adi_agi_found.singleflight import SingleFlight
+
+class TestSingleFlight(unittest.TestCase):
+    def test_identical_calls_share_one_execution(self):
+        async def run():
+            sf, calls = SingleFlight("t1"), []
+            async def fn():
+                calls.append(1)
+                await asyncio.sleep(0.05)
+                return {"v": 1}
+            outs = await asyncio.gather(*[sf.do("k", fn) for _ in range(5)])
+            self.assertEqual(len(calls), 1)
+            self.assertTrue(all(o == {"v": 1} for o in outs))
+            await sf.do("k", fn)
+            self.assertEqual(len(calls), 2)
+        asyncio.run(run())
+
+    def test_errors_reach_every_waiter(self):
+        async def run():
+            sf = SingleFlight("t2")
+            async def fn():
+                await asyncio.sleep(0.01)
+                raise ValueError("boom")
+            outs = await asyncio.gather(*[sf.do("k", fn) for _ in range(3)], return_exceptions=True)
+            self.assertTrue(all(isinstance(o, ValueError) for o in outs))
+        asyncio.run(run())
+
+    def test_cancellation(self):
+        async def run():
+            sf, state = SingleFlight("t3"), {"cancelled": False}
+            async def fn():
+                try:
+                    await asyncio.sleep(0.2)
+                    return "done"
+                except asyncio.CancelledError:
+                    state["cancelled"] = True
+                    raise
+            a = asyncio.ensure_future(sf.do("k", fn))
+            b = asyncio.ensure_future(sf.do("k", fn))
+            await asyncio.sleep(0.01)
+            a.cancel()
+            self.assertEqual(await b, "done")
+            self.assertFalse(state["cancelled"])
+            c = asyncio.ensure_future(sf.do("k2", fn))
+            await asyncio.sleep(0.01)
+            c.cancel()
+            await asyncio.sleep(0.01)
+            self.assertTrue(state["cancelled"])
+        asyncio.run(run())
+
+    def test_recreating_replaces_collector(self):
+        SingleFlight("t4")
+        before = len(metrics._collectors)
+        sf = SingleFlight("t4")
+        self.assertEqual(len(metrics._collectors), before)
+        self.assertEqual(metrics._collectors["singleflight_t4"], sf.stats)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import sys, asyncio, json
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+import httpx
+from adi_agi_found.swarm import run_swarm, run_gate
+
+def _client(handler):
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+def _reply(text):
+    return httpx.Response(200, json={"choices":[{"message":{"role":"assistant","content":text}}]})
+
+class TestSwarm(unittest.TestCase):
+    def _run(self, handler, **kw):
+        async def go():
+            async with _client(handler) as c:
+                args = dict(client=c, base_url="http://up", fast_model="fast", deep_model="deep", n=3, mode="weighted",
+                            question_messages=[{"role":"user","content":"q"}], weight_fast=1.0, weight_deep=1.5)
+                args.update(kw)
+                return await run_swarm(**args)
+        return asyncio.run(go())
+
+    def test_candidates_run_concurrently(self):
+        async def handler(request):
+            await asyncio.sleep(0.2)
+            return _reply("42")
+        out = self._run(handler)
+        self.assertEqual(out["consensus"], "42")
+        self.assertEqual(len(out["latency_ms"]), 3)
+        self.assertLess(out["wall_ms"], 500)
+
+    def test_failed_candidate_is_dropped(self):
+        async def handler(request):
+            if json.loads(request.content)["model"] == "deep":
+                return httpx.Response(500)
+            return _reply("ok")
+        out = self._run(handler)
+        self.assertEqual(out["candidates"], ["ok", "ok"])
+        self.assertEqual(out["dropped"][0]["model"], "deep")
+
+    def test_sequential_sampling_stops_early(self):
+        async def handler(request):
+            return _reply("42")
+        out = self._run(handler, n=7, sequential=True, min_samples=2, wave_size=2)
+        self.assertEqual(out["consensus"], "42")
+        self.assertEqual(out["stop_reason"], "decided")
+        self.assertEqual(out["sampled"], 4)
+        self.assertEqual(out["saved"], 3)
+
+    def test_gate_short_circuits_on_first_failure(self):
+        async def handler(request):
+            if json.loads(request.content)["model"] == "deep":
+                await asyncio.sleep(5)
+                return _reply('{"score": 9}')
+            return _reply('{"score": 3, "issues": ["wrong"]}')
+        async def go():
+            async with _client(handler) as c:
+                return await asyncio.wait_for(run_gate(client=c, base_url="http://up", fast_model="fast", deep_model="deep",
+                                                       question="q", answer="a", require_verifier=True), timeout=2)
+        gate = asyncio.run(go())
+        self.assertFalse(gate["ok"])
+        self.assertEqual(gate["failed_by"], "eval_fast")
+        self.assertEqual(gate["eval_deep"], {"skipped": "cancelled"})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import sys, asyncio
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+from adi_agi_found import tracing
+from adi_agi_found.tracing import Trace, TraceBuffer, span
+
+class TestTracing(unittest.TestCase):
+    def test_spans_nest_across_tasks(self):
+        async def run():
+            t = Trace("t1", "test", 0)
+            token = tracing._trace.set(t)
+            try:
+                with span("outer"):
+                    async def child(i):
+                        with span("child", i=i):
+                            await asyncio.sleep(0.01)
+                    await asyncio.gather(*(child(i) for i in range(3)))
+                with span("after"):
+                    pass
+            finally:
+                tracing._trace.reset(token)
+            return t
+        t = asyncio.run(run())
+        by_name = {}
+        for s in t.spans:
+            by_name.setdefault(s.name, []).append(s)
+        outer = by_name["outer"][0]
+        self.assertEqual([s.parent_id for s in by_name["child"]], [outer.span_id] * 3)
+        self.assertIsNone(by_name["after"][0].parent_id)
+        self.assertGreaterEqual(t.timings()["child"], 30.0)
+
+    def test_request_gets_server_timing_and_otlp_export(self):
+        from fastapi.testclient import TestClient
+        from adi_agi_found.api import app
+        saved, tracing.buffer = tracing.buffer, TraceBuffer(size=8, sample_rate=1.0, slow_ms=0)
+        self.addCleanup(setattr, tracing, "buffer", saved)
+        c = TestClient(app)
+        r = c.post("/v1/tools/execute", json={"code": "2+2"}, headers={"x-trace-id": "req-42"})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.headers["x-trace-id"], "req-42")
+        self.assertIn("sandbox.exec;dur=", r.headers["server-timing"])
+        self.assertIn("total;dur=", r.headers["server-timing"])
+        out = c.get("/debug/traces", params={"trace_id": "req-42"}).json()
+        spans = out["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        root = spans[0]
+        self.assertEqual(root["name"], "POST /v1/tools/execute")
+        self.assertEqual(len(root["traceId"]), 32)
+        self.assertEqual({s["name"] for s in spans[1:]}, {"sandbox.queue", "sandbox.exec"})
+        self.assertTrue(all(s["parentSpanId"] == root["spanId"] and s["traceId"] == root["traceId"] for s in spans[1:]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import sys, asyncio
+from pathlib import Path
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str((ROOT / "src").resolve()))
+import unittest
+import httpx
+from adi_agi_found.upstream import PooledTransport
+
+class TestUpstream(unittest.TestCase):
+    def test_per_host_limit(self):
+        async def run():
+            active = {"now": 0, "peak": 0}
+            async def handler(request):
+                active["now"] += 1
+                active["peak"] = max(active["peak"], active["now"])
+                await asyncio.sleep(0.01)
+                active["now"] -= 1
+                return httpx.Response(200, json={"ok": True})
+            transport = PooledTransport(httpx.MockTransport(handler), per_host_limit=2, pool_timeout=5.0)
+            async with httpx.AsyncClient(transport=transport) as c:
+                rs = await asyncio.gather(*[c.post("http://up:8000/v1/chat/completions", json={}) for _ in range(6)])
+            self.assertTrue(all(r.json()["ok"] for r in rs))
+            self.assertEqual(active["peak"], 2)
+            self.assertEqual(transport.stats()["upstream_pool_requests_in_flight"], 0)
+        asyncio.run(run())
+
+    def test_pool_timeout(self):
+        async def run():
+            async def handler(request):
+                await asyncio.sleep(0.5)
+                return httpx.Response(200, json={})
+            transport = PooledTransport(httpx.MockTransport(handler), per_host_limit=1, pool_timeout=0.05)
+            async with httpx.AsyncClient(transport=transport) as c:
+                rs = await asyncio.gather(c.get("http://up:8000/a"), c.get("http://up:8000/b"), return_exceptions=True)
+            self.assertTrue(any(isinstance(r, httpx.PoolTimeout) for r in rs))
+        asyncio.run(run())
+
+    def test_sse_events_counted_across_split_chunks(self):
+        from adi_agi_found.api import sse_data_lines
+        body = b'data: {"t": 1}\n\ndata: {"t": 2}\r\n\r\n: keepalive\n\ndata: [DONE]\n\n'
+        for size in (1, 3, 7, len(body)):
+            events, tail = 0, b""
+            for i in range(0, len(body), size):
+                n, tail = sse_data_lines(tail, body[i:i + size])
+                events += n
+            self.assertEqual((events, tail), (3, b""))
+        self.assertEqual(sse_data_lines(b"da", b"ta: x"), (0, b"data: x"))
+
+if __name__ == "__main__":
+    unittest.main()
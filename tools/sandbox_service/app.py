@@ -2,19 +2,50 @@ from __future__ import annotations
 import os
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel, Field
-from sandbox_impl import run_python_sandbox
+from sandbox_impl import CodeCache, SandboxBusy, SandboxLimiter, SandboxPool, run_python_sandbox
 
 app = FastAPI(title="adi-agi-found-sandbox", version="0.1")
 
+WORKDIR = os.getenv("FOUND_SANDBOX_WORKDIR","data/sandbox_work")
+POOL_SIZE = int(os.getenv("FOUND_SANDBOX_POOL_SIZE","4"))
+CPU_SEC = float(os.getenv("FOUND_SANDBOX_CPU_SEC","2.0"))
+MEMORY_BYTES = int(os.getenv("FOUND_SANDBOX_MEMORY_MB","256")) << 20
+CACHE_SIZE = int(os.getenv("FOUND_SANDBOX_CODE_CACHE_SIZE","1024"))
+cache = CodeCache(CACHE_SIZE) if CACHE_SIZE > 0 else None
+pool = SandboxPool(size=POOL_SIZE, workdir=WORKDIR, max_tasks=int(os.getenv("FOUND_SANDBOX_POOL_MAX_TASKS","200")),
+                   queue_timeout_sec=float(os.getenv("FOUND_SANDBOX_QUEUE_TIMEOUT_SEC","10.0")),
+                   cpu_sec=CPU_SEC, memory_bytes=MEMORY_BYTES, cache=cache) if POOL_SIZE > 0 else None
+
+def _run(code: str, **kw):
+    if pool is not None:
+        return pool.run(code, **kw)
+    return run_python_sandbox(code, workdir=WORKDIR, cpu_sec=CPU_SEC, memory_bytes=MEMORY_BYTES, cache=cache, **kw)
+
+# sized to the pool so requests wait here, on the event loop, rather than in threads blocked on a worker
+limiter = SandboxLimiter(_run, concurrency=int(os.getenv("FOUND_SANDBOX_CONCURRENCY", str(max(1, POOL_SIZE)))),
+                         max_queue=int(os.getenv("FOUND_SANDBOX_MAX_QUEUE","32")))
+
 class Req(BaseModel):
     tool: str = Field("python")
     code: str
     timeout_sec: float | None = None
 
+@app.get("/health")
+async def health():
+    out = {"ok": True, **limiter.stats()}
+    if pool is not None:
+        out.update(pool.stats())
+    if cache is not None:
+        out.update(cache.stats())
+    return out
+
 @app.post("/v1/tools/execute")
-def execute(req: Req):
+async def execute(req: Req):
     if req.tool.strip().lower() != "python":
         raise HTTPException(status_code=400, detail="tool not allowlisted")
-    workdir = os.getenv("FOUND_SANDBOX_WORKDIR","data/sandbox_work")
     timeout = float(req.timeout_sec or os.getenv("FOUND_SANDBOX_TIMEOUT_SEC","2.0"))
-    return run_python_sandbox(req.code, workdir=workdir, timeout_sec=timeout)
+    try:
+        out, _, _ = await limiter.run(req.code, timeout_sec=timeout)
+    except SandboxBusy as e:
+        raise HTTPException(status_code=429, detail="sandbox busy", headers={"Retry-After": str(e.retry_after)})
+    return out
@@ -1,8 +1,18 @@
 from __future__ import annotations
-import ast, io, os, sys, traceback
+import ast, asyncio, hashlib, inspect, io, marshal, math, os, queue, signal, subprocess, sys, threading, time, traceback
+import multiprocessing as _mp
 from multiprocessing import get_context
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Connection
 from pathlib import Path
-from typing import Any, Dict
+from types import CodeType
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # not on Windows; limits are then wall-clock only
+    resource = None
 
 _ALLOWED_MODULES = {
     "math": __import__("math"),
@@ -35,7 +45,7 @@ _DISALLOWED_NAMES = {
 class SandboxError(Exception):
     pass
 
-def _validate_ast(code: str) -> None:
+def _validate_ast(code: str) -> ast.Module:
     try:
         tree = ast.parse(code, mode="exec")
     except SyntaxError as e:
@@ -48,62 +58,421 @@ def _validate_ast(code: str) -> None:
             else:
                 if node.module:
                     names = [node.module.split(".")[0]]
+                # "from re import _cache" would hand out the same private state the attribute rule protects
+                for a in node.names:
+                    if a.name.startswith("_"):
+                        raise SandboxError(f"name_not_allowed: {a.name}")
             for n in names:
                 if n not in _ALLOWED_MODULES:
                     raise SandboxError(f"import_not_allowed: {n}")
         if isinstance(node, ast.Attribute):
-            # allow module.attr only for allowlisted modules; deny dunder attrs
-            if isinstance(node.value, ast.Name) and node.value.id in _ALLOWED_MODULES and not str(node.attr).startswith("__"):
+            # allow reading module.attr only for allowlisted modules; deny private attrs and any write,
+            # pooled workers share those module objects between runs
+            if (isinstance(node.value, ast.Name) and node.value.id in _ALLOWED_MODULES
+                    and not str(node.attr).startswith("_") and isinstance(node.ctx, ast.Load)):
                 continue
             raise SandboxError("attribute_access_not_allowed")
         if isinstance(node, (ast.With, ast.Try, ast.Raise, ast.Lambda, ast.FunctionDef, ast.ClassDef, ast.AsyncFunctionDef)):
             raise SandboxError("complex_construct_not_allowed")
-        if isinstance(node, ast.Name) and node.id in _DISALLOWED_NAMES:
+        if isinstance(node, ast.Name) and (node.id in _DISALLOWED_NAMES or node.id.startswith("__")):
             raise SandboxError(f"name_not_allowed: {node.id}")
         if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in _DISALLOWED_NAMES:
             raise SandboxError(f"call_not_allowed: {node.func.id}")
+    return tree
 
-def _worker(code: str, workdir: str, q) -> None:
-    try:
-        Path(workdir).mkdir(parents=True, exist_ok=True)
-        os.chdir(workdir)
-        _validate_ast(code)
+Compiled = Tuple[CodeType, Optional[CodeType]]
+
+def _compile(code: str) -> Compiled:
+    # statements to exec plus the trailing expression, if any, whose value becomes the result
+    tree = _validate_ast(code)
+    last = tree.body.pop() if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+    body = compile(tree, "<sandbox>", "exec")
+    return body, (compile(ast.Expression(last.value), "<sandbox>", "eval") if last is not None else None)
 
-        stdout = io.StringIO()
-        stderr = io.StringIO()
-        old_out, old_err = sys.stdout, sys.stderr
+def _execute(code: str, compiled: Optional[Compiled] = None) -> Dict[str, Any]:
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    old_out, old_err = sys.stdout, sys.stderr
+    try:
+        body, last = compiled or _compile(code)
         sys.stdout, sys.stderr = stdout, stderr
 
         g: Dict[str, Any] = {"__builtins__": _ALLOWED_BUILTINS}
         g.update(_ALLOWED_MODULES)
 
-        tree = ast.parse(code, mode="exec")
-        result = None
-        if tree.body and isinstance(tree.body[-1], ast.Expr):
-            last = tree.body.pop()
-            exec(compile(tree, "<sandbox>", "exec"), g, g)
-            result = eval(compile(ast.Expression(last.value), "<sandbox>", "eval"), g, g)
-        else:
-            exec(compile(tree, "<sandbox>", "exec"), g, g)
-
+        exec(body, g, g)
+        result = eval(last, g, g) if last is not None else None
+        return {"ok": True, "stdout": stdout.getvalue()[-8000:], "stderr": stderr.getvalue()[-8000:], "result": result}
+    except SandboxError as e:
+        return {"ok": False, "error": str(e)}
+    except Exception:
+        return {"ok": False, "error": "runtime_error", "trace": traceback.format_exc()[-8000:]}
+    finally:
         sys.stdout, sys.stderr = old_out, old_err
-        q.put({"ok": True, "stdout": stdout.getvalue()[-8000:], "stderr": stderr.getvalue()[-8000:], "result": result})
+
+# (SandboxError message, marshalled Compiled, seconds spent validating and compiling); exactly one of the first two is set
+CacheEntry = Tuple[Optional[str], Optional[bytes], float]
+
+class CodeCache:
+    # source hash -> validation verdict and compiled code; workers fill it on a miss and get the code back on a hit,
+    # so the same snippet is parsed and validated once per host rather than once per run
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max(1, max_entries)
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._saved_sec = 0.0
+
+    @staticmethod
+    def key(code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8", "surrogatepass")).hexdigest()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            self._saved_sec += entry[2]
+            return entry
+
+    def put(self, key: str, entry: CacheEntry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                "sandbox_code_cache_entries": len(self._entries),
+                "sandbox_code_cache_hits_total": self._hits,
+                "sandbox_code_cache_misses_total": self._misses,
+                "sandbox_code_cache_hit_ratio": round(self._hits / total, 4) if total else 0.0,
+                "sandbox_code_cache_saved_seconds_total": round(self._saved_sec, 6),
+            }
+
+def _run_entry(code: str, entry: Optional[CacheEntry], learn: bool) -> Dict[str, Any]:
+    # runs from a cache entry when there is one; with learn set, a miss hands its compiled form back as "_compiled"
+    if entry is not None:
+        error, blob, _ = entry
+        return {"ok": False, "error": error} if error is not None else _execute(code, marshal.loads(blob))
+    if not learn:
+        return _execute(code)
+    t0 = time.perf_counter()
+    try:
+        compiled = _compile(code)
     except SandboxError as e:
-        q.put({"ok": False, "error": str(e)})
+        return {"ok": False, "error": str(e), "_compiled": (str(e), None, time.perf_counter() - t0)}
     except Exception:
-        q.put({"ok": False, "error": "runtime_error", "trace": traceback.format_exc()[-8000:]})
+        return _execute(code)
+    learned = (None, marshal.dumps(compiled), time.perf_counter() - t0)
+    out = _execute(code, compiled)
+    out["_compiled"] = learned
+    return out
+
+def _lookup(cache: Optional[CodeCache], code: str) -> Tuple[Optional[str], Optional[CacheEntry]]:
+    if cache is None:
+        return None, None
+    key = CodeCache.key(code)
+    return key, cache.get(key)
+
+def _learn(cache: Optional[CodeCache], key: Optional[str], out: Dict[str, Any]) -> Dict[str, Any]:
+    entry = out.pop("_compiled", None)
+    if cache is not None and entry is not None:
+        cache.put(key, entry)
+    return out
+
+def _apply_limits(cpu_sec: Optional[float], memory_bytes: Optional[int]) -> None:
+    # soft limits only: a pooled worker must be able to raise them again for the next request
+    if resource is None:
+        return
+    if cpu_sec:
+        used = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = math.ceil(used.ru_utime + used.ru_stime + cpu_sec)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    if memory_bytes:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes if hard == resource.RLIM_INFINITY else min(memory_bytes, hard), hard))
+
+def _reset_modules() -> None:
+    # pooled workers share the allowlisted modules between runs; drop what one snippet left in their caches
+    _ALLOWED_MODULES["re"].purge()
+
+def _lift_limits() -> None:
+    if resource is None:
+        return
+    for limit in (resource.RLIMIT_CPU, resource.RLIMIT_AS):
+        resource.setrlimit(limit, (resource.getrlimit(limit)[1],) * 2)
 
-def run_python_sandbox(code: str, *, workdir: str, timeout_sec: float) -> Dict[str, Any]:
-    import multiprocessing as _mp
+def _worker(code: str, workdir: str, q, cpu_sec: Optional[float] = None, memory_bytes: Optional[int] = None,
+            entry: Optional[CacheEntry] = None, learn: bool = False) -> None:
+    Path(workdir).mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+    _apply_limits(cpu_sec, memory_bytes)
+    q.put(_run_entry(code, entry, learn))
+
+def _exit_error(returncode: Optional[int]) -> str:
+    if returncode == -signal.SIGXCPU:
+        return "cpu_limit_exceeded"
+    return "worker_crashed"
+
+def _serve(rx: Connection, tx: Connection, workdir: str) -> None:
+    # pooled worker: one snippet per message until told to stop or the pipe closes
+    Path(workdir).mkdir(parents=True, exist_ok=True)
+    os.chdir(workdir)
+    while True:
+        try:
+            msg = rx.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        code, cpu_sec, memory_bytes, entry, learn = msg
+        _apply_limits(cpu_sec, memory_bytes)
+        try:
+            out = _run_entry(code, entry, learn)
+        finally:
+            _lift_limits()
+            _reset_modules()
+        try:
+            tx.send(out)
+        except OSError:
+            return
+        except Exception:
+            # the result does not pickle: send its repr, or an error if even that fails
+            try:
+                out["result"] = repr(out.get("result"))
+            except Exception:
+                out = {"ok": False, "error": "result_not_serializable"}
+            try:
+                tx.send(out)
+            except OSError:
+                return
+
+def run_python_sandbox(code: str, *, workdir: str, timeout_sec: float, cpu_sec: Optional[float] = None,
+                       memory_bytes: Optional[int] = None, cache: Optional[CodeCache] = None) -> Dict[str, Any]:
+    key, entry = _lookup(cache, code)
+    if entry is not None and entry[0] is not None:
+        return {"ok": False, "error": entry[0]}
     method = "fork" if "fork" in _mp.get_all_start_methods() else "spawn"
     ctx = get_context(method)
     q = ctx.Queue()
-    p = ctx.Process(target=_worker, args=(code, workdir, q), daemon=True)
+    p = ctx.Process(target=_worker, args=(code, workdir, q, cpu_sec, memory_bytes, entry, cache is not None and entry is None),
+                    daemon=True)
     p.start()
     p.join(timeout=timeout_sec)
     if p.is_alive():
         p.terminate()
         return {"ok": False, "error": "timeout"}
     if q.empty():
-        return {"ok": False, "error": "no_result"}
-    return q.get()
+        return {"ok": False, "error": "no_result" if p.exitcode == 0 else _exit_error(p.exitcode)}
+    return _learn(cache, key, q.get())
+
+class _PoolWorker:
+    # a fresh interpreter running this file, so a worker never carries the host process's imports
+    def __init__(self, workdir: str):
+        child_rx, tx = os.pipe()
+        rx, child_tx = os.pipe()
+        try:
+            self.proc = subprocess.Popen(
+                [sys.executable, "-I", os.path.abspath(__file__), "--serve", workdir, str(child_rx), str(child_tx)],
+                pass_fds=(child_rx, child_tx), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            )
+        except BaseException:
+            for fd in (rx, tx):
+                os.close(fd)
+            raise
+        finally:
+            os.close(child_rx)
+            os.close(child_tx)
+        self.tx = Connection(tx, readable=False)
+        self.rx = Connection(rx, writable=False)
+        self.runs = 0
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def kill(self) -> None:
+        for conn in (self.tx, self.rx):
+            conn.close()
+        if self.alive():
+            self.proc.terminate()
+        try:
+            self.proc.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+
+class SandboxPool:
+    # pre-started workers that only import this module and its allowlist; a worker is replaced after max_tasks runs,
+    # a timeout or a crash, so one bad snippet never leaks into the next
+    def __init__(self, *, size: int, workdir: str, max_tasks: int = 200, queue_timeout_sec: float = 10.0,
+                 cpu_sec: Optional[float] = None, memory_bytes: Optional[int] = None, cache: Optional[CodeCache] = None):
+        self.size = max(1, size)
+        self.cache = cache
+        self.cpu_sec = cpu_sec
+        self.memory_bytes = memory_bytes
+        self.workdir = str(Path(workdir).expanduser().resolve())
+        self.max_tasks = max(1, max_tasks)
+        self.queue_timeout_sec = queue_timeout_sec
+        # a None slot is a worker that still has to be started
+        self._slots: "queue.LifoQueue[Optional[_PoolWorker]]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._counts = {"runs": 0, "recycled": 0, "timeouts": 0, "crashes": 0, "cpu_limited": 0, "rejected": 0}
+        for _ in range(self.size):
+            self._slots.put(_PoolWorker(self.workdir))
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def run(self, code: str, *, timeout_sec: float,
+            cpu_sec: Optional[float] = None, memory_bytes: Optional[int] = None) -> Dict[str, Any]:
+        key, entry = _lookup(self.cache, code)
+        if entry is not None and entry[0] is not None:
+            # rejected before, no worker needed to reject it again
+            return {"ok": False, "error": entry[0]}
+        try:
+            w = self._slots.get(timeout=self.queue_timeout_sec)
+        except queue.Empty:
+            self._count("rejected")
+            return {"ok": False, "error": "busy"}
+        out: Optional[Dict[str, Any]] = None
+        try:
+            if w is None or not w.alive():
+                if w is not None:
+                    w.kill()
+                w = _PoolWorker(self.workdir)
+            w.tx.send((code, cpu_sec or self.cpu_sec, memory_bytes or self.memory_bytes, entry, self.cache is not None and entry is None))
+            if w.rx.poll(timeout_sec):
+                out = _learn(self.cache, key, w.rx.recv())
+                w.runs += 1
+            else:
+                self._count("timeouts")
+                out = {"ok": False, "error": "timeout"}
+        except (EOFError, OSError):
+            error = "worker_crashed"
+            if w is not None:
+                try:
+                    error = _exit_error(w.proc.wait(timeout=1.0))
+                except subprocess.TimeoutExpired:
+                    pass
+            self._count("cpu_limited" if error == "cpu_limit_exceeded" else "crashes")
+            out = {"ok": False, "error": error}
+        finally:
+            self._count("runs")
+            if w is None:
+                self._slots.put(None)
+            elif self._closed:
+                w.kill()
+            elif out is None or out.get("error") in ("timeout", "worker_crashed", "cpu_limit_exceeded") or w.runs >= self.max_tasks:
+                self._count("recycled")
+                w.kill()
+                # the replacement starts off the request path; its slot frees up once it is ready
+                threading.Thread(target=self._replace, daemon=True).start()
+            else:
+                self._slots.put(w)
+        return out
+
+    def _replace(self) -> None:
+        try:
+            w = _PoolWorker(self.workdir)
+        except Exception:
+            w = None
+        if w is None or self._closed:
+            if w is not None:
+                w.kill()
+            # keep the slot so the pool never shrinks; the next taker starts a worker itself
+            self._slots.put(None)
+            return
+        self._slots.put(w)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            out = {f"sandbox_pool_{k}_total": v for k, v in self._counts.items()}
+        out["sandbox_pool_idle_workers"] = self._slots.qsize()
+        out["sandbox_pool_size"] = self.size
+        return out
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                w = self._slots.get_nowait()
+            except queue.Empty:
+                return
+            if w is not None:
+                try:
+                    w.tx.send(None)
+                except OSError:
+                    pass
+                w.kill()
+
+class SandboxBusy(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("sandbox_busy")
+        self.retry_after = retry_after
+
+class SandboxLimiter:
+    # awaitable front for a runner (blocking ones go to a thread): at most `concurrency` snippets run,
+    # at most `max_queue` wait, everyone else is turned away with a retry hint
+    def __init__(self, run: Callable[..., Any], *, concurrency: int, max_queue: int):
+        self._run = run
+        self._async = inspect.iscoroutinefunction(run)
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sandbox")
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self._avg_exec = 0.1
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self._avg_exec * (self.waiting + 1) / self.concurrency))
+
+    async def run(self, code: str, **kw: Any) -> Tuple[Dict[str, Any], float, float]:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        sem = self._sem
+        if sem.locked() and self.waiting >= self.max_queue:
+            raise SandboxBusy(self.retry_after())
+        t0 = time.perf_counter()
+        self.waiting += 1
+        try:
+            await sem.acquire()
+        finally:
+            self.waiting -= 1
+        t1 = time.perf_counter()
+        self.running += 1
+        def done(f) -> None:
+            # the slot frees when the run finishes, even if the caller went away first
+            if not f.cancelled():
+                f.exception()
+            self.running -= 1
+            self._avg_exec += 0.2 * ((time.perf_counter() - t1) - self._avg_exec)
+            loop.call_soon_threadsafe(sem.release)
+        loop = asyncio.get_running_loop()
+        if self._async:
+            fut = asyncio.ensure_future(self._run(code, **kw))
+        else:
+            fut = loop.run_in_executor(self._executor, lambda: self._run(code, **kw))
+        fut.add_done_callback(done)
+        out = await asyncio.shield(fut)
+        return out, t1 - t0, time.perf_counter() - t1
+
+    def stats(self) -> Dict[str, float]:
+        return {"sandbox_running": self.running, "sandbox_queued": self.waiting}
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--serve"]:
+    _serve(Connection(int(sys.argv[3]), writable=False), Connection(int(sys.argv[4]), readable=False), sys.argv[2])